@@ -3,18 +3,17 @@ import hashlib
 import json
 import os
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Union
 
-import boto3
 from aws_cdk import aws_secretsmanager as secretsmanager
-from aws_cdk import aws_ssm as ssm
 from aws_cdk import core
-from botocore.exceptions import ClientError
 
 from aws_emr_launch.constructs.base import BaseConstruct
-from aws_emr_launch.constructs.emr_constructs import emr_code
+from aws_emr_launch.constructs.emr_constructs import (emr_code,
+                                                      metadata_stores,
+                                                      parameter_storage)
 
-SSM_PARAMETER_PREFIX = '/emr_launch/cluster_configurations'
+SSM_PARAMETER_PREFIX = f'{metadata_stores.SSM_PARAMETER_ROOT}/{metadata_stores.CLUSTER_CONFIGURATIONS}'
 
 
 class ClusterConfigurationNotFoundError(Exception):
@@ -120,11 +119,9 @@ class ClusterConfiguration(BaseConstruct):
                         'Path': os.path.join(bootstrap_action.code.deployment_prefix, '*')
                     })
 
-        self._ssm_parameter = ssm.CfnParameter(
+        self._ssm_parameter = parameter_storage.StoredParameter(
             self, 'SSMParameter',
-            type='String',
-            value=json.dumps(self.to_json()),
-            tier='Intelligent-Tiering',
+            producer=lambda: json.dumps(self.to_json()),
             name=f'{SSM_PARAMETER_PREFIX}/{namespace}/{configuration_name}')
 
         self.override_interfaces['default'] = {
@@ -174,7 +171,7 @@ class ClusterConfiguration(BaseConstruct):
     def update_config(self, new_config: dict = None):
         if new_config is not None:
             self._config = new_config
-        self._ssm_parameter.value = json.dumps(self.to_json())
+        self._ssm_parameter.invalidate()
 
     @staticmethod
     def _get_applications(applications: Optional[List[str]]) -> List[dict]:
@@ -289,39 +286,41 @@ class ClusterConfiguration(BaseConstruct):
 
     @staticmethod
     def get_configurations(namespace: str = 'default', next_token: Optional[str] = None,
-                           ssm_client=None) -> Dict[str, any]:
-        ssm_client = boto3.client('ssm') if ssm_client is None else ssm_client
-        params = {
-            'Path': f'{SSM_PARAMETER_PREFIX}/{namespace}/'
-        }
-        if next_token:
-            params['NextToken'] = next_token
-        result = ssm_client.get_parameters_by_path(**params)
+                           ssm_client=None,
+                           metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Dict[str, any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
+        values, next_token = store.list(metadata_stores.CLUSTER_CONFIGURATIONS, namespace, next_token)
 
         configurations = {
-            'ClusterConfigurations': [json.loads(p['Value']) for p in result['Parameters']]
+            'ClusterConfigurations': values
         }
-        if 'NextToken' in result:
-            configurations['NextToken'] = result['NextToken']
+        if next_token:
+            configurations['NextToken'] = next_token
         return configurations
 
+    @staticmethod
+    def iter_configurations(namespaces: Union[str, List[str]] = 'default', max_results: Optional[int] = None,
+                            names_only: bool = False, ssm_client=None,
+                            metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Iterator[any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
+        return store.iter(
+            metadata_stores.CLUSTER_CONFIGURATIONS, namespaces, max_results=max_results, names_only=names_only)
+
     @staticmethod
     def get_configuration(configuration_name: str, namespace: str = 'default',
-                          ssm_client=None) -> Dict[str, any]:
-        ssm_client = boto3.client('ssm') if ssm_client is None else ssm_client
+                          ssm_client=None,
+                          metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Dict[str, any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
         try:
-            configuration_json = ssm_client.get_parameter(
-                Name=f'{SSM_PARAMETER_PREFIX}/{namespace}/{configuration_name}')['Parameter']['Value']
-            return json.loads(configuration_json)
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ParameterNotFound':
-                raise ClusterConfigurationNotFoundError()
-            else:
-                raise e
+            return store.get(metadata_stores.CLUSTER_CONFIGURATIONS, namespace, configuration_name)
+        except metadata_stores.MetadataNotFoundError:
+            raise ClusterConfigurationNotFoundError()
 
     @staticmethod
-    def from_stored_configuration(scope: core.Construct, id: str, configuration_name: str, namespace: str = 'default'):
-        stored_config = ClusterConfiguration.get_configuration(configuration_name, namespace)
+    def from_stored_configuration(scope: core.Construct, id: str, configuration_name: str, namespace: str = 'default',
+                                  metadata_store: Optional[metadata_stores.MetadataStore] = None):
+        stored_config = ClusterConfiguration.get_configuration(
+            configuration_name, namespace, metadata_store=metadata_store)
         cluster_config = ClusterConfiguration(scope, id, configuration_name=None)
         cluster_config.from_json(stored_config)
         cluster_config._rehydrated = True
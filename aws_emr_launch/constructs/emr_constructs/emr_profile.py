@@ -1,25 +1,24 @@
 import json
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Union
 
-import boto3
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_emr as emr
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_kms as kms
 from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_secretsmanager as secretsmanager
-from aws_cdk import aws_ssm as ssm
 from aws_cdk import core
-from botocore.exceptions import ClientError
 from logzero import logger
 
 from aws_emr_launch.constructs.base import BaseConstruct
-from aws_emr_launch.constructs.emr_constructs import emr_code
+from aws_emr_launch.constructs.emr_constructs import (emr_code,
+                                                      metadata_stores,
+                                                      parameter_storage)
 from aws_emr_launch.constructs.iam_roles.emr_roles import EMRRoles
 from aws_emr_launch.constructs.security_groups.emr import EMRSecurityGroups
 
-SSM_PARAMETER_PREFIX = '/emr_launch/emr_profiles'
+SSM_PARAMETER_PREFIX = f'{metadata_stores.SSM_PARAMETER_ROOT}/{metadata_stores.EMR_PROFILES}'
 
 
 class ReadOnlyEMRProfileError(Exception):
@@ -91,11 +90,9 @@ class EMRProfile(BaseConstruct):
         self._security_configuration = None
         self._security_configuration_name = None
 
-        self._ssm_parameter = ssm.CfnParameter(
+        self._ssm_parameter = parameter_storage.StoredParameter(
             self, 'SSMParameter',
-            type='String',
             value=json.dumps(self.to_json()),
-            tier='Intelligent-Tiering',
             name=f'{SSM_PARAMETER_PREFIX}/{namespace}/{profile_name}')
 
         self._construct_security_configuration()
@@ -590,38 +587,39 @@ class EMRProfile(BaseConstruct):
 
     @staticmethod
     def get_profiles(namespace: str = 'default', next_token: Optional[str] = None,
-                     ssm_client=None) -> Dict[str, any]:
-        ssm_client = boto3.client('ssm') if ssm_client is None else ssm_client
-        params = {
-            'Path': f'{SSM_PARAMETER_PREFIX}/{namespace}/'
-        }
-        if next_token:
-            params['NextToken'] = next_token
-        result = ssm_client.get_parameters_by_path(**params)
+                     ssm_client=None,
+                     metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Dict[str, any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
+        values, next_token = store.list(metadata_stores.EMR_PROFILES, namespace, next_token)
 
         profiles = {
-            'EMRProfiles': [json.loads(p['Value']) for p in result['Parameters']]
+            'EMRProfiles': values
         }
-        if 'NextToken' in result:
-            profiles['NextToken'] = result['NextToken']
+        if next_token:
+            profiles['NextToken'] = next_token
         return profiles
 
+    @staticmethod
+    def iter_profiles(namespaces: Union[str, List[str]] = 'default', max_results: Optional[int] = None,
+                      names_only: bool = False, ssm_client=None,
+                      metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Iterator[any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
+        return store.iter(
+            metadata_stores.EMR_PROFILES, namespaces, max_results=max_results, names_only=names_only)
+
     @staticmethod
     def get_profile(profile_name: str, namespace: str = 'default',
-                    ssm_client=None) -> Dict[str, any]:
-        ssm_client = boto3.client('ssm') if ssm_client is None else ssm_client
+                    ssm_client=None,
+                    metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Dict[str, any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
         try:
-            profile_json = ssm_client.get_parameter(
-                Name=f'{SSM_PARAMETER_PREFIX}/{namespace}/{profile_name}')['Parameter']['Value']
-            return json.loads(profile_json)
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ParameterNotFound':
-                raise EMRProfileNotFoundError()
-            else:
-                raise e
+            return store.get(metadata_stores.EMR_PROFILES, namespace, profile_name)
+        except metadata_stores.MetadataNotFoundError:
+            raise EMRProfileNotFoundError()
 
     @staticmethod
-    def from_stored_profile(scope: core.Construct, id: str, profile_name: str, namespace: str = 'default'):
-        stored_profile = EMRProfile.get_profile(profile_name, namespace)
+    def from_stored_profile(scope: core.Construct, id: str, profile_name: str, namespace: str = 'default',
+                            metadata_store: Optional[metadata_stores.MetadataStore] = None):
+        stored_profile = EMRProfile.get_profile(profile_name, namespace, metadata_store=metadata_store)
         profile = EMRProfile(scope, id, profile_name=None)
         return profile.from_json(stored_profile)
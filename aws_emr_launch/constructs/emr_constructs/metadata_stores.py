@@ -0,0 +1,493 @@
+import argparse
+import copy
+import json
+import os
+import queue
+import sqlite3
+import threading
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import boto3
+from botocore.exceptions import ClientError
+
+from aws_emr_launch.constructs.emr_constructs import parameter_storage
+
+SSM_PARAMETER_ROOT = '/emr_launch'
+EMR_PROFILES = 'emr_profiles'
+CLUSTER_CONFIGURATIONS = 'cluster_configurations'
+EMR_LAUNCH_FUNCTIONS = 'emr_launch_functions'
+
+METADATA_STORE_ENV = 'EMR_LAUNCH_METADATA_STORE'
+METADATA_CACHE_ENV = 'EMR_LAUNCH_METADATA_CACHE'
+DEFAULT_CACHE_FILE = 'emr_launch.context.json'
+MAX_NAMESPACE_WORKERS = 8
+# Bounds the values held in memory while several namespaces are read concurrently
+MAX_QUEUED_VALUES = 100
+
+
+class MetadataNotFoundError(Exception):
+    pass
+
+
+def _iter_concurrently(iterators: List[Iterator[Any]]) -> Iterator[Any]:
+    values = queue.Queue(maxsize=MAX_QUEUED_VALUES)
+    stopped = threading.Event()
+    finished = object()
+
+    def _put(value, error=None) -> bool:
+        while not stopped.is_set():
+            try:
+                values.put((value, error), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _drain(iterator: Iterator[Any]):
+        try:
+            for value in iterator:
+                if not _put(value):
+                    return
+        except Exception as e:
+            _put(None, e)
+            return
+        _put(finished)
+
+    with ThreadPoolExecutor(max_workers=min(len(iterators), MAX_NAMESPACE_WORKERS)) as executor:
+        for iterator in iterators:
+            executor.submit(_drain, iterator)
+        try:
+            remaining = len(iterators)
+            while remaining:
+                value, error = values.get()
+                if error is not None:
+                    raise error
+                if value is finished:
+                    remaining -= 1
+                else:
+                    yield value
+        finally:
+            # Releases the workers if the caller stops iterating early
+            stopped.set()
+
+
+class MetadataStore:
+    MAX_RESULTS = 10
+
+    @abstractmethod
+    def put(self, kind: str, namespace: str, name: str, value: dict) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, kind: str, namespace: str, name: str) -> dict:
+        ...
+
+    @abstractmethod
+    def list(self, kind: str, namespace: str = 'default', next_token: Optional[str] = None,
+             max_results: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        ...
+
+    @abstractmethod
+    def scan(self, kind: str, namespace: str, max_results: int, names_only: bool) -> Iterator[Any]:
+        ...
+
+    def get_versioned(self, kind: str, namespace: str, name: str) -> Tuple[dict, Optional[str]]:
+        # Stores without a version identifier return None
+        return self.get(kind, namespace, name), None
+
+    def iter(self, kind: str, namespaces: Union[str, List[str]] = 'default', *, max_results: Optional[int] = None,
+             names_only: bool = False) -> Iterator[Any]:
+        max_results = self.MAX_RESULTS if max_results is None else max_results
+        if not 1 <= max_results <= self.MAX_RESULTS:
+            raise ValueError(f'max_results must be between 1 and {self.MAX_RESULTS}')
+
+        namespaces = [namespaces] if isinstance(namespaces, str) else list(namespaces)
+        iterators = [self.scan(kind, n, max_results, names_only) for n in namespaces]
+        if len(iterators) <= 1:
+            return iterators[0] if iterators else iter([])
+        return _iter_concurrently(iterators)
+
+
+class SSMMetadataStore(MetadataStore):
+    def __init__(self, ssm_client=None):
+        self._ssm_client = ssm_client
+
+    @property
+    def ssm_client(self):
+        if self._ssm_client is None:
+            self._ssm_client = boto3.client('ssm')
+        return self._ssm_client
+
+    @staticmethod
+    def parameter_name(kind: str, namespace: str, name: str) -> str:
+        return f'{SSM_PARAMETER_ROOT}/{kind}/{namespace}/{name}'
+
+    def put(self, kind: str, namespace: str, name: str, value: dict) -> None:
+        parameter_name = self.parameter_name(kind, namespace, name)
+        pointer, chunks = parameter_storage.encode_parameter_value(parameter_name, json.dumps(value))
+        # Chunks go first, so the pointer never refers to missing chunks
+        for i, chunk in enumerate(chunks):
+            self.ssm_client.put_parameter(
+                Name=parameter_storage.chunk_parameter_name(parameter_name, i), Value=chunk,
+                Type='String', Tier='Intelligent-Tiering', Overwrite=True)
+        self.ssm_client.put_parameter(
+            Name=parameter_name, Value=pointer, Type='String', Tier='Intelligent-Tiering', Overwrite=True)
+
+    def get(self, kind: str, namespace: str, name: str) -> dict:
+        return self.get_versioned(kind, namespace, name)[0]
+
+    def get_versioned(self, kind: str, namespace: str, name: str) -> Tuple[dict, Optional[str]]:
+        try:
+            parameter = self.ssm_client.get_parameter(Name=self.parameter_name(kind, namespace, name))['Parameter']
+            return parameter_storage.load_parameter_value(parameter['Value'], self.ssm_client), \
+                str(parameter['Version'])
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ParameterNotFound':
+                raise MetadataNotFoundError(f'{kind}/{namespace}/{name}')
+            else:
+                raise e
+
+    def list(self, kind: str, namespace: str = 'default', next_token: Optional[str] = None,
+             max_results: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        params = {
+            'Path': f'{SSM_PARAMETER_ROOT}/{kind}/{namespace}/'
+        }
+        if next_token:
+            params['NextToken'] = next_token
+        if max_results:
+            params['MaxResults'] = max_results
+        result = self.ssm_client.get_parameters_by_path(**params)
+        values = [parameter_storage.load_parameter_value(p['Value'], self.ssm_client) for p in result['Parameters']]
+        return values, result.get('NextToken', None)
+
+    def scan(self, kind: str, namespace: str, max_results: int, names_only: bool) -> Iterator[Any]:
+        prefix = f'{SSM_PARAMETER_ROOT}/{kind}'
+        paginator = self.ssm_client.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=f'{prefix}/{namespace}/', PaginationConfig={'PageSize': max_results}):
+            for p in page['Parameters']:
+                if names_only:
+                    yield p['Name'][len(prefix) + 1:]
+                else:
+                    yield parameter_storage.load_parameter_value(p['Value'], self.ssm_client)
+
+
+class S3MetadataStore(MetadataStore):
+    MAX_RESULTS = 1000
+
+    def __init__(self, bucket_name: str, prefix: str = 'emr_launch', s3_client=None):
+        self._bucket_name = bucket_name
+        self._prefix = prefix.strip('/')
+        self._s3_client = s3_client
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            self._s3_client = boto3.client('s3')
+        return self._s3_client
+
+    def _key(self, kind: str, namespace: str, name: str) -> str:
+        return f'{self._prefix}/{kind}/{namespace}/{name}.json'
+
+    def _get_object(self, key: str) -> dict:
+        return json.loads(self.s3_client.get_object(Bucket=self._bucket_name, Key=key)['Body'].read())
+
+    def _get_versioned_object(self, key: str) -> Tuple[dict, Optional[str]]:
+        response = self.s3_client.get_object(Bucket=self._bucket_name, Key=key)
+        return json.loads(response['Body'].read()), response['ETag']
+
+    def put(self, kind: str, namespace: str, name: str, value: dict) -> None:
+        self.s3_client.put_object(
+            Bucket=self._bucket_name, Key=self._key(kind, namespace, name),
+            Body=json.dumps(value).encode('utf-8'), ContentType='application/json')
+
+    def get(self, kind: str, namespace: str, name: str) -> dict:
+        return self.get_versioned(kind, namespace, name)[0]
+
+    def get_versioned(self, kind: str, namespace: str, name: str) -> Tuple[dict, Optional[str]]:
+        try:
+            return self._get_versioned_object(self._key(kind, namespace, name))
+        except ClientError as e:
+            if e.response['Error']['Code'] in ['NoSuchKey', '404']:
+                raise MetadataNotFoundError(f'{kind}/{namespace}/{name}')
+            else:
+                raise e
+
+    def list(self, kind: str, namespace: str = 'default', next_token: Optional[str] = None,
+             max_results: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        params = {
+            'Bucket': self._bucket_name,
+            'Prefix': f'{self._prefix}/{kind}/{namespace}/',
+            'Delimiter': '/',
+            'MaxKeys': max_results or self.MAX_RESULTS
+        }
+        if next_token:
+            params['ContinuationToken'] = next_token
+        result = self.s3_client.list_objects_v2(**params)
+        values = [self._get_object(o['Key']) for o in result.get('Contents', [])]
+        return values, result.get('NextContinuationToken', None)
+
+    def scan(self, kind: str, namespace: str, max_results: int, names_only: bool) -> Iterator[Any]:
+        prefix = f'{self._prefix}/{kind}'
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=self._bucket_name, Prefix=f'{prefix}/{namespace}/', Delimiter='/',
+            PaginationConfig={'PageSize': max_results})
+        for page in pages:
+            for o in page.get('Contents', []):
+                if names_only:
+                    yield o['Key'][len(prefix) + 1:-len('.json')]
+                else:
+                    yield self._get_object(o['Key'])
+
+
+class SQLiteMetadataStore(MetadataStore):
+    MAX_RESULTS = 1000
+
+    def __init__(self, database: str = ':memory:'):
+        # One connection is shared by the threads reading several namespaces
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS metadata ('
+                'kind TEXT, namespace TEXT, name TEXT, value TEXT, PRIMARY KEY (kind, namespace, name))')
+
+    def _select(self, kind: str, namespace: str, after: str, limit: int, names_only: bool) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(
+                f'SELECT name, {"NULL" if names_only else "value"} FROM metadata '
+                'WHERE kind = ? AND namespace = ? AND name > ? ORDER BY name LIMIT ?',
+                (kind, namespace, after, limit)).fetchall()
+
+    def put(self, kind: str, namespace: str, name: str, value: dict) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO metadata (kind, namespace, name, value) VALUES (?, ?, ?, ?)',
+                (kind, namespace, name, json.dumps(value)))
+
+    def get(self, kind: str, namespace: str, name: str) -> dict:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM metadata WHERE kind = ? AND namespace = ? AND name = ?',
+                (kind, namespace, name)).fetchone()
+        if row is None:
+            raise MetadataNotFoundError(f'{kind}/{namespace}/{name}')
+        return json.loads(row[0])
+
+    def list(self, kind: str, namespace: str = 'default', next_token: Optional[str] = None,
+             max_results: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        # The NextToken is the last name returned
+        max_results = max_results or self.MAX_RESULTS
+        rows = self._select(kind, namespace, next_token or '', max_results, False)
+        return [json.loads(v) for _, v in rows], rows[-1][0] if len(rows) == max_results else None
+
+    def scan(self, kind: str, namespace: str, max_results: int, names_only: bool) -> Iterator[Any]:
+        after = ''
+        while True:
+            rows = self._select(kind, namespace, after, max_results, names_only)
+            for name, value in rows:
+                yield f'{namespace}/{name}' if names_only else json.loads(value)
+            if len(rows) < max_results:
+                return
+            after = rows[-1][0]
+
+
+class FileSystemMetadataStore(MetadataStore):
+    MAX_RESULTS = 1000
+
+    def __init__(self, root: str):
+        self._root = root
+
+    def _path(self, kind: str, namespace: str, name: Optional[str] = None) -> str:
+        path = os.path.join(self._root, kind, namespace)
+        return path if name is None else os.path.join(path, f'{name}.json')
+
+    def _names(self, kind: str, namespace: str, after: str) -> List[str]:
+        path = self._path(kind, namespace)
+        if not os.path.isdir(path):
+            return []
+        return sorted(n[:-len('.json')] for n in os.listdir(path) if n.endswith('.json') and n[:-len('.json')] > after)
+
+    def _read(self, kind: str, namespace: str, name: str) -> dict:
+        with open(self._path(kind, namespace, name)) as f:
+            return json.load(f)
+
+    def put(self, kind: str, namespace: str, name: str, value: dict) -> None:
+        os.makedirs(self._path(kind, namespace), exist_ok=True)
+        # Written through a temporary file, so readers never see a partial value
+        path = self._path(kind, namespace, name)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(f'{path}.tmp', path)
+
+    def get(self, kind: str, namespace: str, name: str) -> dict:
+        try:
+            return self._read(kind, namespace, name)
+        except FileNotFoundError:
+            raise MetadataNotFoundError(f'{kind}/{namespace}/{name}')
+
+    def list(self, kind: str, namespace: str = 'default', next_token: Optional[str] = None,
+             max_results: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        # The NextToken is the last name returned
+        max_results = max_results or self.MAX_RESULTS
+        names = self._names(kind, namespace, next_token or '')
+        page = names[:max_results]
+        return [self._read(kind, namespace, n) for n in page], page[-1] if len(names) > max_results else None
+
+    def scan(self, kind: str, namespace: str, max_results: int, names_only: bool) -> Iterator[Any]:
+        for name in self._names(kind, namespace, ''):
+            yield f'{namespace}/{name}' if names_only else self._read(kind, namespace, name)
+
+
+class CachedMetadataStore(MetadataStore):
+    # Keeps the values read at synth time in a local file, like cdk.context.json, so repeated
+    # synths don't go to the backing store. Cached values only change on refresh.
+    def __init__(self, store: MetadataStore, cache_file: str = DEFAULT_CACHE_FILE):
+        self._store = store
+        self._cache_file = cache_file
+        self._lock = threading.Lock()
+        self._cache: Optional[Dict[str, dict]] = None
+        self.MAX_RESULTS = store.MAX_RESULTS
+
+    @property
+    def store(self) -> MetadataStore:
+        return self._store
+
+    def _entries(self) -> Dict[str, dict]:
+        if self._cache is None:
+            if os.path.exists(self._cache_file):
+                with open(self._cache_file) as f:
+                    self._cache = json.load(f)
+            else:
+                self._cache = {}
+        return self._cache
+
+    def _save(self):
+        with open(f'{self._cache_file}.tmp', 'w') as f:
+            json.dump(self._entries(), f, indent=2, sort_keys=True)
+        os.replace(f'{self._cache_file}.tmp', self._cache_file)
+
+    def put(self, kind: str, namespace: str, name: str, value: dict) -> None:
+        self._store.put(kind, namespace, name, value)
+        with self._lock:
+            self._entries().pop(f'{kind}/{namespace}/{name}', None)
+            self._save()
+
+    def get(self, kind: str, namespace: str, name: str) -> dict:
+        return self.get_versioned(kind, namespace, name)[0]
+
+    def get_versioned(self, kind: str, namespace: str, name: str) -> Tuple[dict, Optional[str]]:
+        key = f'{kind}/{namespace}/{name}'
+        with self._lock:
+            entry = self._entries().get(key, None)
+            if entry is None:
+                value, version = self._store.get_versioned(kind, namespace, name)
+                entry = {'Value': value, 'Version': version}
+                self._entries()[key] = entry
+                self._save()
+        # Callers modify the values, so never hand out the cached copy
+        return copy.deepcopy(entry['Value']), entry['Version']
+
+    def list(self, kind: str, namespace: str = 'default', next_token: Optional[str] = None,
+             max_results: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+        return self._store.list(kind, namespace, next_token, max_results)
+
+    def scan(self, kind: str, namespace: str, max_results: int, names_only: bool) -> Iterator[Any]:
+        return self._store.scan(kind, namespace, max_results, names_only)
+
+    def refresh(self) -> List[str]:
+        changed = []
+        with self._lock:
+            entries = self._entries()
+            for key in sorted(entries):
+                kind, namespace, name = key.split('/', 2)
+                try:
+                    value, version = self._store.get_versioned(kind, namespace, name)
+                except MetadataNotFoundError:
+                    del entries[key]
+                    changed.append(key)
+                    continue
+                if version != entries[key]['Version'] or value != entries[key]['Value']:
+                    entries[key] = {'Value': value, 'Version': version}
+                    changed.append(key)
+            self._save()
+        return changed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache = {}
+            if os.path.exists(self._cache_file):
+                os.remove(self._cache_file)
+
+
+_default_store: Optional[MetadataStore] = None
+# Stores built from the environment, so a synth reads the cache file and opens the store once
+_environment_stores: Dict[Tuple[str, Optional[str]], MetadataStore] = {}
+_environment_stores_lock = threading.Lock()
+
+
+def from_uri(uri: str) -> MetadataStore:
+    # ssm, s3://bucket/prefix, sqlite:///path/to/metadata.db or file:///path/to/metadata
+    parsed = urlparse(uri)
+    if parsed.scheme in ['', 'ssm']:
+        return SSMMetadataStore()
+    elif parsed.scheme == 's3':
+        return S3MetadataStore(parsed.netloc, parsed.path.strip('/') or 'emr_launch')
+    elif parsed.scheme == 'sqlite':
+        return SQLiteMetadataStore(parsed.path or ':memory:')
+    elif parsed.scheme == 'file':
+        return FileSystemMetadataStore(parsed.path)
+    raise ValueError(f'Unsupported metadata store: {uri}')
+
+
+def set_default_store(store: Optional[MetadataStore]) -> None:
+    global _default_store
+    _default_store = store
+
+
+def get_default_store() -> MetadataStore:
+    if _default_store is not None:
+        return _default_store
+    key = (os.environ.get(METADATA_STORE_ENV, 'ssm'), os.environ.get(METADATA_CACHE_ENV, None))
+    with _environment_stores_lock:
+        store = _environment_stores.get(key, None)
+        if store is None:
+            uri, cache_file = key
+            store = from_uri(uri)
+            if cache_file:
+                store = CachedMetadataStore(store, cache_file)
+            _environment_stores[key] = store
+    return store
+
+
+def resolve_store(metadata_store: Optional[MetadataStore] = None, ssm_client=None) -> MetadataStore:
+    if metadata_store is not None:
+        return metadata_store
+    if ssm_client is not None:
+        return SSMMetadataStore(ssm_client)
+    return get_default_store()
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog='python -m aws_emr_launch.constructs.emr_constructs.metadata_stores',
+        description='Manage the synth-time cache of stored EMR Profiles, Cluster Configurations and Launch Functions')
+    parser.add_argument('command', choices=['refresh', 'clear'])
+    parser.add_argument('--cache-file', default=os.environ.get(METADATA_CACHE_ENV, DEFAULT_CACHE_FILE))
+    parser.add_argument('--store', default=os.environ.get(METADATA_STORE_ENV, 'ssm'),
+                        help='ssm, s3://bucket/prefix, sqlite:///path/to/metadata.db or file:///path/to/metadata')
+    parsed = parser.parse_args(args)
+
+    cache = CachedMetadataStore(from_uri(parsed.store), parsed.cache_file)
+    if parsed.command == 'refresh':
+        for key in cache.refresh():
+            print(f'Refreshed: {key}')
+    else:
+        cache.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import re
+from typing import Any, Dict, List, Union
+
+
+class InvalidOverridePathError(Exception):
+    pass
+
+
+PATH_SEGMENT = r'[^.\[\]]+(?:\[[^\]]+\])*'
+PATH_PATTERN = re.compile(rf'{PATH_SEGMENT}(?:\.{PATH_SEGMENT})*')
+TOKEN_PATTERN = re.compile(r'([^.\[\]]+)|\[([^\]]+)\]')
+WILDCARD = '*'
+
+
+def tokenize_path(json_path: str) -> List[Union[str, int, Dict[str, str]]]:
+    # Paths are dotted keys and list indexes, with "*" matching every item and
+    # "[Key=Value]" selecting the list items whose Key has that Value,
+    # e.g. "Instances.InstanceGroups[InstanceRole=TASK].InstanceCount"
+    if not PATH_PATTERN.fullmatch(json_path):
+        raise InvalidOverridePathError(f'The path "{json_path}" is not a valid override path')
+
+    tokens = []
+    for key, selector in TOKEN_PATTERN.findall(json_path):
+        if key:
+            tokens.append(int(key) if key.isdigit() else key)
+        elif selector == WILDCARD:
+            tokens.append(WILDCARD)
+        elif '=' in selector:
+            selector_key, selector_value = selector.split('=', 1)
+            tokens.append({'Key': selector_key, 'Value': selector_value})
+        else:
+            raise InvalidOverridePathError(f'The selector "[{selector}]" in path "{json_path}" is not valid')
+    return tokens
+
+
+def format_path(path: List[Union[str, int, Dict[str, str]]]) -> str:
+    return '.'.join(f'[{t["Key"]}={t["Value"]}]' if isinstance(t, dict) else str(t) for t in path) \
+        .replace('.[', '[')
+
+
+def match_keys(node: Any, token: Union[str, int, Dict[str, str]]) -> List[Union[str, int]]:
+    if isinstance(node, dict):
+        if token == WILDCARD:
+            return list(node.keys())
+        return [token] if token in node else []
+    elif isinstance(node, list):
+        if token == WILDCARD:
+            return list(range(len(node)))
+        elif isinstance(token, dict):
+            return [i for i, n in enumerate(node)
+                    if isinstance(n, dict) and str(n.get(token['Key'], None)) == token['Value']]
+        elif isinstance(token, int) and token < len(node):
+            return [token]
+    return []
@@ -0,0 +1,58 @@
+from typing import Any, Dict, List, Optional, Union
+
+# The Lambda parses and walks paths with the same helpers, copied into its layer
+from aws_emr_launch.constructs.emr_constructs.override_paths import (
+    InvalidOverridePathError, format_path, match_keys, tokenize_path)
+
+
+def value_type(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    elif isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, (int, float)):
+        return 'number'
+    elif isinstance(value, str):
+        return 'string'
+    elif isinstance(value, list):
+        return 'array'
+    elif isinstance(value, dict):
+        return 'object'
+    return None
+
+
+def resolve_path(config: dict, name: str, path: List[Union[str, int, Dict[str, str]]]) -> List[Any]:
+    nodes = [config]
+    for i, token in enumerate(path):
+        nodes = [n[k] for n in nodes for k in match_keys(n, token)]
+        if len(nodes) == 0:
+            raise InvalidOverridePathError(f'The path "{format_path(path[0:i + 1])}" of Override "{name}" '
+                                           'was not found in the cluster configuration')
+    return nodes
+
+
+def compile_override_plan(config: dict,
+                          allowed_overrides: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, dict]]:
+    # Resolve each allowed override to a tokenized path and value constraints once, at synth,
+    # so invalid paths fail the build and the Lambda doesn't re-parse them on every launch
+    if not allowed_overrides:
+        return None
+
+    plan = {}
+    for name, override in allowed_overrides.items():
+        json_path = override.get('JsonPath', None)
+        if not json_path:
+            raise InvalidOverridePathError(f'Override "{name}" has no JsonPath')
+
+        path = tokenize_path(json_path)
+        current_values = resolve_path(config, name, path)
+        current_value = next((v for v in current_values if v is not None), None)
+
+        entry = {
+            'Path': path,
+            'Type': value_type(current_value) or value_type(override.get('Default', None)),
+            'Minimum': override.get('Minimum', None),
+            'Maximum': override.get('Maximum', None)
+        }
+        plan[name] = {k: v for k, v in entry.items() if v is not None}
+    return plan
@@ -0,0 +1,191 @@
+import base64
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, List, Optional, Tuple
+
+import jsii
+from aws_cdk import aws_ssm as ssm
+from aws_cdk import core
+
+STORAGE_KEY = 'EMRLaunchParameterStorage'
+GZIP_ENCODING = 'gzip+base64'
+RAW_ENCODING = 'none'
+
+# Values up to the Standard tier limit are stored as-is, so existing Parameters are unchanged
+MAX_INLINE_SIZE = 4096
+MAX_PARAMETER_SIZE = 8192
+# Chunks holding unresolved tokens need headroom for the resolved values
+MAX_CHUNK_SIZE = 4096
+MAX_GET_PARAMETERS = 10
+
+
+class ParameterStorageError(Exception):
+    pass
+
+
+def chunk_parameter_name(name: str, index: int) -> str:
+    return f'{name}/chunks/{index}'
+
+
+def _split_value(value: str, chunk_size: int) -> List[str]:
+    # Split at commas outside of JSON strings, so token markers and
+    # numeric tokens are never broken across chunks
+    boundaries = []
+    in_string = False
+    escaped = False
+    for i, c in enumerate(value):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '"':
+            in_string = not in_string
+        elif c == ',' and not in_string:
+            boundaries.append(i + 1)
+
+    chunks = []
+    start = 0
+    while len(value) - start > chunk_size:
+        end = max([b for b in boundaries if start < b <= start + chunk_size], default=start + chunk_size)
+        chunks.append(value[start:end])
+        start = end
+    chunks.append(value[start:])
+    return chunks
+
+
+def encode_parameter_value(name: str, value: str) -> Tuple[str, List[str]]:
+    if len(value) <= MAX_INLINE_SIZE:
+        return value, []
+
+    if core.Token.is_unresolved(value):
+        # Tokens are resolved at deploy time, so they can't be compressed
+        encoding = RAW_ENCODING
+        data = value
+    else:
+        encoding = GZIP_ENCODING
+        data = base64.b64encode(gzip.compress(value.encode('utf-8'), mtime=0)).decode('utf-8')
+        pointer = json.dumps({STORAGE_KEY: {'Encoding': encoding, 'Data': data}})
+        if len(pointer) <= MAX_PARAMETER_SIZE:
+            return pointer, []
+
+    chunks = _split_value(data, MAX_CHUNK_SIZE)
+    pointer = json.dumps({STORAGE_KEY: {
+        'Encoding': encoding,
+        'Chunks': [chunk_parameter_name(name, i) for i in range(len(chunks))],
+        # Changes the pointer, and so its Version, whenever the chunks change
+        'Sha256': hashlib.sha256(data.encode('utf-8')).hexdigest()
+    }})
+    return pointer, chunks
+
+
+@jsii.implements(core.IStableStringProducer)
+class _StoredValueProducer:
+    def __init__(self, stored_parameter: 'StoredParameter'):
+        self._stored_parameter = stored_parameter
+
+    def produce(self) -> str:
+        self._stored_parameter.materialize()
+        return self._stored_parameter.parameter.value
+
+
+@jsii.implements(core.IAspect)
+class _StoredValueAspect:
+    def __init__(self, stored_parameter: 'StoredParameter'):
+        self._stored_parameter = stored_parameter
+
+    def visit(self, node: core.IConstruct) -> None:
+        # Aspects run before synthesis, while the chunk Parameters can still be added
+        self._stored_parameter.materialize()
+
+
+class StoredParameter:
+    def __init__(self, scope: core.Construct, id: str, *, name: str, value: Optional[str] = None,
+                 producer: Optional[Callable[[], str]] = None):
+        self._scope = scope
+        self._id = id
+        self._name = name
+        self._producer = producer
+        self._value = None
+        self._chunks: List[ssm.CfnParameter] = []
+        self._parameter = ssm.CfnParameter(
+            scope, id,
+            type='String',
+            value=core.Lazy.string(_StoredValueProducer(self)) if producer is not None else value,
+            tier='Intelligent-Tiering',
+            name=name)
+
+        if producer is not None:
+            # The value is produced once, when the app is synthesized
+            core.Aspects.of(scope).add(_StoredValueAspect(self))
+        else:
+            self.value = value
+
+    @property
+    def parameter(self) -> ssm.CfnParameter:
+        return self._parameter
+
+    @property
+    def chunks(self) -> List[ssm.CfnParameter]:
+        return self._chunks
+
+    def materialize(self) -> None:
+        if self._value is None and self._producer is not None:
+            self.value = self._producer()
+
+    def invalidate(self) -> None:
+        # Only discards a value produced early, the next read or synth produces it again
+        if self._producer is not None:
+            self._value = None
+
+    @property
+    def value(self) -> str:
+        self.materialize()
+        return self._value
+
+    @value.setter
+    def value(self, value: str):
+        self._value = value
+        pointer, chunks = encode_parameter_value(self._name, value)
+        self._parameter.value = pointer
+
+        for i, chunk in enumerate(chunks):
+            if i < len(self._chunks):
+                self._chunks[i].value = chunk
+            else:
+                self._chunks.append(ssm.CfnParameter(
+                    self._scope, f'{self._id}Chunk{i}',
+                    type='String',
+                    value=chunk,
+                    tier='Intelligent-Tiering',
+                    name=chunk_parameter_name(self._name, i)))
+
+        while len(self._chunks) > len(chunks):
+            self._chunks.pop()
+            self._scope.node.try_remove_child(f'{self._id}Chunk{len(self._chunks)}')
+
+
+def load_parameter_value(value: str, ssm_client) -> Any:
+    stored = json.loads(value)
+    if not isinstance(stored, dict) or STORAGE_KEY not in stored:
+        return stored
+
+    storage = stored[STORAGE_KEY]
+    data = storage.get('Data', None)
+    if data is None:
+        names = storage['Chunks']
+        values = {}
+        for i in range(0, len(names), MAX_GET_PARAMETERS):
+            result = ssm_client.get_parameters(Names=names[i:i + MAX_GET_PARAMETERS])
+            if result['InvalidParameters']:
+                raise ParameterStorageError(f'Missing Parameter chunks: {result["InvalidParameters"]}')
+            values.update({p['Name']: p['Value'] for p in result['Parameters']})
+        data = ''.join(values[n] for n in names)
+
+    if storage['Encoding'] == GZIP_ENCODING:
+        data = gzip.decompress(base64.b64decode(data)).decode('utf-8')
+    return json.loads(data)
+
+
+def get_parameter_value(name: str, ssm_client) -> Any:
+    return load_parameter_value(ssm_client.get_parameter(Name=name)['Parameter']['Value'], ssm_client)
@@ -0,0 +1,76 @@
+import math
+from typing import List, Optional, Tuple
+
+from aws_cdk import aws_events as events
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_lambda, core
+
+from aws_emr_launch.constructs.base import BaseConstruct
+
+# EventBridge allows at most 5 Targets per Rule
+MAX_TARGETS_PER_RULE = 5
+
+
+class EventRulePool(BaseConstruct):
+
+    def __init__(self, scope: core.Construct, id: str, *, capacity: int = MAX_TARGETS_PER_RULE,
+                 schedule_rate: Optional[core.Duration] = None) -> None:
+        super().__init__(scope, id)
+
+        self._schedule_rate = core.Duration.minutes(1) if schedule_rate is None else schedule_rate
+        self._rules: List[events.Rule] = []
+        self._grants: List[Tuple[aws_lambda.Function, List[str]]] = []
+        self._invoke_grants: List[aws_lambda.Function] = []
+
+        self.ensure_capacity(capacity)
+
+    def ensure_capacity(self, capacity: int) -> None:
+        # Rules are created disabled, enabled when a Target is put and disabled
+        # again when the last Target is removed
+        while len(self._rules) < math.ceil(capacity / MAX_TARGETS_PER_RULE):
+            rule = events.Rule(
+                self, f'Rule{len(self._rules)}',
+                enabled=False,
+                schedule=events.Schedule.rate(self._schedule_rate))
+            self._rules.append(rule)
+
+            for grantee, actions in self._grants:
+                self._grant_rules(grantee, actions, [rule])
+            for function in self._invoke_grants:
+                self._grant_rule_invoke(function, rule)
+
+    def grant(self, grantee: aws_lambda.Function, *actions: str) -> None:
+        self._grants.append((grantee, list(actions)))
+        self._grant_rules(grantee, list(actions), self._rules)
+
+    def grant_invoke(self, function: aws_lambda.Function) -> None:
+        self._invoke_grants.append(function)
+        for rule in self._rules:
+            self._grant_rule_invoke(function, rule)
+
+    @staticmethod
+    def _grant_rules(grantee: aws_lambda.Function, actions: List[str], rules: List[events.Rule]) -> None:
+        grantee.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=actions,
+            resources=[rule.rule_arn for rule in rules]
+        ))
+
+    def _grant_rule_invoke(self, function: aws_lambda.Function, rule: events.Rule) -> None:
+        function.add_permission(
+            f'{self.node.id}{rule.node.id}Permission',
+            principal=iam.ServicePrincipal('events.amazonaws.com'),
+            action='lambda:InvokeFunction',
+            source_arn=rule.rule_arn)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._rules) * MAX_TARGETS_PER_RULE
+
+    @property
+    def rules(self) -> List[events.Rule]:
+        return self._rules
+
+    @property
+    def rule_names(self) -> List[str]:
+        return [rule.rule_name for rule in self._rules]
@@ -1,7 +1,36 @@
 import os
+import shutil
+import tempfile
 
 LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../lambda_sources/'))
+CONSTRUCTS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../'))
+
+# Modules shared between the constructs and the Lambdas, or between Lambdas, are kept in
+# one place and copied into the assets that reuse them when they're built
+ASSET_MODULES = {
+    'layers/emr_config_utils': {
+        os.path.join(CONSTRUCTS_DIR, 'emr_constructs/override_paths.py'): 'python/emr_config_utils/override_paths.py'
+    },
+    'emr_utilities/prepare_launch': {
+        os.path.join(LAMBDA_DIR, f'emr_utilities/{module}/lambda_source.py'): f'{module}/lambda_source.py'
+        for module in ['fail_if_cluster_running', 'load_cluster_configuration', 'override_cluster_configs',
+                       'update_cluster_tags']
+    }
+}
+
+_asset_paths = {}
 
 
 def _lambda_path(path):
     return os.path.join(LAMBDA_DIR, path)
+
+
+def _asset_path(path):
+    if path not in _asset_paths:
+        asset_path = os.path.join(tempfile.mkdtemp(prefix='emr_launch_asset_'), os.path.basename(path))
+        shutil.copytree(_lambda_path(path), asset_path, ignore=shutil.ignore_patterns('__pycache__'))
+        for source, target in ASSET_MODULES.get(path, {}).items():
+            os.makedirs(os.path.dirname(os.path.join(asset_path, target)), exist_ok=True)
+            shutil.copyfile(source, os.path.join(asset_path, target))
+        _asset_paths[path] = asset_path
+    return _asset_paths[path]
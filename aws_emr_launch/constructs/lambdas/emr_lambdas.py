@@ -1,10 +1,37 @@
+from typing import Dict, List, Optional
+
+from aws_cdk import aws_dynamodb as dynamodb
 from aws_cdk import aws_events as events
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda, core
 
 from aws_emr_launch.constructs.base import BaseBuilder
+from aws_emr_launch.constructs.emr_constructs import metadata_stores
 from aws_emr_launch.constructs.iam_roles import emr_roles
-from aws_emr_launch.constructs.lambdas import _lambda_path
+from aws_emr_launch.constructs.lambdas import _asset_path, _lambda_path
+
+
+def ssm_parameter_prefix(kind: str) -> str:
+    return f'{metadata_stores.SSM_PARAMETER_ROOT}/{kind}'
+
+
+def ssm_parameter_environment(*kinds: str) -> Dict[str, str]:
+    # The Lambdas read the prefixes from the environment rather than hard-coding the layout
+    names = {
+        metadata_stores.EMR_PROFILES: 'PROFILES_SSM_PARAMETER_PREFIX',
+        metadata_stores.CLUSTER_CONFIGURATIONS: 'CONFIGURATIONS_SSM_PARAMETER_PREFIX',
+        metadata_stores.EMR_LAUNCH_FUNCTIONS: 'FUNCTIONS_SSM_PARAMETER_PREFIX'
+    }
+    return {names[kind]: ssm_parameter_prefix(kind) for kind in kinds}
+
+
+def stored_parameter_arns(stack: core.Stack, kind: str, namespace: str, name: str) -> List[str]:
+    # A stored Parameter and the chunk Parameters it may be split across
+    resource = f'parameter{ssm_parameter_prefix(kind)}/{namespace}/{name}'
+    return [
+        stack.format_arn(partition=stack.partition, service='ssm', resource=resource),
+        stack.format_arn(partition=stack.partition, service='ssm', resource=f'{resource}/chunks/*')
+    ]
 
 
 class FailIfClusterRunningBuilder(BaseBuilder):
@@ -29,7 +56,8 @@ class FailIfClusterRunningBuilder(BaseBuilder):
                     iam.PolicyStatement(
                         effect=iam.Effect.ALLOW,
                         actions=[
-                            'elasticmapreduce:ListClusters'
+                            'elasticmapreduce:ListClusters',
+                            'elasticmapreduce:DescribeCluster'
                         ],
                         resources=['*']
                     )
@@ -56,23 +84,16 @@ class LoadClusterConfigurationBuilder(BaseBuilder):
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
             layers=[layer],
+            environment=ssm_parameter_environment(
+                metadata_stores.EMR_PROFILES, metadata_stores.CLUSTER_CONFIGURATIONS),
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
-                    actions=['ssm:GetParameter'],
+                    actions=['ssm:GetParameter', 'ssm:GetParameters'],
                     resources=[
-                        stack.format_arn(
-                            partition=stack.partition,
-                            service='ssm',
-                            resource='parameter/emr_launch/cluster_configurations/'
-                            f'{configuration_namespace}/{configuration_name}'
-                        ),
-                        stack.format_arn(
-                            partition=stack.partition,
-                            service='ssm',
-                            resource='parameter/emr_launch/emr_profiles/'
-                            f'{profile_namespace}/{profile_name}'
-                        )
+                        *stored_parameter_arns(stack, metadata_stores.CLUSTER_CONFIGURATIONS,
+                                               configuration_namespace, configuration_name),
+                        *stored_parameter_arns(stack, metadata_stores.EMR_PROFILES, profile_namespace, profile_name)
                     ]
                 )
             ]
@@ -81,6 +102,51 @@ class LoadClusterConfigurationBuilder(BaseBuilder):
         return lambda_function
 
 
+class PrepareLaunchBuilder(BaseBuilder):
+    @staticmethod
+    def get_or_build(scope: core.Construct, profile_namespace: str, profile_name: str,
+                     configuration_namespace: str, configuration_name: str) -> aws_lambda.Function:
+        # The individual preparation steps the fused Lambda reuses are copied into its asset
+        code = aws_lambda.Code.from_asset(_asset_path('emr_utilities/prepare_launch'))
+        stack = core.Stack.of(scope)
+
+        layer = EMRConfigUtilsLayerBuilder.get_or_build(scope)
+
+        lambda_function = stack.node.try_find_child('PrepareLaunch')
+        if lambda_function is None:
+            lambda_function = aws_lambda.Function(
+                stack,
+                'PrepareLaunch',
+                code=code,
+                handler='lambda_source.handler',
+                runtime=aws_lambda.Runtime.PYTHON_3_7,
+                timeout=core.Duration.minutes(1),
+                layers=[layer],
+                environment=ssm_parameter_environment(
+                    metadata_stores.EMR_PROFILES, metadata_stores.CLUSTER_CONFIGURATIONS),
+                initial_policy=[
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=['elasticmapreduce:ListClusters', 'elasticmapreduce:DescribeCluster'],
+                        resources=['*']
+                    )
+                ]
+            )
+            BaseBuilder.tag_construct(lambda_function)
+
+        # Each launch using the Lambda can read its own Profile and Configuration
+        lambda_function.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=['ssm:GetParameter', 'ssm:GetParameters'],
+            resources=[
+                *stored_parameter_arns(stack, metadata_stores.CLUSTER_CONFIGURATIONS,
+                                       configuration_namespace, configuration_name),
+                *stored_parameter_arns(stack, metadata_stores.EMR_PROFILES, profile_namespace, profile_name)
+            ]
+        ))
+        return lambda_function
+
+
 class OverrideClusterConfigsBuilder(BaseBuilder):
     @staticmethod
     def get_or_build(scope: core.Construct) -> aws_lambda.Function:
@@ -213,7 +279,7 @@ class RunJobFlowBuilder(BaseBuilder):
                     ),
                     iam.PolicyStatement(
                         effect=iam.Effect.ALLOW,
-                        actions=['events:EnableRule', 'events:PutTargets'],
+                        actions=['events:EnableRule', 'events:PutTargets', 'events:ListTargetsByRule'],
                         resources=[event_rule.rule_arn]
                     )
                 ]
@@ -224,7 +290,7 @@ class RunJobFlowBuilder(BaseBuilder):
 
 class CheckClusterStatusBuilder(BaseBuilder):
     @staticmethod
-    def get_or_build(scope: core.Construct, event_rule: events.Rule) -> aws_lambda.Function:
+    def get_or_build(scope: core.Construct, event_rule: Optional[events.Rule] = None) -> aws_lambda.Function:
         code = aws_lambda.Code.from_asset(_lambda_path('emr_utilities/check_cluster_status'))
         stack = core.Stack.of(scope)
 
@@ -254,23 +320,139 @@ class CheckClusterStatusBuilder(BaseBuilder):
                         effect=iam.Effect.ALLOW,
                         actions=['elasticmapreduce:DescribeCluster'],
                         resources=['*']
+                    )
+                ]
+            )
+            BaseBuilder.tag_construct(lambda_function)
+            if event_rule is not None:
+                lambda_function.add_to_role_policy(iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=[
+                        'events:ListTargetsByRule',
+                        'events:EnableRule',
+                        'events:DisableRule',
+                        'events:PutTargets',
+                        'events:RemoveTargets'],
+                    resources=[event_rule.rule_arn]
+                ))
+                lambda_function.add_permission(
+                    'EventRulePermission',
+                    principal=iam.ServicePrincipal('events.amazonaws.com'),
+                    action='lambda:InvokeFunction',
+                    source_arn=event_rule.rule_arn)
+
+        return lambda_function
+
+
+class AddStepBuilder(BaseBuilder):
+    @staticmethod
+    def get_or_build(scope: core.Construct, task_token_table: dynamodb.Table) -> aws_lambda.Function:
+        code = aws_lambda.Code.from_asset(_lambda_path('emr_utilities/add_step'))
+        stack = core.Stack.of(scope)
+
+        layer = EMRConfigUtilsLayerBuilder.get_or_build(scope)
+
+        lambda_function = stack.node.try_find_child('AddStep')
+        if lambda_function is None:
+            lambda_function = aws_lambda.Function(
+                stack,
+                'AddStep',
+                code=code,
+                handler='lambda_source.handler',
+                runtime=aws_lambda.Runtime.PYTHON_3_7,
+                timeout=core.Duration.minutes(1),
+                layers=[layer],
+                initial_policy=[
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=[
+                            'elasticmapreduce:AddJobFlowSteps',
+                            'elasticmapreduce:DescribeStep'
+                        ],
+                        resources=['*']
                     ),
                     iam.PolicyStatement(
                         effect=iam.Effect.ALLOW,
                         actions=[
-                            'events:ListTargetsByRule',
-                            'events:DisableRule',
-                            'events:RemoveTargets'],
-                        resources=[event_rule.rule_arn]
+                            'states:SendTaskSuccess',
+                            'states:SendTaskFailure'
+                        ],
+                        resources=['*']
+                    )
+                ]
+            )
+            BaseBuilder.tag_construct(lambda_function)
+            task_token_table.grant_read_write_data(lambda_function)
+
+        return lambda_function
+
+
+class CheckStepsStatusBuilder(BaseBuilder):
+    @staticmethod
+    def get_or_build(scope: core.Construct) -> aws_lambda.Function:
+        code = aws_lambda.Code.from_asset(_lambda_path('emr_utilities/check_steps_status'))
+        stack = core.Stack.of(scope)
+
+        layer = EMRConfigUtilsLayerBuilder.get_or_build(scope)
+
+        lambda_function = stack.node.try_find_child('CheckStepsStatus')
+        if lambda_function is None:
+            lambda_function = aws_lambda.Function(
+                stack,
+                'CheckStepsStatus',
+                code=code,
+                handler='lambda_source.handler',
+                runtime=aws_lambda.Runtime.PYTHON_3_7,
+                timeout=core.Duration.minutes(1),
+                layers=[layer],
+                initial_policy=[
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=['elasticmapreduce:ListSteps'],
+                        resources=['*']
+                    )
+                ]
+            )
+            BaseBuilder.tag_construct(lambda_function)
+        return lambda_function
+
+
+class ClusterPoolBuilder(BaseBuilder):
+    @staticmethod
+    def get_or_build(scope: core.Construct, cluster_pool_table: dynamodb.Table) -> aws_lambda.Function:
+        code = aws_lambda.Code.from_asset(_lambda_path('emr_utilities/cluster_pool'))
+        stack = core.Stack.of(scope)
+
+        layer = EMRConfigUtilsLayerBuilder.get_or_build(scope)
+
+        lambda_function = stack.node.try_find_child('ClusterPool')
+        if lambda_function is None:
+            lambda_function = aws_lambda.Function(
+                stack,
+                'ClusterPool',
+                code=code,
+                handler='lambda_source.handler',
+                runtime=aws_lambda.Runtime.PYTHON_3_7,
+                timeout=core.Duration.minutes(1),
+                layers=[layer],
+                environment={
+                    'CLUSTER_POOL_TABLE': cluster_pool_table.table_name
+                },
+                initial_policy=[
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=[
+                            'elasticmapreduce:ListClusters',
+                            'elasticmapreduce:DescribeCluster',
+                            'elasticmapreduce:TerminateJobFlows',
+                            'elasticmapreduce:AddTags'
+                        ],
+                        resources=['*']
                     )
                 ]
             )
             BaseBuilder.tag_construct(lambda_function)
-            lambda_function.add_permission(
-                'EventRulePermission',
-                principal=iam.ServicePrincipal('events.amazonaws.com'),
-                action='lambda:InvokeFunction',
-                source_arn=event_rule.rule_arn)
+            cluster_pool_table.grant_read_write_data(lambda_function)
 
         return lambda_function
 
@@ -278,7 +460,7 @@ class CheckClusterStatusBuilder(BaseBuilder):
 class EMRConfigUtilsLayerBuilder(BaseBuilder):
     @staticmethod
     def get_or_build(scope: core.Construct) -> aws_lambda.LayerVersion:
-        code = aws_lambda.Code.from_asset(_lambda_path('layers/emr_config_utils'))
+        code = aws_lambda.Code.from_asset(_asset_path('layers/emr_config_utils'))
         stack = core.Stack.of(scope)
 
         layer = stack.node.try_find_child('EMRConfigUtilsLayer')
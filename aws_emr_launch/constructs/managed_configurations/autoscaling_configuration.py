@@ -160,23 +160,23 @@ class AutoScalingClusterConfiguration(InstanceGroupConfiguration):
 
         self.override_interfaces['default'].update({
             'TaskInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.2.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].InstanceType',
                 'Default': task_instance_type
             },
             'TaskInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.2.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].Market',
                 'Default': task_instance_market.value
             },
             'TaskInitialInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.2.InstanceCount',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].InstanceCount',
                 'Default': initial_task_instance_count
             },
             'TaskMinimumInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.2.AutoScalingPolicy.Constraints.MinCapacity',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].AutoScalingPolicy.Constraints.MinCapacity',
                 'Default': minimum_task_instance_count
             },
             'TaskMaximumInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.2.AutoScalingPolicy.Constraints.MaxCapacity',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].AutoScalingPolicy.Constraints.MaxCapacity',
                 'Default': maximum_task_instance_count
             }
         })
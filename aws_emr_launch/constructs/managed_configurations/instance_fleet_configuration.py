@@ -93,19 +93,19 @@ class InstanceFleetConfiguration(ClusterConfiguration):
 
         self.override_interfaces['default'].update({
             'MasterInstanceType': {
-                'JsonPath': 'Instances.InstanceFleets.0.InstanceTypeConfigs.0.InstanceType',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=MASTER].InstanceTypeConfigs.0.InstanceType',
                 'Default': master_instance_type
             },
             'CoreInstanceType': {
-                'JsonPath': 'Instances.InstanceFleets.1.InstanceTypeConfigs.0.InstanceType',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=CORE].InstanceTypeConfigs.0.InstanceType',
                 'Default': core_instance_type
             },
             'CoreInstanceOnDemandCount': {
-                'JsonPath': 'Instances.InstanceFleets.1.TargetOnDemandCapacity',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=CORE].TargetOnDemandCapacity',
                 'Default': core_instance_on_demand_count
             },
             'CoreInstanceSpotCount': {
-                'JsonPath': 'Instances.InstanceFleets.1.TargetSpotCapacity',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=CORE].TargetSpotCapacity',
                 'Default': core_instance_spot_count
             }
         })
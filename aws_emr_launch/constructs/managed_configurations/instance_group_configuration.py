@@ -81,23 +81,23 @@ class InstanceGroupConfiguration(ClusterConfiguration):
         ]
         self.override_interfaces['default'].update({
             'MasterInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.0.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=MASTER].InstanceType',
                 'Default': master_instance_type
             },
             'MasterInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.0.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=MASTER].Market',
                 'Default': master_instance_market.value
             },
             'CoreInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.1.InstanceCount',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].InstanceCount',
                 'Default': core_instance_count
             },
             'CoreInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.1.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].InstanceType',
                 'Default': core_instance_type
             },
             'CoreInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.1.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].Market',
                 'Default': core_instance_market.value
             },
             'Subnet': {
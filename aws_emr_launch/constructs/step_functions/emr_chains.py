@@ -1,4 +1,6 @@
-from typing import List, Mapping, Optional
+import re
+import string
+from typing import Any, List, Mapping, Optional
 
 from aws_cdk import aws_sns as sns
 from aws_cdk import aws_stepfunctions as sfn
@@ -82,36 +84,81 @@ class Fail(sfn.StateMachineFragment):
 
 class NestedStateMachine(sfn.StateMachineFragment):
     def __init__(self, scope: core.Construct, id: str, name: str, state_machine: sfn.StateMachine,
-                 input: Optional[Mapping[str, any]] = None, fail_chain: Optional[sfn.IChainable] = None):
+                 input: Optional[Mapping[str, any]] = None, fail_chain: Optional[sfn.IChainable] = None,
+                 native_output_parsing: bool = False, output_projection: Optional[List[str]] = None,
+                 claim_check: Optional[emr_tasks.ClaimCheckPolicy] = None):
         super().__init__(scope, id)
 
-        state_machine_task = emr_tasks.StartExecutionTask(
-            self, name,
-            state_machine=state_machine,
-            input=input,
-            integration_pattern=sfn.IntegrationPattern.RUN_JOB,
-        )
+        if native_output_parsing and claim_check is not None:
+            raise ValueError('Parameter "native_output_parsing" cannot be used with "claim_check", '
+                             'the nested output can only be checked in by the ParseJsonString Lambda')
+
+        if native_output_parsing:
+            # Parse the nested execution's JSON Output with States.StringToJson, without a Lambda
+            state_machine_task = emr_tasks.StartExecutionTask(
+                self, name,
+                state_machine=state_machine,
+                input=input,
+                integration_pattern=sfn.IntegrationPattern.RUN_JOB,
+                result_selector={'Output.$': 'States.StringToJson($.Output)'},
+                output_path='$.Output',
+            )
+            end_state = state_machine_task
+        else:
+            state_machine_task = emr_tasks.StartExecutionTask(
+                self, name,
+                state_machine=state_machine,
+                input=input,
+                integration_pattern=sfn.IntegrationPattern.RUN_JOB,
+            )
 
-        parse_json_string = emr_lambdas.ParseJsonStringBuilder.get_or_build(self)
+            parse_json_string = emr_lambdas.ParseJsonStringBuilder.get_or_build(self)
 
-        parse_json_string_task = sfn_tasks.LambdaInvoke(
-            self, f'{name} - Parse JSON Output',
-            result_path='$',
-            lambda_function=parse_json_string,
-            payload_response_only=True,
-            payload=sfn.TaskInput.from_object({
+            payload = {
                 'JsonString': sfn.TaskInput.from_data_at('$.Output').value
-            }),
-        )
+            }
+            if claim_check is not None:
+                # The Lambda projects the nested output before checking it in
+                payload['OutputProjection'] = output_projection
+                payload['ClaimCheck'] = claim_check.to_json()
+                claim_check.grant_read_write(parse_json_string)
+
+            parse_json_string_task = sfn_tasks.LambdaInvoke(
+                self, f'{name} - Parse JSON Output',
+                result_path='$',
+                lambda_function=parse_json_string,
+                payload_response_only=True,
+                payload=sfn.TaskInput.from_object(payload),
+            )
+
+            if fail_chain:
+                parse_json_string_task.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
+
+            state_machine_task.next(parse_json_string_task)
+            end_state = parse_json_string_task
 
         if fail_chain:
             state_machine_task.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
-            parse_json_string_task.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
 
-        state_machine_task.next(parse_json_string_task)
+        if output_projection and claim_check is None:
+            # Keep only the dotted paths in the projection, preserving their nesting
+            projection = {}
+            for path in output_projection:
+                keys = path.split('.')
+                node = projection
+                for key in keys[:-1]:
+                    node = node.setdefault(key, {})
+                node[keys[-1]] = sfn.JsonPath.string_at(f'$.{path}')
+
+            project_output = sfn.Pass(
+                self, f'{name} - Project Output',
+                parameters=projection,
+            )
+            end_state.next(project_output)
+            end_state = project_output
 
         self._start = state_machine_task
-        self._end = parse_json_string_task
+        self._end = end_state
 
     @property
     def start_state(self) -> sfn.State:
@@ -123,15 +170,47 @@ class NestedStateMachine(sfn.StateMachineFragment):
 
 
 class AddStepWithArgumentOverrides(sfn.StateMachineFragment):
+    TEMPLATE_FIELD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
     def __init__(self, scope: core.Construct, id: str, *,
                  emr_step: emr_code.EMRStep,
                  cluster_id: str,
                  result_path: Optional[str] = None,
                  output_path: Optional[str] = None,
                  fail_chain: Optional[sfn.IChainable] = None,
-                 wait_for_step_completion: bool = True):
+                 wait_for_step_completion: bool = True,
+                 argument_templating: bool = False,
+                 template_values_path: str = '$$.Execution.Input.StepArgumentValues'):
         super().__init__(scope, id)
 
+        integration_pattern = sfn.IntegrationPattern.RUN_JOB if wait_for_step_completion \
+            else sfn.IntegrationPattern.REQUEST_RESPONSE
+
+        if argument_templating:
+            # Render "{Name}" placeholders in the Args with States.Format in the AddStep Task
+            # itself, rather than a Lambda invocation per Step
+            resolved_step = emr_step.resolve(self)
+            rendered_args = self.render_args(emr_step.args, template_values_path)
+            if rendered_args is not None:
+                del resolved_step['HadoopJarStep']['Args']
+                resolved_step['HadoopJarStep']['Args.$'] = rendered_args
+
+            add_step_task = emr_tasks.EmrAddStepTask(
+                self, emr_step.name,
+                output_path=output_path,
+                result_path=result_path,
+                cluster_id=cluster_id,
+                step=resolved_step,
+                integration_pattern=integration_pattern,
+            )
+
+            if fail_chain:
+                add_step_task.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
+
+            self._start = add_step_task
+            self._end = add_step_task
+            return
+
         override_step_args = emr_lambdas.OverrideStepArgsBuilder.get_or_build(self)
 
         override_step_args_task = sfn_tasks.LambdaInvoke(
@@ -149,9 +228,6 @@ class AddStepWithArgumentOverrides(sfn.StateMachineFragment):
         resolved_step = emr_step.resolve(self)
         resolved_step['HadoopJarStep']['Args'] = sfn.TaskInput.from_data_at(f'$.{id}ResultArgs').value
 
-        integration_pattern = sfn.IntegrationPattern.RUN_JOB if wait_for_step_completion \
-            else sfn.IntegrationPattern.REQUEST_RESPONSE
-
         add_step_task = emr_tasks.EmrAddStepTask(
             self, emr_step.name,
             output_path=output_path,
@@ -170,6 +246,110 @@ class AddStepWithArgumentOverrides(sfn.StateMachineFragment):
         self._start = override_step_args_task
         self._end = add_step_task
 
+    @staticmethod
+    def escape_intrinsic(value: str) -> str:
+        # Tokens are resolved by CloudFormation and must be left intact
+        if core.Token.is_unresolved(value):
+            return value.replace("'", "\\'")
+        return re.sub(r"(['{}\\])", r'\\\1', value)
+
+    @staticmethod
+    def render_args(args: Optional[List[str]], template_values_path: str) -> Optional[str]:
+        templated = False
+        rendered_args = []
+        for arg in args if args else []:
+            if core.Token.is_unresolved(arg):
+                rendered_args.append(f"'{AddStepWithArgumentOverrides.escape_intrinsic(arg)}'")
+                continue
+
+            template = ''
+            fields = []
+            for literal, field, format_spec, conversion in string.Formatter().parse(arg):
+                template += AddStepWithArgumentOverrides.escape_intrinsic(literal)
+                if field is None:
+                    continue
+                if format_spec or conversion or not AddStepWithArgumentOverrides.TEMPLATE_FIELD.fullmatch(field):
+                    raise ValueError(f'Invalid placeholder "{{{field}}}" in Step argument: {arg}')
+                template += '{}'
+                fields.append(f'{template_values_path}.{field}')
+
+            if fields:
+                templated = True
+                rendered_args.append(f"States.Format('{template}', {', '.join(fields)})")
+            else:
+                rendered_args.append(f"'{template}'")
+
+        return f'States.Array({", ".join(rendered_args)})' if templated else None
+
+    @property
+    def start_state(self) -> sfn.State:
+        return self._start
+
+    @property
+    def end_states(self) -> List[sfn.INextable]:
+        return self._end.end_states
+
+
+class StepConcurrencyMap(sfn.Map):
+    def __init__(self, scope: core.Construct, id: str, *,
+                 max_concurrency_path: Optional[str] = None,
+                 **kwargs):
+        super().__init__(scope, id, **kwargs)
+        self._max_concurrency_path = max_concurrency_path
+
+    def to_state_json(self) -> Mapping[Any, Any]:
+        state = dict(super().to_state_json())
+        if self._max_concurrency_path is not None:
+            # MaxConcurrencyPath isn't modeled by the Map construct, it replaces MaxConcurrency
+            state.pop('MaxConcurrency', None)
+            state['MaxConcurrencyPath'] = self._max_concurrency_path
+        return state
+
+
+class AddStepsFanOut(sfn.StateMachineFragment):
+    def __init__(self, scope: core.Construct, id: str, *,
+                 name: str,
+                 cluster_id: str,
+                 steps_path: str = '$$.Execution.Input.Steps',
+                 step_concurrency_level: Optional[int] = None,
+                 step_concurrency_level_path: str = '$.LaunchClusterResult.Cluster.StepConcurrencyLevel',
+                 result_path: Optional[str] = None,
+                 output_path: Optional[str] = None,
+                 fail_chain: Optional[sfn.IChainable] = None,
+                 wait_for_step_completion: bool = True):
+        super().__init__(scope, id)
+
+        # Steps are AddJobFlowSteps Step objects read from the state at runtime, so the
+        # definition doesn't grow with the number of Steps. Running at most StepConcurrencyLevel
+        # at once keeps the Cluster busy without queuing Steps behind each other
+        fan_out = StepConcurrencyMap(
+            self, name,
+            items_path=steps_path,
+            max_concurrency=step_concurrency_level,
+            max_concurrency_path=step_concurrency_level_path if step_concurrency_level is None else None,
+            parameters={
+                'ClusterId': cluster_id,
+                'Step': sfn.JsonPath.string_at('$$.Map.Item.Value')
+            },
+            result_path=result_path,
+            output_path=output_path)
+
+        integration_pattern = sfn.IntegrationPattern.RUN_JOB if wait_for_step_completion \
+            else sfn.IntegrationPattern.REQUEST_RESPONSE
+
+        fan_out.iterator(emr_tasks.EmrAddStepTask(
+            self, f'{name} - Add Step',
+            cluster_id=sfn.JsonPath.string_at('$.ClusterId'),
+            step=sfn.JsonPath.string_at('$.Step'),
+            integration_pattern=integration_pattern,
+        ))
+
+        if fail_chain:
+            fan_out.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
+
+        self._start = fan_out
+        self._end = fan_out
+
     @property
     def start_state(self) -> sfn.State:
         return self._start
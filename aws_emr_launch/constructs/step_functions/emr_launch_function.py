@@ -1,23 +1,28 @@
 import json
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 
-import boto3
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as events_targets
+from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda
+from aws_cdk import aws_logs as logs
 from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_sns as sns
-from aws_cdk import aws_ssm as ssm
 from aws_cdk import aws_stepfunctions as sfn
 from aws_cdk import core
-from botocore.exceptions import ClientError
 from logzero import logger
 
 from aws_emr_launch import __product__, __version__
 from aws_emr_launch.constructs.base import BaseConstruct
 from aws_emr_launch.constructs.emr_constructs import (cluster_configuration,
-                                                      emr_profile)
+                                                      emr_profile,
+                                                      metadata_stores,
+                                                      override_plan,
+                                                      parameter_storage)
+from aws_emr_launch.constructs.lambdas import emr_lambdas
 from aws_emr_launch.constructs.step_functions import emr_chains, emr_tasks
 
-SSM_PARAMETER_PREFIX = '/emr_launch/emr_launch_functions'
+SSM_PARAMETER_PREFIX = f'{metadata_stores.SSM_PARAMETER_ROOT}/{metadata_stores.EMR_LAUNCH_FUNCTIONS}'
 
 
 class EMRLaunchFunctionNotFoundError(Exception):
@@ -38,12 +43,33 @@ class EMRLaunchFunction(BaseConstruct):
                  allowed_cluster_config_overrides: Optional[Dict[str, Dict[str, str]]] = None,
                  description: Optional[str] = None,
                  cluster_tags: Union[List[core.Tag], Dict[str, str], None] = None,
-                 wait_for_cluster_start: bool = True) -> None:
+                 wait_for_cluster_start: bool = True,
+                 track_cluster_state_changes: bool = False,
+                 batch_cluster_status_checks: bool = False,
+                 max_pending_clusters: int = 25,
+                 polling_schedule: Optional[emr_tasks.ClusterStatusPollingSchedule] = None,
+                 output_projection: Optional[List[str]] = None,
+                 fused_launch_preparation: bool = False,
+                 express_launch_preparation: bool = False,
+                 cluster_pool: Optional[emr_tasks.ClusterPoolPolicy] = None,
+                 claim_check: Optional[emr_tasks.ClaimCheckPolicy] = None) -> None:
         super().__init__(scope, id)
 
         if launch_function_name is None:
             return
 
+        if fused_launch_preparation and override_cluster_configs_lambda is not None:
+            raise ValueError('Parameter "override_cluster_configs_lambda" cannot be used '
+                             'with "fused_launch_preparation"')
+
+        if claim_check is not None and override_cluster_configs_lambda is not None:
+            raise ValueError('Parameter "override_cluster_configs_lambda" cannot be used with "claim_check", '
+                             'the Lambda would receive a ClaimCheck reference rather than the configuration')
+
+        if cluster_pool is not None and default_fail_if_cluster_running:
+            raise ValueError('Parameter "default_fail_if_cluster_running" cannot be used with "cluster_pool", '
+                             'idle pooled Clusters would always be running')
+
         self._launch_function_name = launch_function_name
         self._namespace = namespace
         self._emr_profile = emr_profile
@@ -55,12 +81,22 @@ class EMRLaunchFunction(BaseConstruct):
         self._override_cluster_configs_lambda = override_cluster_configs_lambda
         self._description = description
         self._wait_for_cluster_start = wait_for_cluster_start
+        self._cluster_pool = cluster_pool
+        self._claim_check = claim_check
 
         if allowed_cluster_config_overrides is None:
             self._allowed_cluster_config_overrides = cluster_configuration.override_interfaces.get('default', None)
         else:
             self._allowed_cluster_config_overrides = allowed_cluster_config_overrides
 
+        # Fails the synth if an allowed override doesn't match the cluster configuration. Only the
+        # built-in override Lambda reads the plan, a custom Lambda gets the allowed overrides as-is
+        if override_cluster_configs_lambda is None:
+            self._cluster_config_override_plan = override_plan.compile_override_plan(
+                cluster_configuration.config, self._allowed_cluster_config_overrides)
+        else:
+            self._cluster_config_override_plan = None
+
         if isinstance(cluster_tags, dict):
             self._cluster_tags = [core.Tag(k, v) for k, v in cluster_tags.items()]
         elif isinstance(cluster_tags, list):
@@ -97,48 +133,108 @@ class EMRLaunchFunction(BaseConstruct):
             error='Failed to Launch Cluster',
             cause='See Execution Event "FailStateEntered" for complete error cause')
 
-        # Create Task for loading the cluster configuration from Parameter Store
-        load_cluster_configuration = emr_tasks.LoadClusterConfigurationBuilder.build(
-            self, 'LoadClusterConfigurationTask',
-            cluster_name=cluster_name,
-            cluster_tags=self._cluster_tags,
-            profile_namespace=emr_profile.namespace,
-            profile_name=emr_profile.profile_name,
-            configuration_namespace=cluster_configuration.namespace,
-            configuration_name=cluster_configuration.configuration_name,
-            result_path='$.ClusterConfiguration',)
-        load_cluster_configuration.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
-
-        # Create Task for overriding cluster configurations
-        override_cluster_configs = emr_tasks.OverrideClusterConfigsBuilder.build(
-            self, 'OverrideClusterConfigsTask',
-            override_cluster_configs_lambda=override_cluster_configs_lambda,
-            allowed_cluster_config_overrides=self._allowed_cluster_config_overrides,
-            input_path='$.ClusterConfiguration.Cluster',
-            result_path='$.ClusterConfiguration.Cluster',)
-        # Attach an error catch to the Task
-        override_cluster_configs.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
-
-        # Create Task to conditionally fail if a cluster with this name is already
-        # running, based on user input
-        fail_if_cluster_running = emr_tasks.FailIfClusterRunningBuilder.build(
-            self, 'FailIfClusterRunningTask',
-            default_fail_if_cluster_running=default_fail_if_cluster_running,
-            input_path='$.ClusterConfiguration.Cluster',
-            result_path='$.ClusterConfiguration.Cluster',)
-        # Attach an error catch to the task
-        fail_if_cluster_running.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
-
-        # Create a Task for updating the cluster tags at runtime
-        update_cluster_tags = emr_tasks.UpdateClusterTagsBuilder.build(
-            self, 'UpdateClusterTagsTask',
-            input_path='$.ClusterConfiguration.Cluster',
-            result_path='$.ClusterConfiguration.Cluster',)
-        # Attach an error catch to the Task
-        update_cluster_tags.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
+        if fused_launch_preparation:
+            # Load, override, check and tag the cluster configuration in a single Lambda invocation
+            prepare_launch = emr_tasks.PrepareLaunchBuilder.build(
+                self, 'PrepareLaunchTask',
+                cluster_name=cluster_name,
+                cluster_tags=self._cluster_tags,
+                profile_namespace=emr_profile.namespace,
+                profile_name=emr_profile.profile_name,
+                configuration_namespace=cluster_configuration.namespace,
+                configuration_name=cluster_configuration.configuration_name,
+                allowed_cluster_config_overrides=self._allowed_cluster_config_overrides,
+                cluster_config_override_plan=self._cluster_config_override_plan,
+                default_fail_if_cluster_running=default_fail_if_cluster_running,
+                result_path='$.ClusterConfiguration',
+                claim_check=claim_check,)
+
+            preparation_tasks = [prepare_launch]
+            preparation = sfn.Chain.start(prepare_launch)
+        else:
+            # Create Task for loading the cluster configuration from Parameter Store
+            load_cluster_configuration = emr_tasks.LoadClusterConfigurationBuilder.build(
+                self, 'LoadClusterConfigurationTask',
+                cluster_name=cluster_name,
+                cluster_tags=self._cluster_tags,
+                profile_namespace=emr_profile.namespace,
+                profile_name=emr_profile.profile_name,
+                configuration_namespace=cluster_configuration.namespace,
+                configuration_name=cluster_configuration.configuration_name,
+                result_path='$.ClusterConfiguration',
+                claim_check=claim_check,)
+
+            # Create Task for overriding cluster configurations
+            override_cluster_configs = emr_tasks.OverrideClusterConfigsBuilder.build(
+                self, 'OverrideClusterConfigsTask',
+                override_cluster_configs_lambda=override_cluster_configs_lambda,
+                allowed_cluster_config_overrides=self._allowed_cluster_config_overrides,
+                cluster_config_override_plan=self._cluster_config_override_plan,
+                input_path='$.ClusterConfiguration.Cluster',
+                result_path='$.ClusterConfiguration.Cluster',
+                claim_check=claim_check,)
+
+            # Create Task to conditionally fail if a cluster with this name is already
+            # running, based on user input
+            fail_if_cluster_running = emr_tasks.FailIfClusterRunningBuilder.build(
+                self, 'FailIfClusterRunningTask',
+                default_fail_if_cluster_running=default_fail_if_cluster_running,
+                input_path='$.ClusterConfiguration.Cluster',
+                result_path='$.ClusterConfiguration.Cluster',
+                claim_check=claim_check,)
+
+            # Create a Task for updating the cluster tags at runtime
+            update_cluster_tags = emr_tasks.UpdateClusterTagsBuilder.build(
+                self, 'UpdateClusterTagsTask',
+                input_path='$.ClusterConfiguration.Cluster',
+                result_path='$.ClusterConfiguration.Cluster',
+                claim_check=claim_check,)
+
+            preparation_tasks = [
+                load_cluster_configuration, override_cluster_configs, fail_if_cluster_running, update_cluster_tags]
+            preparation = sfn.Chain \
+                .start(load_cluster_configuration) \
+                .next(override_cluster_configs) \
+                .next(fail_if_cluster_running) \
+                .next(update_cluster_tags)
+
+        if express_launch_preparation:
+            # The short, synchronous preparation Lambdas run in an Express sub-workflow, priced per
+            # execution rather than per transition. Its output is the input with the ClusterConfiguration
+            # added, so the rest of the launch sees the same state. Errors fail the sub-workflow and are
+            # caught on the nested execution
+            self._prepare_launch_state_machine = sfn.StateMachine(
+                self, 'PrepareLaunchStateMachine',
+                state_machine_name=f'{namespace}_{launch_function_name}_PrepareLaunch',
+                state_machine_type=sfn.StateMachineType.EXPRESS,
+                definition=preparation,
+                # Express execution history is only available through the logs
+                logs=sfn.LogOptions(
+                    destination=logs.LogGroup(
+                        self, 'PrepareLaunchLogGroup',
+                        log_group_name=f'/aws/vendedlogs/states/{namespace}_{launch_function_name}_PrepareLaunch',
+                        retention=logs.RetentionDays.ONE_MONTH),
+                    level=sfn.LogLevel.ERROR))
+
+            definition = sfn.Chain.start(emr_chains.NestedStateMachine(
+                self, 'PrepareLaunchWorkflow',
+                name='Prepare Launch',
+                state_machine=self._prepare_launch_state_machine,
+                input=sfn.TaskInput.from_data_at('$').value,
+                fail_chain=fail,
+                native_output_parsing=True))
+        else:
+            self._prepare_launch_state_machine = None
+
+            # Attach an error catch to the Tasks
+            for preparation_task in preparation_tasks:
+                preparation_task.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
+            definition = preparation
 
         # Create a Task to create the cluster
-        if cluster_configuration.secret_configurations is None and emr_profile.kerberos_attributes_secret is None:
+        # A checked-in Cluster configuration can only be read by the RunJobFlow Lambda
+        if cluster_configuration.secret_configurations is None and emr_profile.kerberos_attributes_secret is None \
+                and claim_check is None:
             # Use a the standard Step Functions/EMR integration to create the cluster
             create_cluster = emr_tasks.CreateClusterBuilder.build(
                 self, 'CreateClusterTask',
@@ -156,7 +252,13 @@ class EMRLaunchFunction(BaseConstruct):
                 secret_configurations=cluster_configuration.secret_configurations,
                 input_path='$.ClusterConfiguration',
                 result_path='$.LaunchClusterResult',
-                wait_for_cluster_start=wait_for_cluster_start,)
+                wait_for_cluster_start=wait_for_cluster_start,
+                track_cluster_state_changes=track_cluster_state_changes,
+                batch_cluster_status_checks=batch_cluster_status_checks,
+                max_pending_clusters=max_pending_clusters,
+                polling_schedule=polling_schedule,
+                output_projection=output_projection,
+                claim_check=claim_check)
 
         # Attach an error catch to the Task
         create_cluster.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
@@ -168,25 +270,82 @@ class EMRLaunchFunction(BaseConstruct):
             topic=success_topic,
             output_path='$')
 
-        definition = sfn.Chain \
-            .start(load_cluster_configuration) \
-            .next(override_cluster_configs) \
-            .next(fail_if_cluster_running) \
-            .next(update_cluster_tags) \
-            .next(create_cluster) \
-            .next(success)
+        if cluster_pool is not None:
+            # Claim an idle pooled Cluster with the same configuration fingerprint, only
+            # creating a new Cluster when there isn't one
+            claim_pooled_cluster = emr_tasks.ClaimPooledClusterBuilder.build(
+                self, 'ClaimPooledClusterTask',
+                cluster_pool_policy=cluster_pool,
+                input_path='$.ClusterConfiguration',
+                result_path='$.ClusterConfiguration',
+                output_projection=output_projection,
+                claim_check=claim_check,)
+            claim_pooled_cluster.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
+
+            use_pooled_cluster = sfn.Pass(
+                self, 'Use Pooled Cluster',
+                input_path='$.ClusterConfiguration.PooledCluster',
+                result_path='$.LaunchClusterResult')
+
+            register_pooled_cluster = emr_tasks.RegisterPooledClusterBuilder.build(
+                self, 'RegisterPooledClusterTask',
+                fingerprint_path='$.ClusterConfiguration.Fingerprint',
+                launch_cluster_result_path='$.LaunchClusterResult',
+                result_path=sfn.JsonPath.DISCARD,)
+            register_pooled_cluster.add_catch(fail, errors=['States.ALL'], result_path='$.Error')
+
+            definition = definition \
+                .next(claim_pooled_cluster) \
+                .next(sfn.Choice(self, 'Pooled Cluster Claimed?')
+                      .when(sfn.Condition.is_present('$.ClusterConfiguration.PooledCluster'),
+                            use_pooled_cluster.next(success))
+                      .otherwise(create_cluster.next(register_pooled_cluster).next(success)))
+        else:
+            definition = definition \
+                .next(create_cluster) \
+                .next(success)
 
         self._state_machine = sfn.StateMachine(
             self, 'StateMachine',
             state_machine_name=f'{namespace}_{launch_function_name}', definition=definition)
 
-        self._ssm_parameter = ssm.CfnParameter(
+        if cluster_pool is not None:
+            self._build_cluster_pool_maintenance(cluster_pool, f'{namespace}_{launch_function_name}')
+
+        self._ssm_parameter = parameter_storage.StoredParameter(
             self, 'SSMParameter',
-            type='String',
             value=json.dumps(self.to_json()),
-            tier='Intelligent-Tiering',
             name=f'{SSM_PARAMETER_PREFIX}/{namespace}/{launch_function_name}')
 
+    def _build_cluster_pool_maintenance(self, cluster_pool: emr_tasks.ClusterPoolPolicy, state_machine_name: str):
+        cluster_pool_lambda = emr_lambdas.ClusterPoolBuilder.get_or_build(
+            self, emr_tasks.ClusterPoolTableBuilder.get_or_build(self))
+
+        # The ARN is built from the name, referencing the StateMachine would be a circular dependency
+        state_machine_arn = core.Stack.of(self).format_arn(
+            service='states', resource='stateMachine', sep=':', resource_name=state_machine_name)
+        cluster_pool_lambda.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=['states:StartExecution'],
+            resources=[state_machine_arn]))
+        # Clusters are held for the claiming execution, which can be a pipeline's parent execution
+        cluster_pool_lambda.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=['states:DescribeExecution'],
+            resources=[core.Stack.of(self).format_arn(
+                service='states', resource='execution', sep=':', resource_name='*')]))
+
+        events.Rule(
+            self, 'ClusterPoolMaintenanceRule',
+            schedule=events.Schedule.rate(cluster_pool.maintenance_interval),
+            targets=[events_targets.LambdaFunction(
+                cluster_pool_lambda,
+                event=events.RuleTargetInput.from_object({
+                    'Action': 'Maintain',
+                    'StateMachineArn': state_machine_arn,
+                    'ClusterPoolPolicy': cluster_pool.to_json()
+                }))])
+
     def to_json(self):
         return {
             'LaunchFunctionName': self._launch_function_name,
@@ -208,22 +367,32 @@ class EMRLaunchFunction(BaseConstruct):
                 if self._override_cluster_configs_lambda is not None
                 else None,
             'AllowedClusterConfigOverrides': self._allowed_cluster_config_overrides,
+            'ClusterConfigOverridePlan': self._cluster_config_override_plan,
             'StateMachine': self._state_machine.state_machine_arn,
+            'PrepareLaunchStateMachine': self._prepare_launch_state_machine.state_machine_arn
+                if self._prepare_launch_state_machine is not None
+                else None,
             'Description': self._description,
             'ClusterTags': [{'Key': t.key, 'Value': t.value} for t in self._cluster_tags],
-            'WaitForClusterStart': self._wait_for_cluster_start
+            'WaitForClusterStart': self._wait_for_cluster_start,
+            'ClusterPoolPolicy': self._cluster_pool.to_json()
+                if self._cluster_pool is not None
+                else None,
+            'ClaimCheckPolicy': self._claim_check.to_json()
+                if self._claim_check is not None
+                else None
         }
 
-    def from_json(self, property_values):
+    def from_json(self, property_values, metadata_store: Optional[metadata_stores.MetadataStore] = None):
         self._launch_function_name = property_values['LaunchFunctionName']
         self._namespace = property_values['Namespace']
 
         profile_parts = property_values['EMRProfile'].split('/')
         self._emr_profile = emr_profile.EMRProfile.from_stored_profile(
-            self, 'EMRProfile', profile_parts[1], profile_parts[0])
+            self, 'EMRProfile', profile_parts[1], profile_parts[0], metadata_store)
         config_parts = property_values['ClusterConfiguration'].split('/')
         self._cluster_configuration = cluster_configuration.ClusterConfiguration.from_stored_configuration(
-            self, 'ClusterConfiguration', config_parts[1], config_parts[0])
+            self, 'ClusterConfiguration', config_parts[1], config_parts[0], metadata_store)
 
         self._cluster_name = property_values['ClusterName']
         self._default_fail_if_cluster_running = property_values['DefaultFailIfClusterRunning']
@@ -245,15 +414,41 @@ class EMRLaunchFunction(BaseConstruct):
             else None
 
         self._allowed_cluster_config_overrides = property_values.get('AllowedClusterConfigOverrides', None)
+        self._cluster_config_override_plan = property_values.get('ClusterConfigOverridePlan', None)
         self._description = property_values.get('Description', None)
         self._cluster_tags = [core.Tag(t['Key'], t['Value']) for t in property_values['ClusterTags']]
 
         state_machine = property_values['StateMachine']
         self._state_machine = sfn.StateMachine.from_state_machine_arn(self, 'StateMachine', state_machine)
 
+        state_machine = property_values.get('PrepareLaunchStateMachine', None)
+        self._prepare_launch_state_machine = sfn.StateMachine.from_state_machine_arn(
+            self, 'PrepareLaunchStateMachine', state_machine) \
+            if state_machine is not None \
+            else None
+
         self._wait_for_cluster_start = property_values.get('WaitForClusterStart', None)
+
+        cluster_pool = property_values.get('ClusterPoolPolicy', None)
+        self._cluster_pool = emr_tasks.ClusterPoolPolicy(
+            min_idle=cluster_pool['MinIdle'], max_idle=cluster_pool['MaxIdle'],
+            maintenance_interval=core.Duration.seconds(cluster_pool.get('MaintenanceInterval', 300))) \
+            if cluster_pool is not None \
+            else None
+
+        claim_check = property_values.get('ClaimCheckPolicy', None)
+        self._claim_check = emr_tasks.ClaimCheckPolicy(
+            bucket=s3.Bucket.from_bucket_name(self, 'ClaimCheckBucket', claim_check['Bucket']),
+            prefix=claim_check['Prefix'],
+            threshold_bytes=claim_check['ThresholdBytes']) \
+            if claim_check is not None \
+            else None
         return self
 
+    @property
+    def prepare_launch_state_machine(self) -> Optional[sfn.StateMachine]:
+        return self._prepare_launch_state_machine
+
     @property
     def launch_function_name(self) -> str:
         return self._launch_function_name
@@ -294,6 +489,18 @@ class EMRLaunchFunction(BaseConstruct):
     def allowed_cluster_config_overrides(self) -> Optional[Dict[str, Dict[str, str]]]:
         return self._allowed_cluster_config_overrides
 
+    @property
+    def cluster_config_override_plan(self) -> Optional[Dict[str, dict]]:
+        return self._cluster_config_override_plan
+
+    @property
+    def cluster_pool(self) -> Optional[emr_tasks.ClusterPoolPolicy]:
+        return self._cluster_pool
+
+    @property
+    def claim_check(self) -> Optional[emr_tasks.ClaimCheckPolicy]:
+        return self._claim_check
+
     @property
     def state_machine(self) -> sfn.StateMachine:
         return self._state_machine
@@ -304,39 +511,41 @@ class EMRLaunchFunction(BaseConstruct):
 
     @staticmethod
     def get_functions(namespace: str = 'default', next_token: Optional[str] = None,
-                      ssm_client=None) -> Dict[str, any]:
-        ssm_client = boto3.client('ssm') if ssm_client is None else ssm_client
-        params = {
-            'Path': f'{SSM_PARAMETER_PREFIX}/{namespace}/'
-        }
-        if next_token:
-            params['NextToken'] = next_token
-        result = ssm_client.get_parameters_by_path(**params)
+                      ssm_client=None,
+                      metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Dict[str, any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
+        values, next_token = store.list(metadata_stores.EMR_LAUNCH_FUNCTIONS, namespace, next_token)
 
         functions = {
-            'EMRLaunchFunctions': [json.loads(p['Value']) for p in result['Parameters']]
+            'EMRLaunchFunctions': values
         }
-        if 'NextToken' in result:
-            functions['NextToken'] = result['NextToken']
+        if next_token:
+            functions['NextToken'] = next_token
         return functions
 
+    @staticmethod
+    def iter_functions(namespaces: Union[str, List[str]] = 'default', max_results: Optional[int] = None,
+                       names_only: bool = False, ssm_client=None,
+                       metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Iterator[any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
+        return store.iter(
+            metadata_stores.EMR_LAUNCH_FUNCTIONS, namespaces, max_results=max_results, names_only=names_only)
+
     @staticmethod
     def get_function(launch_function_name: str, namespace: str = 'default',
-                     ssm_client=None) -> Dict[str, any]:
-        ssm_client = boto3.client('ssm') if ssm_client is None else ssm_client
+                     ssm_client=None,
+                     metadata_store: Optional[metadata_stores.MetadataStore] = None) -> Dict[str, any]:
+        store = metadata_stores.resolve_store(metadata_store, ssm_client)
         try:
-            function_json = ssm_client.get_parameter(
-                Name=f'{SSM_PARAMETER_PREFIX}/{namespace}/{launch_function_name}')['Parameter']['Value']
-            return json.loads(function_json)
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ParameterNotFound':
-                raise EMRLaunchFunctionNotFoundError()
-            else:
-                raise e
+            return store.get(metadata_stores.EMR_LAUNCH_FUNCTIONS, namespace, launch_function_name)
+        except metadata_stores.MetadataNotFoundError:
+            raise EMRLaunchFunctionNotFoundError()
 
     @staticmethod
-    def from_stored_function(scope: core.Construct, id: str, launch_function_name: str, namespace: str = 'default'):
-        stored_function = EMRLaunchFunction.get_function(launch_function_name, namespace)
+    def from_stored_function(scope: core.Construct, id: str, launch_function_name: str, namespace: str = 'default',
+                             metadata_store: Optional[metadata_stores.MetadataStore] = None):
+        stored_function = EMRLaunchFunction.get_function(
+            launch_function_name, namespace, metadata_store=metadata_store)
         launch_function = EMRLaunchFunction(
             scope, id,
             launch_function_name=None,
@@ -344,4 +553,4 @@ class EMRLaunchFunction(BaseConstruct):
             cluster_configuration=None)
         launch_function._launch_function_name = launch_function_name
         launch_function._namespace = namespace
-        return launch_function.from_json(stored_function)
+        return launch_function.from_json(stored_function, metadata_store)
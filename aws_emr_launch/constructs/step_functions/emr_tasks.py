@@ -1,8 +1,11 @@
 from typing import Any, Dict, List, Mapping, Optional
 
+from aws_cdk import aws_dynamodb as dynamodb
 from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as events_targets
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda
+from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_secretsmanager as secretsmanager
 from aws_cdk import aws_stepfunctions as sfn
 from aws_cdk import aws_stepfunctions_tasks as sfn_tasks
@@ -10,6 +13,7 @@ from aws_cdk import core
 
 from aws_emr_launch.constructs.base import BaseBuilder
 from aws_emr_launch.constructs.emr_constructs import emr_code
+from aws_emr_launch.constructs.event_rules import rule_pool
 from aws_emr_launch.constructs.iam_roles import emr_roles
 from aws_emr_launch.constructs.lambdas import emr_lambdas
 
@@ -92,7 +96,8 @@ class StartExecutionTask(BaseTask):
                  result_path: Optional[str] = None,
                  timeout: Optional[core.Duration] = None,
                  state_machine: sfn.StateMachine,
-                 input: Optional[Dict[str, any]] = None, name: Optional[str] = None,):
+                 input: Optional[Dict[str, any]] = None, name: Optional[str] = None,
+                 result_selector: Optional[Dict[str, any]] = None,):
 
         super().__init__(scope, id,
                          comment=comment,
@@ -106,6 +111,7 @@ class StartExecutionTask(BaseTask):
         self._state_machine = state_machine
         self._input = input
         self._name = name
+        self._result_selector = result_selector
         self._integration_pattern = integration_pattern
         self._metrics = None
         self._statements = self._create_policy_statements()
@@ -162,6 +168,8 @@ class StartExecutionTask(BaseTask):
                 'Name': self._name
             }),
         }
+        if self._result_selector is not None:
+            task['ResultSelector'] = sfn.FieldUtils.render_object(self._result_selector)
         task.update(self._render_next_end())
         task.update(self._render_retry_catch())
         task.update(self._render_task_base())
@@ -409,6 +417,107 @@ class EmrAddStepTask(BaseTask):
         return task
 
 
+class EmrAddStepsTask(BaseTask):
+    # AddJobFlowSteps accepts at most 256 Steps per request
+    MAX_STEPS_PER_REQUEST = 256
+
+    def __init__(self, scope: core.Construct, id: str, *,
+                 comment: Optional[str] = None,
+                 heartbeat: Optional[core.Duration] = None,
+                 input_path: Optional[str] = None,
+                 output_path: Optional[str] = None,
+                 result_path: Optional[str] = None,
+                 timeout: Optional[core.Duration] = None,
+                 cluster_id: str, steps: List[Dict[str, any]],):
+        super().__init__(scope, id,
+                         comment=comment,
+                         heartbeat=heartbeat,
+                         input_path=input_path,
+                         integration_pattern=sfn.IntegrationPattern.REQUEST_RESPONSE,
+                         output_path=output_path,
+                         result_path=result_path,
+                         timeout=timeout)
+
+        if len(steps) == 0 or len(steps) > EmrAddStepsTask.MAX_STEPS_PER_REQUEST:
+            raise ValueError(f'Expected 1 to {EmrAddStepsTask.MAX_STEPS_PER_REQUEST} steps, got: {len(steps)}')
+
+        self._cluster_id = cluster_id
+        self._steps = steps
+        self._metrics = None
+        self._statements = [
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=['elasticmapreduce:AddJobFlowSteps'],
+                resources=[f'arn:aws:elasticmapreduce:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:cluster/*']
+            )
+        ]
+
+    def _task_metrics(self) -> Optional[sfn.TaskMetricsConfig]:
+        return self._metrics
+
+    def _task_policies(self) -> List[iam.PolicyStatement]:
+        return self._statements
+
+    def to_state_json(self) -> Mapping[Any, Any]:
+        # There's no service integration for adding more than one Step, so use the SDK integration
+        task = {
+            'Resource': self.get_resource_arn(
+                'aws-sdk:emr', 'addJobFlowSteps', sfn.IntegrationPattern.REQUEST_RESPONSE),
+            'Parameters': sfn.FieldUtils.render_object({
+                'JobFlowId': self._cluster_id,
+                'Steps': self._steps
+            }),
+        }
+        task.update(self._render_next_end())
+        task.update(self._render_retry_catch())
+        task.update(self._render_task_base())
+        return task
+
+
+class ClaimCheckPolicy:
+    # Step Functions limits the payload passed between States to 256 KB
+    MAX_THRESHOLD_BYTES = 262144
+
+    def __init__(self, *, bucket: s3.IBucket, prefix: str = 'emr_launch/claim_checks',
+                 threshold_bytes: int = 32768):
+        if threshold_bytes < 0 or threshold_bytes > ClaimCheckPolicy.MAX_THRESHOLD_BYTES:
+            raise ValueError(f'Expected 0 <= "threshold_bytes" <= {ClaimCheckPolicy.MAX_THRESHOLD_BYTES}')
+
+        self._bucket = bucket
+        self._prefix = prefix.strip('/')
+        self._threshold_bytes = threshold_bytes
+
+    @property
+    def bucket(self) -> s3.IBucket:
+        return self._bucket
+
+    @property
+    def prefix(self) -> str:
+        return self._prefix
+
+    @property
+    def threshold_bytes(self) -> int:
+        return self._threshold_bytes
+
+    @property
+    def objects_key_pattern(self) -> str:
+        # Without a prefix the payloads are stored at the root of the bucket
+        return f'{self._prefix}/*' if self._prefix else '*'
+
+    def grant_read(self, lambda_function: aws_lambda.IFunction):
+        self._bucket.grant_read(lambda_function, self.objects_key_pattern)
+
+    def grant_read_write(self, lambda_function: aws_lambda.IFunction):
+        self._bucket.grant_read_write(lambda_function, self.objects_key_pattern)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'Bucket': self._bucket.bucket_name,
+            'Prefix': self._prefix,
+            'ThresholdBytes': self._threshold_bytes
+        }
+
+
 class LoadClusterConfigurationBuilder:
     @staticmethod
     def build(scope: core.Construct, id: str, *,
@@ -419,7 +528,8 @@ class LoadClusterConfigurationBuilder:
               configuration_namespace: str,
               configuration_name: str,
               output_path: Optional[str] = None,
-              result_path: Optional[str] = None) -> sfn.Task:
+              result_path: Optional[str] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
         # We use a nested Construct to avoid collisions with Lambda and Task ids
         construct = core.Construct(scope, id)
 
@@ -429,6 +539,8 @@ class LoadClusterConfigurationBuilder:
             profile_name=profile_name,
             configuration_namespace=configuration_namespace,
             configuration_name=configuration_name)
+        if claim_check is not None:
+            claim_check.grant_read_write(load_cluster_configuration_lambda)
 
         return sfn_tasks.LambdaInvoke(
             construct, 'Load Cluster Configuration',
@@ -443,6 +555,56 @@ class LoadClusterConfigurationBuilder:
                 'ProfileName': profile_name,
                 'ConfigurationNamespace': configuration_namespace,
                 'ConfigurationName': configuration_name,
+                'ClaimCheck': claim_check.to_json() if claim_check is not None else None
+            }),
+        )
+
+
+class PrepareLaunchBuilder:
+    @staticmethod
+    def build(scope: core.Construct, id: str, *,
+              cluster_name: str,
+              cluster_tags: List[core.Tag],
+              profile_namespace: str,
+              profile_name: str,
+              configuration_namespace: str,
+              configuration_name: str,
+              allowed_cluster_config_overrides: Optional[Dict[str, Dict[str, str]]] = None,
+              cluster_config_override_plan: Optional[Dict[str, dict]] = None,
+              default_fail_if_cluster_running: bool = False,
+              output_path: Optional[str] = None,
+              result_path: Optional[str] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
+        # We use a nested Construct to avoid collisions with Lambda and Task ids
+        construct = core.Construct(scope, id)
+
+        prepare_launch_lambda = emr_lambdas.PrepareLaunchBuilder.get_or_build(
+            construct,
+            profile_namespace=profile_namespace,
+            profile_name=profile_name,
+            configuration_namespace=configuration_namespace,
+            configuration_name=configuration_name)
+        if claim_check is not None:
+            claim_check.grant_read_write(prepare_launch_lambda)
+
+        return sfn_tasks.LambdaInvoke(
+            construct, 'Prepare Launch',
+            output_path=output_path,
+            result_path=result_path,
+            lambda_function=prepare_launch_lambda,
+            payload_response_only=True,
+            payload=sfn.TaskInput.from_object({
+                'ExecutionInput': sfn.TaskInput.from_context_at('$$.Execution.Input').value,
+                'ClusterName': cluster_name,
+                'ClusterTags': [{'Key': t.key, 'Value': t.value} for t in cluster_tags],
+                'ProfileNamespace': profile_namespace,
+                'ProfileName': profile_name,
+                'ConfigurationNamespace': configuration_namespace,
+                'ConfigurationName': configuration_name,
+                'AllowedClusterConfigOverrides': allowed_cluster_config_overrides,
+                'ClusterConfigOverridePlan': cluster_config_override_plan,
+                'DefaultFailIfClusterRunning': default_fail_if_cluster_running,
+                'ClaimCheck': claim_check.to_json() if claim_check is not None else None
             }),
         )
 
@@ -452,9 +614,11 @@ class OverrideClusterConfigsBuilder:
     def build(scope: core.Construct, id: str, *,
               override_cluster_configs_lambda: Optional[aws_lambda.Function] = None,
               allowed_cluster_config_overrides: Optional[Dict[str, str]] = None,
+              cluster_config_override_plan: Optional[Dict[str, dict]] = None,
               input_path: str = '$',
               output_path: Optional[str] = None,
-              result_path: Optional[str] = None) -> sfn.Task:
+              result_path: Optional[str] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
         # We use a nested Construct to avoid collisions with Lambda and Task ids
         construct = core.Construct(scope, id)
 
@@ -462,6 +626,8 @@ class OverrideClusterConfigsBuilder:
             emr_lambdas.OverrideClusterConfigsBuilder.get_or_build(construct) \
             if override_cluster_configs_lambda is None \
             else override_cluster_configs_lambda
+        if claim_check is not None:
+            claim_check.grant_read_write(override_cluster_configs_lambda)
 
         return sfn_tasks.LambdaInvoke(
             construct, 'Override Cluster Configs',
@@ -472,7 +638,9 @@ class OverrideClusterConfigsBuilder:
             payload=sfn.TaskInput.from_object({
                 'ExecutionInput': sfn.TaskInput.from_context_at('$$.Execution.Input').value,
                 'Input': sfn.TaskInput.from_data_at(input_path).value,
-                'AllowedClusterConfigOverrides': allowed_cluster_config_overrides
+                'AllowedClusterConfigOverrides': allowed_cluster_config_overrides,
+                'ClusterConfigOverridePlan': cluster_config_override_plan,
+                'ClaimCheck': claim_check.to_json() if claim_check is not None else None
             }),
         )
 
@@ -483,11 +651,14 @@ class FailIfClusterRunningBuilder:
               default_fail_if_cluster_running: bool,
               input_path: str = '$',
               output_path: Optional[str] = None,
-              result_path: Optional[str] = None) -> sfn.Task:
+              result_path: Optional[str] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
         # We use a nested Construct to avoid collisions with Lambda and Task ids
         construct = core.Construct(scope, id)
 
         fail_if_cluster_running_lambda = emr_lambdas.FailIfClusterRunningBuilder.get_or_build(construct)
+        if claim_check is not None:
+            claim_check.grant_read(fail_if_cluster_running_lambda)
 
         return sfn_tasks.LambdaInvoke(
             construct, 'Fail If Cluster Running',
@@ -508,11 +679,14 @@ class UpdateClusterTagsBuilder:
     def build(scope: core.Construct, id: str, *,
               input_path: str = '$',
               output_path: Optional[str] = None,
-              result_path: Optional[str] = None) -> sfn.Task:
+              result_path: Optional[str] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
         # We use a nested Construct to avoid collisions with Lambda and Task ids
         construct = core.Construct(scope, id)
 
         update_cluster_tags_lambda = emr_lambdas.UpdateClusterTagsBuilder.get_or_build(construct)
+        if claim_check is not None:
+            claim_check.grant_read_write(update_cluster_tags_lambda)
 
         return sfn_tasks.LambdaInvoke(
             construct, 'Update Cluster Tags',
@@ -522,7 +696,8 @@ class UpdateClusterTagsBuilder:
             payload_response_only=True,
             payload=sfn.TaskInput.from_object({
                 'ExecutionInput': sfn.TaskInput.from_context_at('$$.Execution.Input').value,
-                'Input': sfn.TaskInput.from_data_at(input_path).value
+                'Input': sfn.TaskInput.from_data_at(input_path).value,
+                'ClaimCheck': claim_check.to_json() if claim_check is not None else None
             }),
         )
 
@@ -551,6 +726,93 @@ class CreateClusterBuilder:
         )
 
 
+# A compact LaunchClusterResult for use with output_projection
+CLUSTER_OUTPUT_PROJECTION = [
+    'Cluster.Id',
+    'Cluster.Name',
+    'Cluster.Status.State',
+    'Cluster.Status.StateChangeReason',
+    'Cluster.MasterPublicDnsName',
+    'Cluster.ClusterArn',
+    'Cluster.StepConcurrencyLevel'
+]
+
+
+class ClusterStatusPollingSchedule:
+    def __init__(self, *, default_interval: core.Duration = core.Duration.minutes(1),
+                 state_intervals: Optional[Dict[str, core.Duration]] = None,
+                 backoff_rate: float = 1.0,
+                 max_interval: Optional[core.Duration] = None):
+        self._default_interval = default_interval
+        self._state_intervals = {} if state_intervals is None else state_intervals
+        self._backoff_rate = backoff_rate
+        self._max_interval = max_interval
+
+    @property
+    def schedule_rates(self) -> List[core.Duration]:
+        # Each rate gets its own Rules, and CheckClusterStatus moves a Cluster's Target to the
+        # slowest Rule not exceeding its next interval. Backoff doubles through the rates up to
+        # the max_interval, or an hour without one
+        intervals = [self._default_interval] + list(self._state_intervals.values())
+        if self._max_interval is not None:
+            intervals.append(self._max_interval)
+        rates = {max(1, int(i.to_seconds() // 60)) for i in intervals}
+
+        if self._backoff_rate > 1:
+            max_rate = max(1, int((self._max_interval or core.Duration.hours(1)).to_seconds() // 60))
+            rate = min(rates)
+            while rate < max_rate:
+                rates.add(rate)
+                rate *= 2
+            rates.add(max_rate)
+        return [core.Duration.minutes(r) for r in sorted(rates)]
+
+    @property
+    def schedule_rate(self) -> core.Duration:
+        # Clusters start out on the Rules for the STARTING state
+        interval = self._state_intervals.get('STARTING', self._default_interval).to_seconds()
+        rates = self.schedule_rates
+        return next((r for r in reversed(rates) if r.to_seconds() <= interval), rates[0])
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'DefaultInterval': self._default_interval.to_seconds(),
+            'StateIntervals': {k: v.to_seconds() for k, v in self._state_intervals.items()},
+            'BackoffRate': self._backoff_rate,
+            'MaxInterval': self._max_interval.to_seconds() if self._max_interval else None
+        }
+
+
+class ClusterPoolPolicy:
+    def __init__(self, *, min_idle: int = 0, max_idle: int = 1,
+                 maintenance_interval: core.Duration = core.Duration.minutes(5)):
+        if min_idle < 0 or max_idle < min_idle:
+            raise ValueError('Expected 0 <= "min_idle" <= "max_idle"')
+
+        self._min_idle = min_idle
+        self._max_idle = max_idle
+        self._maintenance_interval = maintenance_interval
+
+    @property
+    def min_idle(self) -> int:
+        return self._min_idle
+
+    @property
+    def max_idle(self) -> int:
+        return self._max_idle
+
+    @property
+    def maintenance_interval(self) -> core.Duration:
+        return self._maintenance_interval
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'MinIdle': self._min_idle,
+            'MaxIdle': self._max_idle,
+            'MaintenanceInterval': self._maintenance_interval.to_seconds()
+        }
+
+
 class RunJobFlowBuilder(BaseBuilder):
     @staticmethod
     def build(scope: core.Construct, id: str, *, roles: emr_roles.EMRRoles,
@@ -559,25 +821,110 @@ class RunJobFlowBuilder(BaseBuilder):
               input_path: str = '$',
               result_path: Optional[str] = None,
               output_path: Optional[str] = None,
-              wait_for_cluster_start: bool = True) -> sfn.Task:
+              wait_for_cluster_start: bool = True,
+              track_cluster_state_changes: bool = False,
+              batch_cluster_status_checks: bool = False,
+              max_pending_clusters: int = 25,
+              polling_schedule: Optional[ClusterStatusPollingSchedule] = None,
+              output_projection: Optional[List[str]] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
         # We use a nested Construct to avoid collisions with Lambda and Task ids
         construct = core.Construct(scope, id)
 
-        event_rule = core.Stack.of(scope).node.try_find_child('EventRule')
-        if event_rule is None:
-            event_rule = events.Rule(
-                construct, 'EventRule',
-                enabled=False,
-                schedule=events.Schedule.rate(core.Duration.minutes(1)))
-            BaseBuilder.tag_construct(event_rule)
+        # When tracking Cluster State Change events the Rule is only a safety net
+        # for missed events, so it can poll much less frequently
+        if polling_schedule is not None:
+            polling_rate = polling_schedule.schedule_rate
+        elif track_cluster_state_changes:
+            polling_rate = core.Duration.minutes(5)
+        else:
+            polling_rate = core.Duration.minutes(1)
+
+        if batch_cluster_status_checks:
+            event_rule = core.Stack.of(scope).node.try_find_child('BatchClusterStatusRule')
+            if event_rule is None:
+                event_rule = events.Rule(
+                    core.Stack.of(scope), 'BatchClusterStatusRule',
+                    enabled=False,
+                    schedule=events.Schedule.rate(polling_rate))
+                BaseBuilder.tag_construct(event_rule)
+            event_rule_pool = None
+        else:
+            # Each pending Cluster is a Target on one of the pooled Rules, with a pool per polling rate
+            polling_rates = polling_schedule.schedule_rates if polling_schedule is not None else [polling_rate]
+            event_rule_pools = {}
+            new_pools = []
+            for rate in polling_rates:
+                polling_minutes = int(rate.to_minutes())
+                pool_id = 'ClusterStatusRulePool' if polling_minutes == 1 \
+                    else f'ClusterStatusRulePool{polling_minutes}Minutes'
+                rate_pool = core.Stack.of(scope).node.try_find_child(pool_id)
+                if rate_pool is None:
+                    rate_pool = rule_pool.EventRulePool(
+                        core.Stack.of(scope), pool_id,
+                        capacity=max_pending_clusters,
+                        schedule_rate=rate)
+                    new_pools.append(rate_pool)
+                else:
+                    rate_pool.ensure_capacity(max_pending_clusters)
+                event_rule_pools[rate.to_seconds()] = rate_pool
+            event_rule_pool = event_rule_pools[polling_rate.to_seconds()]
+            event_rule = event_rule_pool.rules[0]
 
         run_job_flow_lambda = emr_lambdas.RunJobFlowBuilder.get_or_build(construct, roles, event_rule)
         check_cluster_status_lambda = emr_lambdas.CheckClusterStatusBuilder.get_or_build(construct, event_rule)
 
+        if event_rule_pool is not None:
+            for new_pool in new_pools:
+                new_pool.grant(
+                    run_job_flow_lambda, 'events:EnableRule', 'events:PutTargets', 'events:ListTargetsByRule')
+                new_pool.grant(
+                    check_cluster_status_lambda,
+                    'events:ListTargetsByRule', 'events:EnableRule', 'events:DisableRule',
+                    'events:PutTargets', 'events:RemoveTargets')
+                new_pool.grant_invoke(check_cluster_status_lambda)
+
+        if track_cluster_state_changes:
+            RunJobFlowBuilder._get_or_build_state_change_rule(
+                construct, run_job_flow_lambda, check_cluster_status_lambda)
+
+        payload = {
+            'ExecutionInput': sfn.TaskInput.from_context_at('$$.Execution.Input').value,
+            'Input': sfn.TaskInput.from_data_at(input_path).value,
+            'TaskToken': sfn.Context.task_token,
+            'CheckStatusLambda': check_cluster_status_lambda.function_arn,
+            'RuleName': event_rule.rule_name,
+            'FireAndForget': not wait_for_cluster_start
+        }
+
+        if output_projection is not None:
+            payload['OutputProjection'] = output_projection
+
+        if claim_check is not None:
+            # RunJobFlow checks out the Cluster configuration, CheckClusterStatus checks in the result
+            payload['ClaimCheck'] = claim_check.to_json()
+            claim_check.grant_read_write(run_job_flow_lambda)
+            claim_check.grant_read_write(check_cluster_status_lambda)
+
+        if event_rule_pool is not None:
+            payload['RuleNames'] = event_rule_pool.rule_names
+            if polling_schedule is not None:
+                # The Rules for each polling rate, keyed by the rate in seconds
+                payload['PollingSchedule'] = dict(polling_schedule.to_json(), RuleNames={
+                    str(int(rate)): rate_pool.rule_names for rate, rate_pool in event_rule_pools.items()})
+
+        if batch_cluster_status_checks:
+            task_token_table = RunJobFlowBuilder._get_or_build_batch_status_checks(
+                construct, event_rule, run_job_flow_lambda, check_cluster_status_lambda)
+            payload['TaskTokenTable'] = task_token_table.table_name
+        elif track_cluster_state_changes:
+            # Polled Clusters are also registered for the Cluster State Change events
+            payload['StateChangeTable'] = TaskTokenTableBuilder.get_or_build(construct).table_name
+
         if kerberos_attributes_secret:
             run_job_flow_lambda.add_to_role_policy(iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
-                actions=['secretsmanager:GetSecretValue'],
+                actions=['secretsmanager:GetSecretValue', 'secretsmanager:DescribeSecret'],
                 resources=[f'{kerberos_attributes_secret.secret_arn}*']
             ))
 
@@ -585,7 +932,7 @@ class RunJobFlowBuilder(BaseBuilder):
             for secret in secret_configurations.values():
                 run_job_flow_lambda.add_to_role_policy(iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
-                    actions=['secretsmanager:GetSecretValue'],
+                    actions=['secretsmanager:GetSecretValue', 'secretsmanager:DescribeSecret'],
                     resources=[f'{secret.secret_arn}*']
                 ))
 
@@ -595,14 +942,196 @@ class RunJobFlowBuilder(BaseBuilder):
             result_path=result_path,
             lambda_function=run_job_flow_lambda,
             integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+            payload=sfn.TaskInput.from_object(payload)
+        )
+
+    @staticmethod
+    def _get_or_build_batch_status_checks(scope: core.Construct, event_rule: events.Rule,
+                                          run_job_flow_lambda: aws_lambda.Function,
+                                          check_cluster_status_lambda: aws_lambda.Function) -> dynamodb.Table:
+        task_token_table = TaskTokenTableBuilder.get_or_build(scope)
+
+        if check_cluster_status_lambda.node.try_find_child('BatchClusterStatusPolicy') is None:
+            # A single Target checks every pending Cluster on each tick of the Rule
+            event_rule.add_target(events_targets.LambdaFunction(check_cluster_status_lambda))
+
+            task_token_table.grant_read_write_data(check_cluster_status_lambda)
+            task_token_table.grant_write_data(run_job_flow_lambda)
+            check_cluster_status_lambda.add_environment('TASK_TOKEN_TABLE', task_token_table.table_name)
+
+            iam.Policy(
+                check_cluster_status_lambda, 'BatchClusterStatusPolicy',
+                roles=[check_cluster_status_lambda.role],
+                statements=[
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=['elasticmapreduce:ListClusters'],
+                        resources=['*']
+                    ),
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=['events:EnableRule', 'events:DisableRule'],
+                        resources=[event_rule.rule_arn]
+                    )
+                ])
+            run_job_flow_lambda.add_to_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=['events:EnableRule'],
+                resources=[event_rule.rule_arn]
+            ))
+        return task_token_table
+
+    @staticmethod
+    def _get_or_build_state_change_rule(scope: core.Construct,
+                                        run_job_flow_lambda: aws_lambda.Function,
+                                        check_cluster_status_lambda: aws_lambda.Function) -> events.Rule:
+        stack = core.Stack.of(scope)
+
+        state_change_rule = stack.node.try_find_child('ClusterStateChangeRule')
+        if state_change_rule is None:
+            state_change_rule = events.Rule(
+                stack, 'ClusterStateChangeRule',
+                event_pattern=events.EventPattern(
+                    source=['aws.emr'],
+                    detail_type=['EMR Cluster State Change'],
+                    detail={
+                        'state': ['WAITING', 'TERMINATED', 'TERMINATED_WITH_ERRORS']
+                    }),
+                targets=[events_targets.LambdaFunction(check_cluster_status_lambda)])
+            BaseBuilder.tag_construct(state_change_rule)
+
+            # The TaskToken for a Cluster is found in the TaskTokenTable
+            task_token_table = TaskTokenTableBuilder.get_or_build(scope)
+            task_token_table.grant_read_write_data(check_cluster_status_lambda)
+            task_token_table.grant_write_data(run_job_flow_lambda)
+            check_cluster_status_lambda.add_environment('TASK_TOKEN_TABLE', task_token_table.table_name)
+        return state_change_rule
+
+
+class TaskTokenTableBuilder(BaseBuilder):
+    @staticmethod
+    def get_or_build(scope: core.Construct) -> dynamodb.Table:
+        stack = core.Stack.of(scope)
+
+        task_token_table = stack.node.try_find_child('TaskTokenTable')
+        if task_token_table is None:
+            task_token_table = dynamodb.Table(
+                stack, 'TaskTokenTable',
+                partition_key=dynamodb.Attribute(name='Id', type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                removal_policy=core.RemovalPolicy.DESTROY)
+            BaseBuilder.tag_construct(task_token_table)
+        return task_token_table
+
+
+class ClusterPoolTableBuilder(BaseBuilder):
+    @staticmethod
+    def get_or_build(scope: core.Construct) -> dynamodb.Table:
+        stack = core.Stack.of(scope)
+
+        cluster_pool_table = stack.node.try_find_child('ClusterPoolTable')
+        if cluster_pool_table is None:
+            cluster_pool_table = dynamodb.Table(
+                stack, 'ClusterPoolTable',
+                partition_key=dynamodb.Attribute(name='Id', type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                removal_policy=core.RemovalPolicy.DESTROY)
+            # Claims query the Clusters with a configuration fingerprint in a pool state
+            cluster_pool_table.add_global_secondary_index(
+                index_name='FingerprintPoolState',
+                partition_key=dynamodb.Attribute(name='Fingerprint', type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name='PoolState', type=dynamodb.AttributeType.STRING))
+            BaseBuilder.tag_construct(cluster_pool_table)
+        return cluster_pool_table
+
+
+class ClaimPooledClusterBuilder:
+    @staticmethod
+    def build(scope: core.Construct, id: str, *,
+              cluster_pool_policy: ClusterPoolPolicy,
+              input_path: str = '$',
+              output_path: Optional[str] = None,
+              result_path: Optional[str] = None,
+              output_projection: Optional[List[str]] = None,
+              claim_check: Optional[ClaimCheckPolicy] = None) -> sfn.Task:
+        # We use a nested Construct to avoid collisions with Lambda and Task ids
+        construct = core.Construct(scope, id)
+
+        cluster_pool_lambda = emr_lambdas.ClusterPoolBuilder.get_or_build(
+            construct, ClusterPoolTableBuilder.get_or_build(construct))
+        if claim_check is not None:
+            claim_check.grant_read_write(cluster_pool_lambda)
+
+        return sfn_tasks.LambdaInvoke(
+            construct, 'Claim Pooled Cluster',
+            output_path=output_path,
+            result_path=result_path,
+            lambda_function=cluster_pool_lambda,
+            payload_response_only=True,
             payload=sfn.TaskInput.from_object({
+                'Action': 'Claim',
                 'ExecutionInput': sfn.TaskInput.from_context_at('$$.Execution.Input').value,
+                'ExecutionId': sfn.TaskInput.from_context_at('$$.Execution.Id').value,
+                'StateMachineArn': sfn.TaskInput.from_context_at('$$.StateMachine.Id').value,
                 'Input': sfn.TaskInput.from_data_at(input_path).value,
-                'TaskToken': sfn.Context.task_token,
-                'CheckStatusLambda': check_cluster_status_lambda.function_arn,
-                'RuleName': event_rule.rule_name,
-                'FireAndForget': not wait_for_cluster_start
-            })
+                'ClusterPoolPolicy': cluster_pool_policy.to_json(),
+                'OutputProjection': output_projection,
+                'ClaimCheck': claim_check.to_json() if claim_check is not None else None
+            }),
+        )
+
+
+class RegisterPooledClusterBuilder:
+    @staticmethod
+    def build(scope: core.Construct, id: str, *,
+              fingerprint_path: str,
+              launch_cluster_result_path: str,
+              output_path: Optional[str] = None,
+              result_path: Optional[str] = None) -> sfn.Task:
+        # We use a nested Construct to avoid collisions with Lambda and Task ids
+        construct = core.Construct(scope, id)
+
+        cluster_pool_lambda = emr_lambdas.ClusterPoolBuilder.get_or_build(
+            construct, ClusterPoolTableBuilder.get_or_build(construct))
+
+        return sfn_tasks.LambdaInvoke(
+            construct, 'Register Pooled Cluster',
+            output_path=output_path,
+            result_path=result_path,
+            lambda_function=cluster_pool_lambda,
+            payload_response_only=True,
+            payload=sfn.TaskInput.from_object({
+                'Action': 'Register',
+                'ExecutionInput': sfn.TaskInput.from_context_at('$$.Execution.Input').value,
+                'ExecutionId': sfn.TaskInput.from_context_at('$$.Execution.Id').value,
+                'Fingerprint': sfn.TaskInput.from_data_at(fingerprint_path).value,
+                'LaunchClusterResult': sfn.TaskInput.from_data_at(launch_cluster_result_path).value
+            }),
+        )
+
+
+class ReleasePooledClusterBuilder:
+    @staticmethod
+    def build(scope: core.Construct, id: str, *,
+              cluster_id: str,
+              output_path: Optional[str] = None,
+              result_path: Optional[str] = None) -> sfn.Task:
+        # We use a nested Construct to avoid collisions with Lambda and Task ids
+        construct = core.Construct(scope, id)
+
+        cluster_pool_lambda = emr_lambdas.ClusterPoolBuilder.get_or_build(
+            construct, ClusterPoolTableBuilder.get_or_build(construct))
+
+        return sfn_tasks.LambdaInvoke(
+            construct, 'Release Pooled Cluster',
+            output_path=output_path,
+            result_path=result_path,
+            lambda_function=cluster_pool_lambda,
+            payload_response_only=True,
+            payload=sfn.TaskInput.from_object({
+                'Action': 'Release',
+                'ClusterId': cluster_id
+            }),
         )
 
 
@@ -613,11 +1142,22 @@ class AddStepBuilder:
               cluster_id: str,
               result_path: Optional[str] = None,
               output_path: Optional[str] = None,
-              wait_for_step_completion: bool = True) -> sfn.Task:
+              wait_for_step_completion: bool = True,
+              track_step_state_changes: bool = False,
+              step_state_change_timeout: core.Duration = core.Duration.days(1)) -> sfn.Task:
         # We use a nested Construct to avoid collisions with Task ids
         construct = core.Construct(scope, id)
         resolved_step = emr_step.resolve(construct)
 
+        if wait_for_step_completion and track_step_state_changes:
+            return AddStepBuilder._build_step_state_change_task(
+                construct, emr_step.name,
+                step=resolved_step,
+                cluster_id=cluster_id,
+                result_path=result_path,
+                output_path=output_path,
+                timeout=step_state_change_timeout)
+
         integration_pattern = sfn.IntegrationPattern.RUN_JOB if wait_for_step_completion \
             else sfn.IntegrationPattern.REQUEST_RESPONSE
 
@@ -630,6 +1170,182 @@ class AddStepBuilder:
             integration_pattern=integration_pattern,
         )
 
+    @staticmethod
+    def _build_step_state_change_task(scope: core.Construct, id: str, *,
+                                      step: Dict[str, Any],
+                                      cluster_id: str,
+                                      result_path: Optional[str] = None,
+                                      output_path: Optional[str] = None,
+                                      timeout: Optional[core.Duration] = None) -> sfn.Task:
+        # The Step's TaskToken is kept in the TaskTokenTable and resolved by the EMR Step
+        # Status Change event, rather than the per-execution Rule behind addStep.sync
+        task_token_table = TaskTokenTableBuilder.get_or_build(scope)
+        add_step_lambda = emr_lambdas.AddStepBuilder.get_or_build(scope, task_token_table)
+        reconcile_rule = AddStepBuilder._get_or_build_step_state_change_rules(
+            scope, task_token_table, add_step_lambda)
+
+        return sfn_tasks.LambdaInvoke(
+            scope, id,
+            output_path=output_path,
+            result_path=result_path,
+            lambda_function=add_step_lambda,
+            integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+            timeout=timeout,
+            payload=sfn.TaskInput.from_object({
+                'ClusterId': cluster_id,
+                'Step': step,
+                'TaskToken': sfn.Context.task_token,
+                'TaskTokenTable': task_token_table.table_name,
+                'RuleName': reconcile_rule.rule_name
+            })
+        )
+
+    @staticmethod
+    def _get_or_build_step_state_change_rules(scope: core.Construct,
+                                              task_token_table: dynamodb.Table,
+                                              add_step_lambda: aws_lambda.Function) -> events.Rule:
+        stack = core.Stack.of(scope)
+
+        reconcile_rule = stack.node.try_find_child('StepStatusReconcileRule')
+        if reconcile_rule is None:
+            check_cluster_status_lambda = emr_lambdas.CheckClusterStatusBuilder.get_or_build(scope)
+
+            state_change_rule = events.Rule(
+                stack, 'StepStateChangeRule',
+                event_pattern=events.EventPattern(
+                    source=['aws.emr'],
+                    detail_type=['EMR Step Status Change'],
+                    detail={
+                        'state': ['COMPLETED', 'CANCELLED', 'FAILED', 'INTERRUPTED']
+                    }),
+                targets=[events_targets.LambdaFunction(check_cluster_status_lambda)])
+            BaseBuilder.tag_construct(state_change_rule)
+
+            # Polls the pending Steps in case an event is missed, enabled by AddStep and
+            # disabled again once no Steps are pending
+            reconcile_rule = events.Rule(
+                stack, 'StepStatusReconcileRule',
+                enabled=False,
+                schedule=events.Schedule.rate(core.Duration.minutes(5)),
+                targets=[events_targets.LambdaFunction(
+                    check_cluster_status_lambda,
+                    event=events.RuleTargetInput.from_object({
+                        'Action': 'ReconcileSteps',
+                        'Resources': events.EventField.from_path('$.resources')
+                    }))])
+            BaseBuilder.tag_construct(reconcile_rule)
+
+            task_token_table.grant_read_write_data(check_cluster_status_lambda)
+            check_cluster_status_lambda.add_environment('TASK_TOKEN_TABLE', task_token_table.table_name)
+            check_cluster_status_lambda.add_to_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=['elasticmapreduce:DescribeStep'],
+                resources=['*']
+            ))
+            check_cluster_status_lambda.add_to_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=['events:EnableRule', 'events:DisableRule'],
+                resources=[reconcile_rule.rule_arn]
+            ))
+            add_step_lambda.add_to_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=['events:EnableRule'],
+                resources=[reconcile_rule.rule_arn]
+            ))
+        return reconcile_rule
+
+
+class AddStepsPhase(sfn.StateMachineFragment):
+    def __init__(self, scope: core.Construct, id: str, *,
+                 name: str,
+                 emr_steps: List[emr_code.EMRStep],
+                 cluster_id: str,
+                 result_path: Optional[str] = None,
+                 output_path: Optional[str] = None,
+                 fail_chain: Optional[sfn.IChainable] = None,
+                 wait_for_steps_completion: bool = True,
+                 polling_interval: core.Duration = core.Duration.seconds(30)):
+        super().__init__(scope, id)
+
+        add_steps_task = EmrAddStepsTask(
+            self, f'{name} - Add Steps',
+            cluster_id=cluster_id,
+            steps=[emr_step.resolve(self) for emr_step in emr_steps],
+            output_path=None if wait_for_steps_completion else output_path,
+            result_path=f'$.{id}AddStepsResult' if wait_for_steps_completion else result_path,
+        )
+        if fail_chain:
+            add_steps_task.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
+
+        self._start = add_steps_task
+        self._end = add_steps_task
+        if not wait_for_steps_completion:
+            return
+
+        # The whole batch is checked together, rather than each Step being tracked on its own
+        wait = sfn.Wait(
+            self, f'{name} - Wait',
+            time=sfn.WaitTime.duration(polling_interval))
+
+        check_steps_status = sfn_tasks.LambdaInvoke(
+            self, f'{name} - Check Steps Status',
+            result_path=f'$.{id}StepsStatus',
+            lambda_function=emr_lambdas.CheckStepsStatusBuilder.get_or_build(self),
+            payload_response_only=True,
+            payload=sfn.TaskInput.from_object({
+                'ClusterId': cluster_id,
+                'StepIds': sfn.TaskInput.from_data_at(f'$.{id}AddStepsResult.StepIds').value
+            }),
+        )
+        if fail_chain:
+            check_steps_status.add_catch(fail_chain, errors=['States.ALL'], result_path='$.Error')
+
+        steps_completed = sfn.Pass(
+            self, f'{name} - Steps Completed',
+            input_path=f'$.{id}StepsStatus',
+            result_path=result_path,
+            output_path=output_path)
+
+        add_steps_task.next(wait).next(check_steps_status).next(
+            sfn.Choice(self, f'{name} - Steps Complete?')
+            .when(sfn.Condition.boolean_equals(f'$.{id}StepsStatus.Complete', True), steps_completed)
+            .otherwise(wait))
+
+        self._end = steps_completed
+
+    @property
+    def start_state(self) -> sfn.State:
+        return self._start
+
+    @property
+    def end_states(self) -> List[sfn.INextable]:
+        return self._end.end_states
+
+
+class AddStepsBuilder:
+    @staticmethod
+    def build(scope: core.Construct, id: str, *,
+              name: str,
+              emr_steps: List[emr_code.EMRStep],
+              cluster_id: str,
+              result_path: Optional[str] = None,
+              output_path: Optional[str] = None,
+              fail_chain: Optional[sfn.IChainable] = None,
+              wait_for_steps_completion: bool = True,
+              polling_interval: core.Duration = core.Duration.seconds(30)) -> AddStepsPhase:
+        # Submit a phase of Steps with a single AddJobFlowSteps call instead of a Parallel
+        # state with an AddStep Task per Step
+        return AddStepsPhase(
+            scope, id,
+            name=name,
+            emr_steps=emr_steps,
+            cluster_id=cluster_id,
+            result_path=result_path,
+            output_path=output_path,
+            fail_chain=fail_chain,
+            wait_for_steps_completion=wait_for_steps_completion,
+            polling_interval=polling_interval)
+
 
 class TerminateClusterBuilder:
     @staticmethod
@@ -2,6 +2,8 @@ from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda, core
 
 from aws_emr_launch import __package__
+from aws_emr_launch.constructs.emr_constructs import metadata_stores
+from aws_emr_launch.constructs.lambdas import emr_lambdas
 from aws_emr_launch.control_plane.constructs.lambdas import _lambda_path
 
 
@@ -12,6 +14,12 @@ class Apis(core.Construct):
 
         stack = core.Stack.of(scope)
         code = aws_lambda.Code.from_asset(_lambda_path('apis'))
+        layer = emr_lambdas.EMRConfigUtilsLayerBuilder.get_or_build(self)
+        environment = emr_lambdas.ssm_parameter_environment(
+            metadata_stores.EMR_PROFILES, metadata_stores.CLUSTER_CONFIGURATIONS, metadata_stores.EMR_LAUNCH_FUNCTIONS)
+        profiles_prefix = emr_lambdas.ssm_parameter_prefix(metadata_stores.EMR_PROFILES)
+        configurations_prefix = emr_lambdas.ssm_parameter_prefix(metadata_stores.CLUSTER_CONFIGURATIONS)
+        functions_prefix = emr_lambdas.ssm_parameter_prefix(metadata_stores.EMR_LAUNCH_FUNCTIONS)
 
         self._get_profile = aws_lambda.Function(
             self,
@@ -22,17 +30,20 @@ class Apis(core.Construct):
             handler='get_list_apis.get_profile_handler',
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
+            layers=[layer],
+            environment=environment,
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
                     actions=[
-                        'ssm:GetParameter'
+                        'ssm:GetParameter',
+                        'ssm:GetParameters'
                     ],
                     resources=[
                         stack.format_arn(
                             partition=stack.partition,
                             service='ssm',
-                            resource='parameter/emr_launch/emr_profiles/*'
+                            resource=f'parameter{profiles_prefix}/*'
                         )
                     ]
                 )
@@ -48,17 +59,20 @@ class Apis(core.Construct):
             handler='get_list_apis.get_profiles_handler',
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
+            layers=[layer],
+            environment=environment,
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
                     actions=[
-                        'ssm:GetParametersByPath'
+                        'ssm:GetParametersByPath',
+                        'ssm:GetParameters'
                     ],
                     resources=[
                         stack.format_arn(
                             partition=stack.partition,
                             service='ssm',
-                            resource='parameter/emr_launch/emr_profiles/*'
+                            resource=f'parameter{profiles_prefix}/*'
                         )
                     ]
                 )
@@ -74,17 +88,20 @@ class Apis(core.Construct):
             handler='get_list_apis.get_configuration_handler',
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
+            layers=[layer],
+            environment=environment,
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
                     actions=[
-                        'ssm:GetParameter'
+                        'ssm:GetParameter',
+                        'ssm:GetParameters'
                     ],
                     resources=[
                         stack.format_arn(
                             partition=stack.partition,
                             service='ssm',
-                            resource='parameter/emr_launch/cluster_configurations/*'
+                            resource=f'parameter{configurations_prefix}/*'
                         )
                     ]
                 )
@@ -100,17 +117,20 @@ class Apis(core.Construct):
             handler='get_list_apis.get_configurations_handler',
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
+            layers=[layer],
+            environment=environment,
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
                     actions=[
-                        'ssm:GetParametersByPath'
+                        'ssm:GetParametersByPath',
+                        'ssm:GetParameters'
                     ],
                     resources=[
                         stack.format_arn(
                             partition=stack.partition,
                             service='ssm',
-                            resource='parameter/emr_launch/cluster_configurations/*'
+                            resource=f'parameter{configurations_prefix}/*'
                         )
                     ]
                 )
@@ -126,17 +146,20 @@ class Apis(core.Construct):
             handler='get_list_apis.get_function_handler',
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
+            layers=[layer],
+            environment=environment,
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
                     actions=[
-                        'ssm:GetParameter'
+                        'ssm:GetParameter',
+                        'ssm:GetParameters'
                     ],
                     resources=[
                         stack.format_arn(
                             partition=stack.partition,
                             service='ssm',
-                            resource='parameter/emr_launch/emr_launch_functions/*'
+                            resource=f'parameter{functions_prefix}/*'
                         )
                     ]
                 )
@@ -152,17 +175,20 @@ class Apis(core.Construct):
             handler='get_list_apis.get_functions_handler',
             runtime=aws_lambda.Runtime.PYTHON_3_7,
             timeout=core.Duration.minutes(1),
+            layers=[layer],
+            environment=environment,
             initial_policy=[
                 iam.PolicyStatement(
                     effect=iam.Effect.ALLOW,
                     actions=[
-                        'ssm:GetParametersByPath'
+                        'ssm:GetParametersByPath',
+                        'ssm:GetParameters'
                     ],
                     resources=[
                         stack.format_arn(
                             partition=stack.partition,
                             service='ssm',
-                            resource='parameter/emr_launch/emr_launch_functions/*'
+                            resource=f'parameter{functions_prefix}/*'
                         )
                     ]
                 )
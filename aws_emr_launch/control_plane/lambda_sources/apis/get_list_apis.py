@@ -1,18 +1,22 @@
 import json
 import logging
+import os
 import traceback
 from typing import Dict, Optional
 
 import boto3
 from botocore.exceptions import ClientError
 
+from emr_config_utils.parameter_storage import load_parameter_value
+
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
 
 
-PROFILES_SSM_PARAMETER_PREFIX = '/emr_launch/emr_profiles'
-CONFIGURATIONS_SSM_PARAMETER_PREFIX = '/emr_launch/cluster_configurations'
-FUNCTIONS_SSM_PARAMETER_PREFIX = '/emr_launch/emr_launch_functions'
+PROFILES_SSM_PARAMETER_PREFIX = os.environ.get('PROFILES_SSM_PARAMETER_PREFIX', '/emr_launch/emr_profiles')
+CONFIGURATIONS_SSM_PARAMETER_PREFIX = os.environ.get('CONFIGURATIONS_SSM_PARAMETER_PREFIX',
+                                                     '/emr_launch/cluster_configurations')
+FUNCTIONS_SSM_PARAMETER_PREFIX = os.environ.get('FUNCTIONS_SSM_PARAMETER_PREFIX', '/emr_launch/emr_launch_functions')
 
 ssm = boto3.client('ssm')
 
@@ -39,7 +43,7 @@ def _get_parameter_values(ssm_parameter_prefix: str, top_level_return: str, name
     result = ssm.get_parameters_by_path(**params)
 
     return_val = {
-        top_level_return: [json.loads(p['Value']) for p in result['Parameters']]
+        top_level_return: [load_parameter_value(p['Value']) for p in result['Parameters']]
     }
     if 'NextToken' in result:
         return_val['NextToken'] = result['NextToken']
@@ -49,7 +53,7 @@ def _get_parameter_values(ssm_parameter_prefix: str, top_level_return: str, name
 def _get_parameter_value(ssm_parameter_prefix: str, name: str, namespace: str = 'default') -> Dict[str, any]:
     configuration_json = ssm.get_parameter(
         Name=f'{ssm_parameter_prefix}/{namespace}/{name}')['Parameter']['Value']
-    return json.loads(configuration_json)
+    return load_parameter_value(configuration_json)
 
 
 def _log_and_raise(e, event):
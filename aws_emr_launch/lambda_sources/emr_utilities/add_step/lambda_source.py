@@ -0,0 +1,90 @@
+import json
+import logging
+import time
+from datetime import date, datetime
+
+from botocore.exceptions import ClientError
+
+from emr_config_utils import aws_clients
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+emr = aws_clients.lazy_client('emr')
+sfn = aws_clients.lazy_client('stepfunctions')
+events = aws_clients.lazy_client('events')
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+FAILED_STATES = ['CANCELLED', 'FAILED', 'INTERRUPTED']
+RESOLVED_TOKEN_ERRORS = ['InvalidToken', 'TaskDoesNotExist', 'TaskTimedOut']
+
+
+def json_serial(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+def log_and_raise(e, event):
+    logger.error(f'Error processing event {json.dumps(event)}')
+    logger.exception(e)
+    raise e
+
+
+def remove_none_values(value):
+    if isinstance(value, dict):
+        return {k: remove_none_values(v) for k, v in value.items() if v is not None}
+    elif isinstance(value, list):
+        return [remove_none_values(v) for v in value]
+    return value
+
+
+def send_task_result(task_token: str, step_description: dict, success: bool):
+    output = json.dumps(step_description, default=json_serial)
+    try:
+        if success:
+            sfn.send_task_success(taskToken=task_token, output=output)
+        else:
+            sfn.send_task_failure(taskToken=task_token, error='States.TaskFailed', cause=output)
+    except ClientError as e:
+        # The Step Status Change event may have resolved the TaskToken first
+        if e.response['Error']['Code'] in RESOLVED_TOKEN_ERRORS:
+            logger.info(f'TaskToken already resolved: {task_token}')
+        else:
+            raise e
+
+
+def handler(event, context):
+    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+    cluster_id = event['ClusterId']
+    step = remove_none_values(event['Step'])
+    task_token = event['TaskToken']
+    table = dynamodb.Table(event['TaskTokenTable'])
+    rule_name = event.get('RuleName', None)
+
+    try:
+        step_id = emr.add_job_flow_steps(JobFlowId=cluster_id, Steps=[step])['StepIds'][0]
+
+        # EMR Step Status Change events resolve the TaskToken through CheckClusterStatus
+        logger.info(f'Registering pending Step: {step_id} on Cluster: {cluster_id}')
+        table.put_item(Item={
+            'Id': step_id,
+            'Kind': 'Step',
+            'ClusterId': cluster_id,
+            'TaskToken': task_token,
+            'CreatedAt': int(time.time())
+        })
+        if rule_name:
+            # Polls the pending Steps in case the Step Status Change event is missed
+            logger.info(f'Enabling Rule: {rule_name}')
+            events.enable_rule(Name=rule_name)
+
+        # Catch a Step that finished before it was registered, its event may already be gone
+        step_description = emr.describe_step(ClusterId=cluster_id, StepId=step_id)
+        state = step_description['Step']['Status']['State']
+        if state == 'COMPLETED' or state in FAILED_STATES:
+            step_description['StepId'] = step_id
+            send_task_result(task_token, step_description, state == 'COMPLETED')
+            table.delete_item(Key={'Id': step_id})
+
+    except Exception as e:
+        log_and_raise(e, event)
@@ -1,14 +1,29 @@
 import json
 import logging
-from datetime import date, datetime
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
-import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from emr_config_utils import aws_clients, claim_check, outputs
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-emr = boto3.client('emr')
-events = boto3.client('events')
-sfn = boto3.client('stepfunctions')
+emr = aws_clients.lazy_client('emr')
+events = aws_clients.lazy_client('events')
+sfn = aws_clients.lazy_client('stepfunctions')
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+CLUSTER_STATE_CHANGE_DETAIL_TYPE = 'EMR Cluster State Change'
+STEP_STATUS_CHANGE_DETAIL_TYPE = 'EMR Step Status Change'
+SCHEDULED_EVENT_DETAIL_TYPE = 'Scheduled Event'
+FAILED_STATES = ['TERMINATING', 'TERMINATED', 'TERMINATED_WITH_ERRORS']
+STEP_FAILED_STATES = ['CANCELLED', 'FAILED', 'INTERRUPTED']
+RESOLVED_TOKEN_ERRORS = ['InvalidToken', 'TaskDoesNotExist', 'TaskTimedOut']
+# EventBridge allows at most 5 Targets per Rule
+MAX_TARGETS_PER_RULE = 5
 
 
 def json_serial(obj):
@@ -23,12 +38,329 @@ def log_and_raise(e, event):
     raise e
 
 
+def send_task_result(task_token: str, cluster_description: dict, success: bool,
+                     output_projection: Optional[List[str]] = None, claim_check_config: Optional[dict] = None):
+    # The LaunchClusterResult is checked in, keeping the ClusterId for the States that use it
+    output = claim_check.check_in_json(
+        outputs.project_output(cluster_description, output_projection),
+        claim_check_config if success else None, ['ClusterId'], default=json_serial)
+    try:
+        if success:
+            logger.info(f'Sending Task Success, TaskToken: {task_token}, Output: {output}')
+            sfn.send_task_success(taskToken=task_token, output=output)
+        else:
+            logger.info(f'Sending Task Failure,TaskToken: {task_token}, Output: {output}')
+            sfn.send_task_failure(taskToken=task_token, error='States.TaskFailed', cause=output)
+    except ClientError as e:
+        # The polling Rule and the Cluster State Change events can both resolve
+        # the same TaskToken, only the first one wins
+        if e.response['Error']['Code'] in RESOLVED_TOKEN_ERRORS:
+            logger.info(f'TaskToken already resolved: {task_token}')
+        else:
+            raise e
+
+
+def remove_rule_target(rule_name: str, cluster_id: str):
+    logger.info(f'Removing Rule Targets: {cluster_id}')
+    failed_targets = events.remove_targets(Rule=rule_name, Ids=[cluster_id])
+
+    if failed_targets['FailedEntryCount'] > 0:
+        failed_entries = failed_targets['FailedEntries']
+        raise Exception(f'Failed Removing Targets: {json.dumps(failed_entries)}')
+
+    targets = events.list_targets_by_rule(Rule=rule_name)['Targets']
+    if len(targets) == 0:
+        logger.info(f'Disabling Rule with no Targets: {rule_name}')
+        events.disable_rule(Name=rule_name)
+        # Pooled Rules are shared, re-check to avoid stranding a Target put while we were disabling
+        if len(events.list_targets_by_rule(Rule=rule_name)['Targets']) > 0:
+            logger.info(f'Re-enabling Rule with new Targets: {rule_name}')
+            events.enable_rule(Name=rule_name)
+
+
+def next_check_interval(polling_schedule: dict, state: str, last_state: str, attempts: int):
+    # Back off while the Cluster stays in the same state, reset when it moves on
+    attempts = attempts + 1 if state == last_state else 0
+    interval = polling_schedule['StateIntervals'].get(state, polling_schedule['DefaultInterval'])
+    interval = interval * polling_schedule.get('BackoffRate', 1.0) ** attempts
+
+    max_interval = polling_schedule.get('MaxInterval', None)
+    return (min(interval, max_interval) if max_interval else interval), attempts
+
+
+def polling_rule_names(polling_schedule: dict, interval: float) -> List[str]:
+    # The Rules with the slowest rate not exceeding the interval, or the fastest Rules
+    rates = sorted(int(r) for r in polling_schedule.get('RuleNames', {}))
+    if not rates:
+        return []
+    rate = max((r for r in rates if r <= interval), default=rates[0])
+    return polling_schedule['RuleNames'][str(rate)]
+
+
+def put_target(rule_name: str, context, target_input: dict) -> bool:
+    try:
+        failed_targets = events.put_targets(Rule=rule_name, Targets=[{
+            'Id': target_input['ClusterId'],
+            'Arn': context.invoked_function_arn,
+            'Input': json.dumps(target_input)
+        }])
+    except ClientError as e:
+        # A concurrent launch took the last free slot on this Rule
+        if e.response['Error']['Code'] == 'LimitExceededException':
+            return False
+        raise e
+
+    if failed_targets['FailedEntryCount'] > 0:
+        failed_entries = failed_targets['FailedEntries']
+        raise Exception(f'Failed Putting Targets: {json.dumps(failed_entries)}')
+    return True
+
+
+def reschedule_rule_target(event: dict, context, state: str):
+    polling_schedule = event['PollingSchedule']
+    cluster_id = event['ClusterId']
+    rule_name = event['RuleName']
+    interval, attempts = next_check_interval(
+        polling_schedule, state, event.get('LastState', None), event.get('Attempts', 0))
+    target_input = dict(event, LastState=state, Attempts=attempts)
+
+    # Move the Target to the Rules firing at the next interval, rather than checking
+    # the Cluster at every firing of a faster Rule
+    rule_names = polling_rule_names(polling_schedule, interval)
+    if rule_names and rule_name not in rule_names:
+        for new_rule_name in rule_names:
+            if len(events.list_targets_by_rule(Rule=new_rule_name)['Targets']) >= MAX_TARGETS_PER_RULE:
+                continue
+            if not put_target(new_rule_name, context, dict(target_input, RuleName=new_rule_name)):
+                continue
+
+            logger.info(f'Moving Cluster: {cluster_id} to Rule: {new_rule_name} '
+                        f'(State: {state}, Interval: {interval})')
+            events.enable_rule(Name=new_rule_name)
+            remove_rule_target(rule_name, cluster_id)
+            return
+        logger.info(f'No free Target slots to move Cluster: {cluster_id}, keeping Rule: {rule_name}')
+
+    # Keep the backoff state on the current Target
+    logger.info(f'Rescheduling Cluster: {cluster_id} (State: {state}, Interval: {interval})')
+    if not put_target(rule_name, context, target_input):
+        raise Exception(f'Failed Putting Targets: {cluster_id} on Rule: {rule_name}')
+
+
+def get_task_token_table():
+    table_name = os.environ.get('TASK_TOKEN_TABLE', None)
+    return dynamodb.Table(table_name) if table_name else None
+
+
+def remove_tracked_cluster(cluster_id: str):
+    # Registered for the Cluster State Change events when tracking them
+    table = get_task_token_table()
+    if table is not None:
+        table.delete_item(Key={'Id': cluster_id})
+
+
+def scan_pending_items(table, kind: str) -> list:
+    scan_params = {
+        'FilterExpression': Attr('Kind').eq(kind),
+        'ConsistentRead': True
+    }
+    pending_items = []
+    while True:
+        response = table.scan(**scan_params)
+        pending_items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return pending_items
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def disable_idle_rule(table, kind: str, rule_name: str):
+    logger.info(f'Disabling Rule with no pending {kind}s: {rule_name}')
+    events.disable_rule(Name=rule_name)
+    # Re-check to avoid stranding a launch registered while we were disabling
+    if len(scan_pending_items(table, kind)) > 0:
+        logger.info(f'Re-enabling Rule with new pending {kind}s: {rule_name}')
+        events.enable_rule(Name=rule_name)
+
+
+def list_cluster_states(cluster_states: list, created_after: datetime) -> dict:
+    states = {}
+    paginator = emr.get_paginator('list_clusters')
+    for page in paginator.paginate(ClusterStates=cluster_states, CreatedAfter=created_after):
+        for cluster in page['Clusters']:
+            states[cluster['Id']] = cluster['Status']['State']
+    return states
+
+
+def batch_handler(event, context):
+    rule_name = event['resources'][0].split('/')[-1]
+    table = get_task_token_table()
+
+    try:
+        pending_clusters = scan_pending_items(table, 'Cluster')
+        if len(pending_clusters) == 0:
+            disable_idle_rule(table, 'Cluster', rule_name)
+            return
+
+        # ListClusters only returns Clusters that have resolved, one way or another.
+        # Anything still pending that isn't listed is still starting up.
+        created_after = datetime.utcfromtimestamp(
+            min(int(c['CreatedAt']) for c in pending_clusters)) - timedelta(minutes=5)
+        expected_states = list({c['ExpectedState'] for c in pending_clusters})
+        cluster_states = list_cluster_states(expected_states + FAILED_STATES, created_after)
+        logger.info(f'Checking {len(pending_clusters)} pending Clusters, {len(cluster_states)} resolved')
+
+        for pending_cluster in pending_clusters:
+            cluster_id = pending_cluster['Id']
+            task_token = pending_cluster['TaskToken']
+            state = cluster_states.get(cluster_id, None)
+
+            try:
+                if state == pending_cluster['ExpectedState'] or state in FAILED_STATES:
+                    cluster_description = emr.describe_cluster(ClusterId=cluster_id)
+                    cluster_description['ClusterId'] = cluster_id
+                    send_task_result(task_token, cluster_description, state not in FAILED_STATES,
+                                     pending_cluster.get('OutputProjection', None),
+                                     pending_cluster.get('ClaimCheck', None))
+                else:
+                    sfn.send_task_heartbeat(taskToken=task_token)
+                    continue
+            except ClientError as e:
+                # The waiting execution is gone (aborted or timed out), stop tracking it
+                if e.response['Error']['Code'] not in RESOLVED_TOKEN_ERRORS:
+                    logger.exception(e)
+                    continue
+                logger.info(f'TaskToken no longer valid for Cluster: {cluster_id}')
+
+            logger.info(f'Removing pending Cluster: {cluster_id}')
+            table.delete_item(Key={'Id': cluster_id})
+
+    except Exception as e:
+        log_and_raise(e, event)
+
+
+def cluster_state_change_handler(event, context):
+    detail = event['detail']
+    cluster_id = detail['clusterId']
+    state = detail['state']
+
+    try:
+        table = get_task_token_table()
+        pending_cluster = table.get_item(Key={'Id': cluster_id}, ConsistentRead=True).get('Item', None) \
+            if table is not None \
+            else None
+
+        if pending_cluster is None:
+            logger.info(f'No launch is waiting on Cluster: {cluster_id} (State: {state})')
+            return
+
+        task_token = pending_cluster['TaskToken']
+        expected_state = pending_cluster['ExpectedState']
+
+        if state == expected_state:
+            success = True
+        elif state in FAILED_STATES:
+            success = False
+        else:
+            logger.info(f'Ignoring Cluster State Change: {cluster_id} '
+                        f'(State: {state}, ExpectedState: {expected_state})')
+            return
+
+        cluster_description = emr.describe_cluster(ClusterId=cluster_id)
+        cluster_description['ClusterId'] = cluster_id
+
+        send_task_result(task_token, cluster_description, success, pending_cluster.get('OutputProjection', None),
+                         pending_cluster.get('ClaimCheck', None))
+        # A polled Cluster's Rule Target is removed by its next check, finding the TaskToken resolved
+        logger.info(f'Removing pending Cluster: {cluster_id}')
+        table.delete_item(Key={'Id': cluster_id})
+
+    except Exception as e:
+        log_and_raise(e, event)
+
+
+def step_status_change_handler(event, context):
+    detail = event['detail']
+    step_id = detail['stepId']
+    state = detail['state']
+
+    try:
+        table = get_task_token_table()
+        pending_step = table.get_item(Key={'Id': step_id}, ConsistentRead=True).get('Item', None) \
+            if table is not None \
+            else None
+
+        if pending_step is None:
+            logger.info(f'No launch is waiting on Step: {step_id} (State: {state})')
+            return
+        if state != 'COMPLETED' and state not in STEP_FAILED_STATES:
+            logger.info(f'Ignoring Step Status Change: {step_id} (State: {state})')
+            return
+
+        step_description = emr.describe_step(ClusterId=pending_step['ClusterId'], StepId=step_id)
+        step_description['StepId'] = step_id
+
+        send_task_result(pending_step['TaskToken'], step_description, state == 'COMPLETED')
+        logger.info(f'Removing pending Step: {step_id}')
+        table.delete_item(Key={'Id': step_id})
+
+    except Exception as e:
+        log_and_raise(e, event)
+
+
+def reconcile_steps_handler(event, context):
+    rule_name = event['Resources'][0].split('/')[-1]
+    table = get_task_token_table()
+
+    try:
+        pending_steps = scan_pending_items(table, 'Step')
+        if len(pending_steps) == 0:
+            disable_idle_rule(table, 'Step', rule_name)
+            return
+
+        logger.info(f'Reconciling {len(pending_steps)} pending Steps')
+        for pending_step in pending_steps:
+            step_id = pending_step['Id']
+            task_token = pending_step['TaskToken']
+
+            try:
+                step_description = emr.describe_step(ClusterId=pending_step['ClusterId'], StepId=step_id)
+                state = step_description['Step']['Status']['State']
+                if state == 'COMPLETED' or state in STEP_FAILED_STATES:
+                    step_description['StepId'] = step_id
+                    send_task_result(task_token, step_description, state == 'COMPLETED')
+                else:
+                    # Finds the Steps whose Task has timed out or whose execution is gone
+                    sfn.send_task_heartbeat(taskToken=task_token)
+                    continue
+            except ClientError as e:
+                if e.response['Error']['Code'] not in RESOLVED_TOKEN_ERRORS:
+                    logger.exception(e)
+                    continue
+                logger.info(f'TaskToken no longer valid for Step: {step_id}')
+
+            logger.info(f'Removing pending Step: {step_id}')
+            table.delete_item(Key={'Id': step_id})
+
+    except Exception as e:
+        log_and_raise(e, event)
+
+
 def handler(event, context):
     logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+    if event.get('detail-type', None) == CLUSTER_STATE_CHANGE_DETAIL_TYPE:
+        return cluster_state_change_handler(event, context)
+    if event.get('detail-type', None) == STEP_STATUS_CHANGE_DETAIL_TYPE:
+        return step_status_change_handler(event, context)
+    if event.get('detail-type', None) == SCHEDULED_EVENT_DETAIL_TYPE:
+        return batch_handler(event, context)
+    if event.get('Action', None) == 'ReconcileSteps':
+        return reconcile_steps_handler(event, context)
+
     cluster_id = event['ClusterId']
     task_token = event['TaskToken']
     rule_name = event['RuleName']
     expected_state = event['ExpectedState']
+    polling_schedule = event.get('PollingSchedule', None)
 
     try:
         cluster_description = emr.describe_cluster(ClusterId=cluster_id)
@@ -36,7 +368,7 @@ def handler(event, context):
 
         if state == expected_state:
             success = True
-        elif state in ['TERMINATING', 'TERMINATED', 'TERMINATED_WITH_ERRORS']:
+        elif state in FAILED_STATES:
             success = False
         else:
             heartbeat = {
@@ -47,33 +379,19 @@ def handler(event, context):
             }
             logger.info(f'Sending Task Heartbeat: {heartbeat}')
             sfn.send_task_heartbeat(taskToken=task_token)
+            if polling_schedule:
+                reschedule_rule_target(event, context, state)
             return
 
         cluster_description['ClusterId'] = cluster_id
 
-        if success:
-            logger.info(f'Sending Task Success, TaskToken: {task_token}, '
-                        f'Output: {json.dumps(cluster_description, default=json_serial)}')
-            sfn.send_task_success(taskToken=task_token, output=json.dumps(cluster_description, default=json_serial))
-        else:
-            logger.info(f'Sending Task Failure,TaskToken: {task_token}, '
-                        f'Output: {json.dumps(cluster_description, default=json_serial)}')
-            sfn.send_task_failure(taskToken=task_token, error='States.TaskFailed',
-                                  cause=json.dumps(cluster_description, default=json_serial))
+        send_task_result(task_token, cluster_description, success, event.get('OutputProjection', None),
+                         event.get('ClaimCheck', None))
 
         task_token = None
 
-        logger.info(f'Removing Rule Targets: {cluster_id}')
-        failed_targets = events.remove_targets(Rule=rule_name, Ids=[cluster_id])
-
-        if failed_targets['FailedEntryCount'] > 0:
-            failed_entries = failed_targets['FailedEntries']
-            raise Exception(f'Failed Removing Targets: {json.dumps(failed_entries)}')
-
-        targets = events.list_targets_by_rule(Rule=rule_name)['Targets']
-        if len(targets) == 0:
-            logger.info(f'Disabling Rule with no Targets: {rule_name}')
-            events.disable_rule(Name=rule_name)
+        remove_rule_target(rule_name, cluster_id)
+        remove_tracked_cluster(cluster_id)
 
     except Exception as e:
         try:
@@ -82,6 +400,7 @@ def handler(event, context):
                 sfn.send_task_failure(taskToken=task_token, error='States.TaskFailed', cause=str(e))
             logger.error(f'Removing Rule Targets: {cluster_id}')
             events.remove_targets(Rule=rule_name, Ids=[cluster_id])
+            remove_tracked_cluster(cluster_id)
         except Exception as ee:
             logger.exception(ee)
         raise log_and_raise(e, event)
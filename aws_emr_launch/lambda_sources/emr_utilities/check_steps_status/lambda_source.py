@@ -0,0 +1,75 @@
+import json
+import logging
+from typing import Dict, List
+
+from emr_config_utils import aws_clients
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+emr = aws_clients.lazy_client('emr')
+
+ACTIVE_STATES = ['PENDING', 'CANCEL_PENDING', 'RUNNING']
+FAILED_STATES = ['CANCELLED', 'FAILED', 'INTERRUPTED']
+
+
+class StepFailedError(Exception):
+    pass
+
+
+class StepNotFoundError(Exception):
+    pass
+
+
+def log_and_raise(e, event):
+    logger.error(f'Error processing event {json.dumps(event)}')
+    logger.exception(e)
+    raise e
+
+
+def list_step_states(cluster_id: str, step_ids: List[str]) -> Dict[str, str]:
+    # ListSteps returns the newest Steps first, so a recently added batch is
+    # found in the first few pages without filtering by StepIds 10 at a time
+    remaining = set(step_ids)
+    step_states = {}
+    paginator = emr.get_paginator('list_steps')
+    for page in paginator.paginate(ClusterId=cluster_id):
+        for step in page['Steps']:
+            if step['Id'] in remaining:
+                step_states[step['Id']] = step['Status']['State']
+                remaining.remove(step['Id'])
+        if len(remaining) == 0:
+            break
+    # Steps are listed as soon as AddJobFlowSteps returns, so any not found after
+    # paging through every Step on the Cluster will never complete
+    if remaining:
+        raise StepNotFoundError(f'Steps not found on Cluster {cluster_id}: {json.dumps(sorted(remaining))}')
+    return step_states
+
+
+def handler(event, context):
+    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+    cluster_id = event['ClusterId']
+    step_ids = event['StepIds']
+
+    try:
+        step_states = list_step_states(cluster_id, step_ids)
+
+        failed_steps = {k: v for k, v in step_states.items() if v in FAILED_STATES}
+        if failed_steps:
+            raise StepFailedError(f'Steps failed on Cluster {cluster_id}: {json.dumps(failed_steps)}')
+
+        states = {}
+        for state in step_states.values():
+            states[state] = states.get(state, 0) + 1
+        pending = sum(states.get(s, 0) for s in ACTIVE_STATES)
+
+        logger.info(f'Steps on Cluster {cluster_id}: {json.dumps(states)} ({pending} pending)')
+        return {
+            'ClusterId': cluster_id,
+            'StepIds': step_ids,
+            'StepStates': states,
+            'Complete': pending == 0
+        }
+
+    except Exception as e:
+        log_and_raise(e, event)
@@ -0,0 +1,352 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from emr_config_utils import aws_clients, claim_check, outputs
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+emr = aws_clients.lazy_client('emr')
+sfn = aws_clients.lazy_client('stepfunctions')
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+FINGERPRINT_TAG = 'emr-launch:pool-fingerprint'
+IDLE = 'IDLE'
+CLAIMED = 'CLAIMED'
+MAINTENANCE = 'ClusterPoolMaintenance'
+LIVE_STATES = ['STARTING', 'BOOTSTRAPPING', 'RUNNING', 'WAITING']
+POOL_STATE_INDEX = 'FingerprintPoolState'
+# The only parts of a launch's input that shape its Cluster, and so are kept to launch more like it
+LAUNCH_INPUT_KEYS = ['ClusterConfigurationOverrides', 'ClusterConfigOverrides']
+# Top-up launches not registered within this window are assumed to have failed
+TOP_UP_TIMEOUT_SECONDS = int(os.environ.get('TOP_UP_TIMEOUT_SECONDS', '1800'))
+
+
+def json_serial(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+def log_and_raise(e, event):
+    logger.error(f'Error processing event {json.dumps(event)}')
+    logger.exception(e)
+    raise e
+
+
+def get_pool_table():
+    return dynamodb.Table(os.environ['CLUSTER_POOL_TABLE'])
+
+
+def canonical_fingerprint(cluster_config: dict) -> str:
+    # Tags carry per-launch metadata, everything else determines whether a Cluster can be reused
+    config = {k: v for k, v in cluster_config.items() if k != 'Tags' and v is not None}
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'), default=json_serial)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def prepare_pooled_config(cluster_config: dict):
+    # Pooled Clusters have to stay up between pipelines
+    cluster_config = copy.deepcopy(cluster_config)
+    cluster_config['Instances']['KeepJobFlowAliveWhenNoSteps'] = True
+    fingerprint = canonical_fingerprint(cluster_config)
+
+    tags = [t for t in cluster_config.get('Tags', []) if t['Key'] != FINGERPRINT_TAG]
+    tags.append({'Key': FINGERPRINT_TAG, 'Value': fingerprint})
+    cluster_config['Tags'] = tags
+    return cluster_config, fingerprint
+
+
+def query_pool_clusters(table, fingerprint: str, pool_state: str) -> list:
+    # Only Cluster items have a PoolState, so the index holds nothing else
+    query_params = {
+        'IndexName': POOL_STATE_INDEX,
+        'KeyConditionExpression': Key('Fingerprint').eq(fingerprint) & Key('PoolState').eq(pool_state)
+    }
+    clusters = []
+    while True:
+        response = table.query(**query_params)
+        clusters.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return clusters
+        query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def launch_input(execution_input: dict) -> dict:
+    # Per-run values like Tags, FailIfClusterRunning or Step argument overrides don't carry over to top-ups
+    return {k: v for k, v in execution_input.items() if k in LAUNCH_INPUT_KEYS}
+
+
+def claim_owner(event: dict) -> str:
+    # A Launch Function started by a pipeline ends before the pipeline releases the Cluster,
+    # so the Cluster is held for the parent execution when there is one
+    return event.get('ExecutionInput', {}).get('AWS_STEP_FUNCTIONS_STARTED_BY_EXECUTION_ID', event['ExecutionId'])
+
+
+def claim_cluster(table, cluster_id: str, execution_id: str, condition=Attr('PoolState').eq(IDLE)) -> bool:
+    try:
+        table.update_item(
+            Key={'Id': cluster_id},
+            UpdateExpression='SET PoolState = :claimed, ClaimedBy = :execution, UpdatedAt = :now',
+            ConditionExpression=condition,
+            ExpressionAttributeValues={':claimed': CLAIMED, ':execution': execution_id, ':now': int(time.time())})
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise e
+
+
+def claim_idle_cluster(table, fingerprint: str, execution_id: str, tags: list):
+    for pooled_cluster in query_pool_clusters(table, fingerprint, IDLE):
+        cluster_id = pooled_cluster['Id']
+        if not claim_cluster(table, cluster_id, execution_id):
+            continue
+
+        cluster_description = emr.describe_cluster(ClusterId=cluster_id)
+        if cluster_description['Cluster']['Status']['State'] == 'WAITING':
+            # The Cluster was launched with the Tags of an earlier claimer
+            if tags:
+                emr.add_tags(ResourceId=cluster_id, Tags=tags)
+            cluster_description['ClusterId'] = cluster_id
+            return cluster_description
+
+        logger.info(f'Removing pooled Cluster no longer WAITING: {cluster_id}')
+        table.delete_item(Key={'Id': cluster_id})
+    return None
+
+
+def claim_handler(event, context):
+    table = get_pool_table()
+    execution_input = event.get('ExecutionInput', {})
+    cluster_configuration = event['Input']
+    pool_policy = event.get('ClusterPoolPolicy', {})
+
+    cluster_config, fingerprint = prepare_pooled_config(claim_check.check_out(cluster_configuration['Cluster']))
+    result = dict(cluster_configuration, Cluster=claim_check.check_in(cluster_config, event.get('ClaimCheck', None)),
+                  Fingerprint=fingerprint)
+
+    if execution_input.get('ClusterPoolTopUp', False):
+        logger.info(f'Launching a Cluster to top up the pool: {fingerprint}')
+        return result
+
+    pooled_cluster = claim_idle_cluster(table, fingerprint, claim_owner(event), cluster_config.get('Tags', []))
+    if pooled_cluster is not None:
+        logger.info(f'Claimed pooled Cluster: {pooled_cluster["ClusterId"]} ({fingerprint})')
+        # Stored and referenced the same way as the result of a RunJobFlow launch
+        pooled_cluster = outputs.project_output(pooled_cluster, event.get('OutputProjection', None))
+        result['PooledCluster'] = json.loads(claim_check.check_in_json(
+            pooled_cluster, event.get('ClaimCheck', None), ['ClusterId'], default=json_serial))
+        return result
+
+    logger.info(f'No idle pooled Cluster: {fingerprint}')
+    table.update_item(
+        Key={'Id': f'Fingerprint#{fingerprint}'},
+        UpdateExpression='SET Kind = :kind, Fingerprint = :fingerprint, StateMachineArn = :state_machine, '
+                         'MinIdle = :min_idle, MaxIdle = :max_idle, UpdatedAt = :now',
+        ExpressionAttributeValues={
+            ':kind': 'Fingerprint',
+            ':fingerprint': fingerprint,
+            ':state_machine': event['StateMachineArn'],
+            ':min_idle': pool_policy.get('MinIdle', 0),
+            ':max_idle': pool_policy.get('MaxIdle', 1),
+            ':now': int(time.time())
+        })
+    return result
+
+
+def register_handler(event, context):
+    table = get_pool_table()
+    execution_input = event.get('ExecutionInput', {})
+    top_up = execution_input.get('ClusterPoolTopUp', False)
+    launch_cluster_result = event['LaunchClusterResult']
+    cluster_id = launch_cluster_result.get('ClusterId', launch_cluster_result.get('JobFlowId', None))
+    fingerprint = event['Fingerprint']
+
+    logger.info(f'Registering pooled Cluster: {cluster_id} ({fingerprint}, TopUp: {top_up})')
+    item = {
+        'Id': cluster_id,
+        'Kind': 'Cluster',
+        'Fingerprint': fingerprint,
+        'PoolState': IDLE if top_up else CLAIMED,
+        'UpdatedAt': int(time.time())
+    }
+    if not top_up:
+        item['ClaimedBy'] = claim_owner(event)
+    table.put_item(Item=item)
+
+    if not top_up:
+        # Keep what's needed to launch more Clusters like this one when topping up the pool
+        table.update_item(
+            Key={'Id': f'Fingerprint#{fingerprint}'},
+            UpdateExpression='SET LaunchInput = :launch_input',
+            ExpressionAttributeValues={':launch_input': json.dumps(launch_input(execution_input))})
+    else:
+        try:
+            table.update_item(
+                Key={'Id': f'Fingerprint#{fingerprint}'},
+                UpdateExpression='SET PendingTopUps = PendingTopUps - :one',
+                ConditionExpression=Attr('PendingTopUps').gt(0),
+                ExpressionAttributeValues={':one': 1})
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise e
+
+
+def terminate_cluster(table, cluster_id: str):
+    logger.info(f'Terminating pooled Cluster: {cluster_id}')
+    emr.terminate_job_flows(JobFlowIds=[cluster_id])
+    table.delete_item(Key={'Id': cluster_id})
+
+
+def release_handler(event, context):
+    table = get_pool_table()
+    cluster_id = event['ClusterId']
+
+    pooled_cluster = table.get_item(Key={'Id': cluster_id}, ConsistentRead=True).get('Item', None)
+    if pooled_cluster is None:
+        logger.info(f'Cluster is not pooled: {cluster_id}')
+        return {'ClusterId': cluster_id, 'Released': False}
+
+    fingerprint = pooled_cluster['Fingerprint']
+    fingerprint_record = table.get_item(Key={'Id': f'Fingerprint#{fingerprint}'}, ConsistentRead=True) \
+        .get('Item', {})
+    max_idle = int(fingerprint_record.get('MaxIdle', 1))
+
+    if len(query_pool_clusters(table, fingerprint, IDLE)) >= max_idle:
+        terminate_cluster(table, cluster_id)
+        return {'ClusterId': cluster_id, 'Released': False}
+
+    logger.info(f'Returning Cluster to the pool: {cluster_id} ({fingerprint})')
+    table.update_item(
+        Key={'Id': cluster_id},
+        UpdateExpression='SET PoolState = :idle, UpdatedAt = :now REMOVE ClaimedBy',
+        ExpressionAttributeValues={':idle': IDLE, ':now': int(time.time())})
+    return {'ClusterId': cluster_id, 'Released': True}
+
+
+def list_live_clusters() -> dict:
+    cluster_states = {}
+    paginator = emr.get_paginator('list_clusters')
+    for page in paginator.paginate(ClusterStates=LIVE_STATES):
+        cluster_states.update({c['Id']: c['Status']['State'] for c in page['Clusters']})
+    return cluster_states
+
+
+def is_execution_running(execution_arn: str) -> bool:
+    if execution_arn == MAINTENANCE:
+        # Left behind by a maintenance run that failed to terminate the Cluster
+        return False
+    try:
+        return sfn.describe_execution(executionArn=execution_arn)['status'] == 'RUNNING'
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ExecutionDoesNotExist':
+            return False
+        raise e
+
+
+def maintain_claimed_clusters(table, fingerprint: str, live_clusters: dict):
+    for pooled_cluster in query_pool_clusters(table, fingerprint, CLAIMED):
+        cluster_id = pooled_cluster['Id']
+        claimed_by = pooled_cluster.get('ClaimedBy', MAINTENANCE)
+        if cluster_id not in live_clusters:
+            logger.info(f'Removing pooled Cluster no longer alive: {cluster_id}')
+            table.delete_item(Key={'Id': cluster_id})
+        elif not is_execution_running(claimed_by):
+            # The claimer ended without releasing the Cluster. The condition skips a Cluster
+            # released and claimed again since the scan
+            logger.info(f'Claiming execution is no longer RUNNING: {claimed_by}')
+            if claim_cluster(table, cluster_id, MAINTENANCE, Attr('ClaimedBy').eq(claimed_by)):
+                terminate_cluster(table, cluster_id)
+
+
+def maintain_fingerprint(table, fingerprint_record: dict, live_clusters: dict):
+    fingerprint = fingerprint_record['Fingerprint']
+    min_idle = int(fingerprint_record.get('MinIdle', 0))
+    max_idle = int(fingerprint_record.get('MaxIdle', 1))
+
+    maintain_claimed_clusters(table, fingerprint, live_clusters)
+
+    idle_clusters = []
+    for pooled_cluster in query_pool_clusters(table, fingerprint, IDLE):
+        if live_clusters.get(pooled_cluster['Id'], None) == 'WAITING':
+            idle_clusters.append(pooled_cluster)
+        else:
+            logger.info(f'Removing pooled Cluster no longer WAITING: {pooled_cluster["Id"]}')
+            table.delete_item(Key={'Id': pooled_cluster['Id']})
+
+    # Oldest idle Clusters are the first to go
+    idle_clusters.sort(key=lambda c: c['UpdatedAt'])
+    for pooled_cluster in idle_clusters[0:max(len(idle_clusters) - max_idle, 0)]:
+        if claim_cluster(table, pooled_cluster['Id'], MAINTENANCE):
+            terminate_cluster(table, pooled_cluster['Id'])
+
+    pending_top_ups = int(fingerprint_record.get('PendingTopUps', 0)) \
+        if time.time() - int(fingerprint_record.get('TopUpRequestedAt', 0)) < TOP_UP_TIMEOUT_SECONDS \
+        else 0
+    top_ups = min_idle - len(idle_clusters) - pending_top_ups
+    if top_ups <= 0:
+        return
+    if 'LaunchInput' not in fingerprint_record:
+        logger.info(f'No Cluster launched yet to top up the pool with: {fingerprint}')
+        return
+
+    logger.info(f'Topping up the pool with {top_ups} Clusters: {fingerprint}')
+    execution_input = dict(json.loads(fingerprint_record['LaunchInput']), ClusterPoolTopUp=True)
+    for _ in range(top_ups):
+        sfn.start_execution(
+            stateMachineArn=fingerprint_record['StateMachineArn'],
+            input=json.dumps(execution_input))
+
+    table.update_item(
+        Key={'Id': fingerprint_record['Id']},
+        UpdateExpression='SET PendingTopUps = :pending, TopUpRequestedAt = :now',
+        ExpressionAttributeValues={':pending': pending_top_ups + top_ups, ':now': int(time.time())})
+
+
+def maintain_handler(event, context):
+    table = get_pool_table()
+    state_machine_arn = event['StateMachineArn']
+
+    scan_params = {
+        'FilterExpression': Attr('Kind').eq('Fingerprint') & Attr('StateMachineArn').eq(state_machine_arn),
+        'ConsistentRead': True
+    }
+    fingerprint_records = []
+    while True:
+        response = table.scan(**scan_params)
+        fingerprint_records.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if len(fingerprint_records) == 0:
+        return
+
+    live_clusters = list_live_clusters()
+    for fingerprint_record in fingerprint_records:
+        # The deployed policy wins over the one recorded by earlier launches
+        fingerprint_record.update(event.get('ClusterPoolPolicy', {}))
+        maintain_fingerprint(table, fingerprint_record, live_clusters)
+
+
+def handler(event, context):
+    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+    handlers = {
+        'Claim': claim_handler,
+        'Register': register_handler,
+        'Release': release_handler,
+        'Maintain': maintain_handler
+    }
+
+    try:
+        return handlers[event['Action']](event, context)
+    except Exception as e:
+        log_and_raise(e, event)
@@ -1,11 +1,24 @@
 import json
 import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
-import boto3
+from emr_config_utils import aws_clients, claim_check
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-emr = boto3.client('emr')
+emr = aws_clients.lazy_client('emr')
+
+ACTIVE_STATES = ['STARTING', 'BOOTSTRAPPING', 'RUNNING', 'WAITING']
+
+# The index is shared across warm invocations, keep it short-lived so newly
+# started Clusters are picked up quickly. Set to 0 to disable.
+CLUSTER_INDEX_TTL_SECONDS = int(os.environ.get('CLUSTER_INDEX_TTL_SECONDS', '15'))
+
+_cluster_index: Dict[str, List[dict]] = {}
+_cluster_index_expires_at = 0.0
 
 
 class ClusterRunningError(Exception):
@@ -16,39 +29,79 @@ def parse_bool(v: str) -> bool:
     return str(v).lower() in ("yes", "true", "t", "1")
 
 
+def get_cluster_index() -> Dict[str, List[dict]]:
+    global _cluster_index, _cluster_index_expires_at
+
+    if time.time() >= _cluster_index_expires_at:
+        cluster_index = {}
+        paginator = emr.get_paginator('list_clusters')
+        for page in paginator.paginate(ClusterStates=ACTIVE_STATES):
+            for cluster in page['Clusters']:
+                cluster_index.setdefault(cluster['Name'], []).append(cluster)
+
+        logger.info(f'Indexed {sum(len(c) for c in cluster_index.values())} active Clusters')
+        _cluster_index = cluster_index
+        _cluster_index_expires_at = time.time() + CLUSTER_INDEX_TTL_SECONDS
+    return _cluster_index
+
+
+def has_tags(cluster_id: str, tags: Dict[str, str]) -> bool:
+    cluster = emr.describe_cluster(ClusterId=cluster_id)['Cluster']
+    cluster_tags = {t['Key']: t['Value'] for t in cluster.get('Tags', [])}
+    return all(cluster_tags.get(k, None) == v for k, v in tags.items())
+
+
+def find_running_cluster(cluster_name: str, running_cluster_filter: Optional[dict] = None) -> Optional[dict]:
+    running_cluster_filter = {} if running_cluster_filter is None else running_cluster_filter
+    created_within_minutes = running_cluster_filter.get('CreatedWithinMinutes', None)
+    tags = running_cluster_filter.get('Tags', None)
+
+    created_after = datetime.now(timezone.utc) - timedelta(minutes=float(created_within_minutes)) \
+        if created_within_minutes is not None \
+        else None
+
+    for cluster in get_cluster_index().get(cluster_name, []):
+        if created_after and cluster['Status']['Timeline']['CreationDateTime'] < created_after:
+            continue
+        # Tags aren't returned by ListClusters, only describe the Clusters matching by name
+        if tags and not has_tags(cluster['Id'], tags):
+            continue
+        return cluster
+    return None
+
+
+def fail_if_cluster_running(cluster_config: dict, execution_input: dict,
+                            default_fail_if_cluster_running: bool) -> dict:
+    # This will work for {"JobInput": {"FailIfClusterRunning": true}} or {"FailIfClusterRunning": true}
+    fail_if_cluster_running = parse_bool(
+        execution_input.get('FailIfClusterRunning', default_fail_if_cluster_running))
+
+    # check if job flow already exists
+    if fail_if_cluster_running:
+        cluster_name = cluster_config.get('Name', '')
+        logger.info(f'Checking if job flow "{cluster_name}" is running already')
+        running_cluster = find_running_cluster(cluster_name, execution_input.get('RunningClusterFilter', None))
+
+        if running_cluster is not None:
+            logger.info(f'Job flow {cluster_name} is already running: terminate? {fail_if_cluster_running}')
+            raise ClusterRunningError(
+                f'Found running Cluster with name {cluster_name}. '
+                f'ClusterId: {running_cluster["Id"]}. FailIfClusterRunning is {fail_if_cluster_running}')
+
+    return cluster_config
+
+
 def handler(event, context):
 
     try:
         logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
         default_fail_if_cluster_running = parse_bool(event.get('DefaultFailIfClusterRunning', False))
 
-        # This will work for {"JobInput": {"FailIfClusterRunning": true}} or {"FailIfClusterRunning": true}
-        fail_if_cluster_running = parse_bool(
-            event.get('ExecutionInput', event).get('FailIfClusterRunning', default_fail_if_cluster_running))
-
-        # check if job flow already exists
-        if fail_if_cluster_running:
-            cluster_name = event.get('Input', {}).get('Name', '')
-            cluster_is_running = False
-            logger.info(f'Checking if job flow "{cluster_name}" is running already')
-            response = emr.list_clusters(ClusterStates=['STARTING', 'BOOTSTRAPPING', 'RUNNING', 'WAITING'])
-            for job_flow_running in response['Clusters']:
-                jf_name = job_flow_running['Name']
-                cluster_id = job_flow_running['Id']
-                if jf_name == cluster_name:
-                    logger.info(f'Job flow {cluster_name} is already running: terminate? {fail_if_cluster_running}')
-                    cluster_is_running = True
-                    break
-
-            if cluster_is_running and fail_if_cluster_running:
-                raise ClusterRunningError(
-                    f'Found running Cluster with name {cluster_name}. '
-                    f'ClusterId: {cluster_id}. FailIfClusterRunning is {fail_if_cluster_running}')
-            else:
-                return event['Input']
-
-        else:
-            return event['Input']
+        # Only the Name is needed, a checked-in Cluster configuration is passed through as is
+        cluster_config = event['Input']
+        fail_if_cluster_running(
+            claim_check.check_out(cluster_config), event.get('ExecutionInput', event), default_fail_if_cluster_running)
+        return cluster_config
 
     except Exception as e:
         logger.error(f'Error processing event {json.dumps(event)}')
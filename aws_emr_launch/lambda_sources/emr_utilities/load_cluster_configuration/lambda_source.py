@@ -1,19 +1,24 @@
+import copy
 import json
 import logging
 import os
+import time
 from typing import Dict, List
 
-import boto3
-from botocore.exceptions import ClientError
+from emr_config_utils import aws_clients, claim_check, parameter_storage
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-emr = boto3.client('emr')
 
-PROFILES_SSM_PARAMETER_PREFIX = '/emr_launch/emr_profiles'
-CONFIGURATIONS_SSM_PARAMETER_PREFIX = '/emr_launch/cluster_configurations'
+PROFILES_SSM_PARAMETER_PREFIX = os.environ.get('PROFILES_SSM_PARAMETER_PREFIX', '/emr_launch/emr_profiles')
+CONFIGURATIONS_SSM_PARAMETER_PREFIX = os.environ.get('CONFIGURATIONS_SSM_PARAMETER_PREFIX',
+                                                     '/emr_launch/cluster_configurations')
 
-ssm = boto3.client('ssm')
+ssm = aws_clients.lazy_client('ssm')
+
+PARAMETER_CACHE_TTL_SECONDS = int(os.environ.get('PARAMETER_CACHE_TTL_SECONDS', '60'))
+
+_parameter_cache: Dict[str, dict] = {}
 
 
 class EMRProfileNotFoundError(Exception):
@@ -24,10 +29,36 @@ class ClusterConfigurationNotFoundError(Exception):
     pass
 
 
-def get_parameter_value(ssm_parameter_prefix: str, name: str, namespace: str = 'default'):
-    configuration_json = ssm.get_parameter(
-        Name=f'{ssm_parameter_prefix}/{namespace}/{name}')['Parameter']['Value']
-    return json.loads(configuration_json)
+def get_parameter_values(names: List[str]) -> Dict[str, dict]:
+    # Warm invocations serve recently read Parameters from memory. After the TTL the
+    # Parameters are re-read, but the JSON is only re-parsed if the Version changed.
+    now = time.time()
+    values = {}
+    expired_names = []
+    for name in names:
+        cached = _parameter_cache.get(name, None)
+        if cached is not None and cached['ExpiresAt'] > now:
+            values[name] = cached['Value']
+        else:
+            expired_names.append(name)
+
+    if expired_names:
+        response = ssm.get_parameters(Names=expired_names)
+        for parameter in response['Parameters']:
+            name = parameter['Name']
+            cached = _parameter_cache.get(name, None)
+            if cached is None or cached['Version'] != parameter['Version']:
+                cached = {'Version': parameter['Version'],
+                          'Value': parameter_storage.load_parameter_value(parameter['Value'])}
+            cached['ExpiresAt'] = now + PARAMETER_CACHE_TTL_SECONDS
+            _parameter_cache[name] = cached
+            values[name] = cached['Value']
+
+        for name in response['InvalidParameters']:
+            _parameter_cache.pop(name, None)
+
+    # Callers modify the values, so never hand out the cached copy
+    return {name: copy.deepcopy(value) for name, value in values.items()}
 
 
 def log_and_raise(e, event):
@@ -53,82 +84,79 @@ def update_configurations(configurations: List[dict], classification: str, prope
     return configurations
 
 
-def handler(event, context):
-    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
-    cluster_name = event.get('ClusterName', '')
-    tags = event.get('ClusterTags', [])
-    profile_namespace = event.get('ProfileNamespace', '')
-    profile_name = event.get('ProfileName', '')
-    configuration_namespace = event.get('ConfigurationNamespace', '')
-    configuration_name = event.get('ConfigurationName', '')
-
+def load_cluster_configuration(cluster_name: str, tags: List[dict], profile_namespace: str, profile_name: str,
+                               configuration_namespace: str, configuration_name: str) -> dict:
     if not cluster_name:
         cluster_name = configuration_name
 
-    emr_profile = None
-    cluster_configuration = None
+    profile_parameter = f'{PROFILES_SSM_PARAMETER_PREFIX}/{profile_namespace}/{profile_name}'
+    configuration_parameter = \
+        f'{CONFIGURATIONS_SSM_PARAMETER_PREFIX}/{configuration_namespace}/{configuration_name}'
+
+    # Fetch the EMRProfile and ClusterConfiguration in a single call
+    values = get_parameter_values([profile_parameter, configuration_parameter])
+
+    emr_profile = values.get(profile_parameter, None)
+    if emr_profile is None:
+        raise EMRProfileNotFoundError(f'ProfileNotFound: {profile_namespace}/{profile_name}')
+    logger.info(f'ProfileFound: {json.dumps(emr_profile)}')
+
+    cluster_configuration = values.get(configuration_parameter, None)
+    if cluster_configuration is None:
+        raise ClusterConfigurationNotFoundError(
+            f'ConfigurationNotFound: {configuration_namespace}/{configuration_name}')
+    logger.info(f'ConfigurationFound: {json.dumps(cluster_configuration)}')
+
+    logs_bucket = emr_profile.get('LogsBucket', None)
+    logs_path = emr_profile.get('LogsPath', '')
+
+    kerberos_attributes_secret = emr_profile.get('KerberosAttributesSecret', None)
+    secret_configurations = cluster_configuration.get('SecretConfigurations', None)
+    cluster_configuration = cluster_configuration['ClusterConfiguration']
+
+    cluster_configuration['Name'] = cluster_name
+    cluster_configuration['LogUri'] = \
+        os.path.join(f's3://{logs_bucket}', logs_path, cluster_name) if logs_bucket else None
+    cluster_configuration['JobFlowRole'] = emr_profile['Roles']['InstanceRole'].split('/')[-1]
+    cluster_configuration['ServiceRole'] = emr_profile['Roles']['ServiceRole'].split('/')[-1]
+    cluster_configuration['AutoScalingRole'] = emr_profile['Roles']['AutoScalingRole'].split('/')[-1] \
+        if cluster_configuration['Instances'].get('InstanceGroups', []) \
+        and len(cluster_configuration['Instances'].get('InstanceGroups', [])) > 0 else None
+    cluster_configuration['Tags'] = tags
+    cluster_configuration['Instances']['EmrManagedMasterSecurityGroup'] = \
+        emr_profile['SecurityGroups']['MasterGroup']
+    cluster_configuration['Instances']['EmrManagedSlaveSecurityGroup'] = \
+        emr_profile['SecurityGroups']['WorkersGroup']
+    cluster_configuration['Instances']['ServiceAccessSecurityGroup'] = \
+        emr_profile['SecurityGroups'].get('ServiceGroup', None)
+    cluster_configuration['SecurityConfiguration'] = emr_profile.get('SecurityConfiguration', None)
+
+    # Set a default for new Parameters added to the RunJobFlow API that may
+    # not be stored on existing ClusterConfigurations
+    cluster_configuration['ManagedScalingPolicy'] = cluster_configuration.get('ManagedScalingPolicy', None)
+
+    return {
+        'Cluster': cluster_configuration,
+        'SecretConfigurations': secret_configurations,
+        'KerberosAttributesSecret': kerberos_attributes_secret
+    }
 
-    try:
-        emr_profile = get_parameter_value(
-            ssm_parameter_prefix=PROFILES_SSM_PARAMETER_PREFIX,
-            namespace=profile_namespace,
-            name=profile_name)
-        logger.info(f'ProfileFound: {json.dumps(emr_profile)}')
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ParameterNotFound':
-            log_and_raise(EMRProfileNotFoundError(f'ProfileNotFound: {profile_namespace}/{profile_name}'), event)
-        else:
-            log_and_raise(e, event)
 
-    try:
-        cluster_configuration = get_parameter_value(
-            ssm_parameter_prefix=CONFIGURATIONS_SSM_PARAMETER_PREFIX,
-            namespace=configuration_namespace,
-            name=configuration_name)
-        logger.info(f'ConfigurationFound: {json.dumps(cluster_configuration)}')
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ParameterNotFound':
-            log_and_raise(ClusterConfigurationNotFoundError(
-                f'ConfigurationNotFound: {configuration_namespace}/{configuration_name}'), event)
-        else:
-            log_and_raise(e, event)
+def handler(event, context):
+    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
 
     try:
-        logs_bucket = emr_profile.get('LogsBucket', None)
-        logs_path = emr_profile.get('LogsPath', '')
-
-        kerberos_attributes_secret = emr_profile.get('KerberosAttributesSecret', None)
-        secret_configurations = cluster_configuration.get('SecretConfigurations', None)
-        cluster_configuration = cluster_configuration['ClusterConfiguration']
-
-        cluster_configuration['Name'] = cluster_name
-        cluster_configuration['LogUri'] = \
-            os.path.join(f's3://{logs_bucket}', logs_path, cluster_name) if logs_bucket else None
-        cluster_configuration['JobFlowRole'] = emr_profile['Roles']['InstanceRole'].split('/')[-1]
-        cluster_configuration['ServiceRole'] = emr_profile['Roles']['ServiceRole'].split('/')[-1]
-        cluster_configuration['AutoScalingRole'] = emr_profile['Roles']['AutoScalingRole'].split('/')[-1] \
-            if cluster_configuration['Instances'].get('InstanceGroups', []) \
-            and len(cluster_configuration['Instances'].get('InstanceGroups', [])) > 0 else None
-        cluster_configuration['Tags'] = tags
-        cluster_configuration['Instances']['EmrManagedMasterSecurityGroup'] = \
-            emr_profile['SecurityGroups']['MasterGroup']
-        cluster_configuration['Instances']['EmrManagedSlaveSecurityGroup'] = \
-            emr_profile['SecurityGroups']['WorkersGroup']
-        cluster_configuration['Instances']['ServiceAccessSecurityGroup'] = \
-            emr_profile['SecurityGroups'].get('ServiceGroup', None)
-        cluster_configuration['SecurityConfiguration'] = emr_profile.get('SecurityConfiguration', None)
-
-        # Set a default for new Parameters added to the RunJobFlow API that may
-        # not be stored on existing ClusterConfigurations
-        cluster_configuration['ManagedScalingPolicy'] = cluster_configuration.get('ManagedScalingPolicy', None)
-
-        cluster = {
-            'Cluster': cluster_configuration,
-            'SecretConfigurations': secret_configurations,
-            'KerberosAttributesSecret': kerberos_attributes_secret
-        }
+        cluster = load_cluster_configuration(
+            cluster_name=event.get('ClusterName', ''),
+            tags=event.get('ClusterTags', []),
+            profile_namespace=event.get('ProfileNamespace', ''),
+            profile_name=event.get('ProfileName', ''),
+            configuration_namespace=event.get('ConfigurationNamespace', ''),
+            configuration_name=event.get('ConfigurationName', ''))
         logger.info(f'ClusterConfiguration: {json.dumps(cluster)}')
 
+        cluster['Cluster'] = claim_check.check_in(cluster['Cluster'], event.get('ClaimCheck', None))
+
         return cluster
 
     except Exception as e:
@@ -1,68 +1,148 @@
 import json
 import logging
+from typing import Optional
 
-import boto3
-
-from dictor import dictor
+from emr_config_utils import claim_check
+from emr_config_utils.override_paths import (InvalidOverridePathError,
+                                             format_path, match_keys,
+                                             tokenize_path)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-emr = boto3.client('emr')
 
 
 class InvalidOverrideError(Exception):
     pass
 
 
-def handler(event, context):
-    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+def get_overrides(execution_input: dict) -> dict:
     # This will work with ClusterConfigurationOverrides or ClusterConfigOverrides
-    overrides = event.get('ExecutionInput', {}).get('ClusterConfigurationOverrides', None)
+    overrides = execution_input.get('ClusterConfigurationOverrides', None)
     if overrides is None:
-        overrides = event.get('ExecutionInput', {}).get('ClusterConfigOverrides', {})
+        overrides = execution_input.get('ClusterConfigOverrides', {})
+    return overrides
 
-    allowed_overrides = event.get('AllowedClusterConfigOverrides', None)
-    cluster_config = event.get('Input', {})
 
+def override_cluster_configs(cluster_config: dict, overrides: dict, allowed_overrides: Optional[dict]) -> dict:
     if overrides and not allowed_overrides:
         raise InvalidOverrideError('Cluster configuration overrides are not allowed')
 
-    try:
-        for path, new_value in overrides.items():
-            minimum = None
-            maximum = None
-
-            new_path = allowed_overrides.get(path, None)
-            if new_path is None:
-                raise InvalidOverrideError(f'Value "{path}" is not an allowed cluster configuration override')
-            else:
-                path = new_path['JsonPath']
-                minimum = new_path.get('Minimum', None)
-                maximum = new_path.get('Maximum', None)
-
-            path_parts = path.split('.')
-            update_key = path_parts[-1]
-            key_path = '.'.join(path_parts[0:-1])
-
-            update_key = int(update_key) if update_key.isdigit() else update_key
-            update_attr = cluster_config \
-                if key_path == '' else dictor(cluster_config, key_path)
-
-            if update_attr is None or update_attr.get(update_key, None) is None:
-                raise InvalidOverrideError(f'The update path "{path}" was not found in the cluster configuration')
-
-            logger.info(f'Path: "{key_path}" CurrentValue: "{update_attr[update_key]}" NewValue: "{new_value}"')
-            if (minimum or maximum) and (isinstance(new_value, int) or isinstance(new_value, float)):
-                if minimum and new_value < minimum:
-                    raise InvalidOverrideError(f'The Override Value ({new_value}) '
-                                               f'is less than the Minimum allowed ({minimum})')
-                if maximum and new_value > maximum:
-                    raise InvalidOverrideError(f'The Override Value ({new_value}) '
-                                               f'is greater than the Maximum allowed ({maximum})')
-
+    for path, new_value in overrides.items():
+        minimum = None
+        maximum = None
+
+        new_path = allowed_overrides.get(path, None)
+        if new_path is None:
+            raise InvalidOverrideError(f'Value "{path}" is not an allowed cluster configuration override')
+        else:
+            path = new_path['JsonPath']
+            minimum = new_path.get('Minimum', None)
+            maximum = new_path.get('Maximum', None)
+
+        try:
+            targets = find_update_targets(cluster_config, tokenize_path(path))
+        except InvalidOverridePathError as e:
+            raise InvalidOverrideError(str(e))
+        if len(targets) == 0:
+            raise InvalidOverrideError(f'The update path "{path}" was not found in the cluster configuration')
+
+        if (minimum or maximum) and (isinstance(new_value, int) or isinstance(new_value, float)):
+            if minimum and new_value < minimum:
+                raise InvalidOverrideError(f'The Override Value ({new_value}) '
+                                           f'is less than the Minimum allowed ({minimum})')
+            if maximum and new_value > maximum:
+                raise InvalidOverrideError(f'The Override Value ({new_value}) '
+                                           f'is greater than the Maximum allowed ({maximum})')
+
+        for update_attr, update_key in targets:
+            logger.info(f'Path: "{path}" CurrentValue: "{update_attr[update_key]}" NewValue: "{new_value}"')
             update_attr[update_key] = new_value
 
-        return cluster_config
+    return cluster_config
+
+
+def check_override_value(name: str, new_value, plan_entry: dict):
+    value_type = plan_entry.get('Type', None)
+    is_number = isinstance(new_value, (int, float)) and not isinstance(new_value, bool)
+    type_matches = {
+        'string': isinstance(new_value, str),
+        'number': is_number,
+        'boolean': isinstance(new_value, bool),
+        'array': isinstance(new_value, list),
+        'object': isinstance(new_value, dict)
+    }.get(value_type, True)
+    if not type_matches:
+        raise InvalidOverrideError(f'The Override Value ({new_value}) of "{name}" is not a {value_type}')
+
+    minimum = plan_entry.get('Minimum', None)
+    maximum = plan_entry.get('Maximum', None)
+    if is_number and minimum is not None and new_value < minimum:
+        raise InvalidOverrideError(f'The Override Value ({new_value}) '
+                                   f'is less than the Minimum allowed ({minimum})')
+    if is_number and maximum is not None and new_value > maximum:
+        raise InvalidOverrideError(f'The Override Value ({new_value}) '
+                                   f'is greater than the Maximum allowed ({maximum})')
+
+
+def find_update_targets(cluster_config: dict, path: list) -> list:
+    # Wildcards and selectors can match several items, e.g. every TASK InstanceGroup
+    *parent_path, update_token = path
+    parents = [cluster_config]
+    for token in parent_path:
+        parents = [p[k] for p in parents for k in match_keys(p, token)]
+    return [(p, k) for p in parents for k in match_keys(p, update_token) if p[k] is not None]
+
+
+def apply_override_plan(cluster_config: dict, overrides: dict, override_plan: Optional[dict]) -> dict:
+    # The plan's paths are tokenized and validated at synth, so each override is a direct walk
+    if overrides and not override_plan:
+        raise InvalidOverrideError('Cluster configuration overrides are not allowed')
+
+    for name, new_value in overrides.items():
+        plan_entry = override_plan.get(name, None)
+        if plan_entry is None:
+            raise InvalidOverrideError(f'Value "{name}" is not an allowed cluster configuration override')
+
+        path = format_path(plan_entry['Path'])
+        targets = find_update_targets(cluster_config, plan_entry['Path'])
+        if len(targets) == 0:
+            raise InvalidOverrideError(f'The update path "{path}" was not found in the cluster configuration')
+
+        # An array of values for a path matching several items sets them item by item
+        if isinstance(new_value, list) and plan_entry.get('Type', None) != 'array':
+            if len(new_value) != len(targets):
+                raise InvalidOverrideError(f'The Override "{name}" has {len(new_value)} values '
+                                           f'but the path "{path}" matches {len(targets)} items')
+            new_values = new_value
+        else:
+            new_values = [new_value] * len(targets)
+
+        for value in new_values:
+            check_override_value(name, value, plan_entry)
+        for (update_attr, update_key), value in zip(targets, new_values):
+            logger.info(f'Override: "{name}" Path: "{path}" CurrentValue: "{update_attr[update_key]}" '
+                        f'NewValue: "{value}"')
+            update_attr[update_key] = value
+
+    return cluster_config
+
+
+def handler(event, context):
+    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+    overrides = get_overrides(event.get('ExecutionInput', {}))
+    allowed_overrides = event.get('AllowedClusterConfigOverrides', None)
+    override_plan = event.get('ClusterConfigOverridePlan', None)
+    claim_check_config = event.get('ClaimCheck', None)
+
+    try:
+        cluster_config = claim_check.check_out(event.get('Input', {}))
+
+        # Launch Functions deployed before the plan was compiled only have the allowed overrides
+        if override_plan is not None:
+            cluster_config = apply_override_plan(cluster_config, overrides, override_plan)
+        else:
+            cluster_config = override_cluster_configs(cluster_config, overrides, allowed_overrides)
+        return claim_check.check_in(cluster_config, claim_check_config)
 
     except Exception as e:
         logger.error(f'Error processing event {json.dumps(event)}')
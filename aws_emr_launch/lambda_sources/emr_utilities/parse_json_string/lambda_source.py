@@ -1,6 +1,8 @@
 import json
 import logging
 
+from emr_config_utils import claim_check, outputs
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -8,9 +10,19 @@ logger.setLevel(logging.INFO)
 def handler(event, context):
     logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
     json_string = event.get('JsonString', {})
+    output_projection = event.get('OutputProjection', None)
+    claim_check_config = event.get('ClaimCheck', None)
 
     try:
-        return json.loads(json_string)
+        output = json.loads(json_string)
+        if output_projection and isinstance(output, dict):
+            output = outputs.project_paths(output, output_projection)
+
+        if claim_check_config and isinstance(output, dict):
+            # Each value is checked in on its own, keeping the paths later States read
+            # and the ClusterId of a nested launch inline
+            output = {k: claim_check.check_in(v, claim_check_config, ['ClusterId']) for k, v in output.items()}
+        return output
 
     except Exception as e:
         logger.error(f'Error processing event {json.dumps(event)}')
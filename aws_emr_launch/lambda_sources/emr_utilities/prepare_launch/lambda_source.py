@@ -0,0 +1,56 @@
+import json
+import logging
+
+from emr_config_utils import claim_check
+# The individual preparation steps are copied into this Lambda's asset when it's
+# built, so they're shared rather than duplicated
+from fail_if_cluster_running import lambda_source as fail_if_cluster_running
+from load_cluster_configuration import \
+    lambda_source as load_cluster_configuration
+from override_cluster_configs import lambda_source as override_cluster_configs
+from update_cluster_tags import lambda_source as update_cluster_tags
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def log_and_raise(e, event):
+    logger.error(f'Error processing event {json.dumps(event)}')
+    logger.exception(e)
+    raise e
+
+
+def handler(event, context):
+    logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
+    execution_input = event.get('ExecutionInput', {})
+
+    try:
+        cluster = load_cluster_configuration.load_cluster_configuration(
+            cluster_name=event.get('ClusterName', ''),
+            tags=event.get('ClusterTags', []),
+            profile_namespace=event.get('ProfileNamespace', ''),
+            profile_name=event.get('ProfileName', ''),
+            configuration_namespace=event.get('ConfigurationNamespace', ''),
+            configuration_name=event.get('ConfigurationName', ''))
+
+        overrides = override_cluster_configs.get_overrides(execution_input)
+        override_plan = event.get('ClusterConfigOverridePlan', None)
+        if override_plan is not None:
+            cluster_config = override_cluster_configs.apply_override_plan(
+                cluster['Cluster'], overrides, override_plan)
+        else:
+            cluster_config = override_cluster_configs.override_cluster_configs(
+                cluster['Cluster'], overrides, event.get('AllowedClusterConfigOverrides', None))
+
+        cluster_config = fail_if_cluster_running.fail_if_cluster_running(
+            cluster_config, execution_input,
+            fail_if_cluster_running.parse_bool(event.get('DefaultFailIfClusterRunning', False)))
+
+        cluster['Cluster'] = update_cluster_tags.update_cluster_tags(cluster_config, execution_input.get('Tags', []))
+        logger.info(f'ClusterConfiguration: {json.dumps(cluster)}')
+
+        cluster['Cluster'] = claim_check.check_in(cluster['Cluster'], event.get('ClaimCheck', None))
+        return cluster
+
+    except Exception as e:
+        log_and_raise(e, event)
@@ -1,18 +1,34 @@
 import base64
+import copy
 import json
 import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import boto3
 from botocore.exceptions import ClientError
 
+from emr_config_utils import aws_clients, claim_check, outputs
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-emr = boto3.client('emr')
-sfn = boto3.client('stepfunctions')
-events = boto3.client('events')
-secretsmanager = boto3.client('secretsmanager')
+emr = aws_clients.lazy_client('emr')
+sfn = aws_clients.lazy_client('stepfunctions')
+events = aws_clients.lazy_client('events')
+secretsmanager = aws_clients.lazy_client('secretsmanager')
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+# EventBridge allows at most 5 Targets per Rule
+MAX_TARGETS_PER_RULE = 5
+
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+MAX_SECRET_WORKERS = int(os.environ.get('MAX_SECRET_WORKERS', '8'))
+
+# Secret values are only ever held in memory, never logged
+_secret_cache: Dict[str, dict] = {}
 
 
 class SecretNotFoundError(Exception):
@@ -23,6 +39,10 @@ class SecretDecryptionFailureError(Exception):
     pass
 
 
+class RulePoolExhaustedError(Exception):
+    pass
+
+
 def json_serial(obj):
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
@@ -46,7 +66,47 @@ def get_secret_value(secret_id: str):
         if 'SecretString' in secret_response \
         else json.loads(base64.b64decode(secret_response.pop('SecretBinary')))
     logger.info(f'SecretFound: {secret_id}')
-    return val
+    return secret_response['VersionId'], val
+
+
+def get_current_version_id(secret_id: str):
+    try:
+        versions = secretsmanager.describe_secret(SecretId=secret_id).get('VersionIdsToStages', {})
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            raise SecretNotFoundError(f'SecretNotFound: {secret_id}')
+        else:
+            raise e
+    return next((v for v, stages in versions.items() if 'AWSCURRENT' in stages), None)
+
+
+def get_cached_secret_value(secret_id: str):
+    now = time.time()
+    cached = _secret_cache.get(secret_id, None)
+    if cached is not None:
+        if cached['ExpiresAt'] > now:
+            logger.info(f'SecretFound (cached): {secret_id}')
+            return copy.deepcopy(cached['Value'])
+
+        # After the TTL only fetch and decrypt the value again if the Secret was rotated
+        if get_current_version_id(secret_id) == cached['VersionId']:
+            logger.info(f'SecretFound (unchanged): {secret_id}')
+            cached['ExpiresAt'] = now + SECRET_CACHE_TTL_SECONDS
+            return copy.deepcopy(cached['Value'])
+
+    version_id, val = get_secret_value(secret_id)
+    _secret_cache[secret_id] = {
+        'VersionId': version_id,
+        'Value': val,
+        'ExpiresAt': now + SECRET_CACHE_TTL_SECONDS
+    }
+    return copy.deepcopy(val)
+
+
+def get_secret_values(secret_ids: List[str]) -> Dict[str, dict]:
+    secret_ids = list(dict.fromkeys(secret_ids))
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_SECRET_WORKERS, len(secret_ids)))) as executor:
+        return dict(zip(secret_ids, executor.map(get_cached_secret_value, secret_ids)))
 
 
 def log_and_raise(e, event):
@@ -55,6 +115,47 @@ def log_and_raise(e, event):
     raise e
 
 
+def put_rule_target(rule_names: List[str], cluster_id: str, cluster_status_lambda: str, task_token: str,
+                    polling_schedule: Optional[dict] = None, output_projection: Optional[List[str]] = None,
+                    claim_check_config: Optional[dict] = None) -> str:
+    # Start at a random Rule to spread concurrent launches across the pool
+    start = random.randrange(len(rule_names))
+    for rule_name in rule_names[start:] + rule_names[:start]:
+        targets = events.list_targets_by_rule(Rule=rule_name)['Targets']
+        if len(targets) >= MAX_TARGETS_PER_RULE:
+            continue
+
+        target_input = {
+            'Id': cluster_id,
+            'Arn': cluster_status_lambda,
+            'Input': json.dumps({
+                'ClusterId': cluster_id,
+                'TaskToken': task_token,
+                'RuleName': rule_name,
+                'ExpectedState': 'WAITING',
+                'PollingSchedule': polling_schedule,
+                'OutputProjection': output_projection,
+                'ClaimCheck': claim_check_config
+            })
+        }
+        logger.info(f'Putting Rule Targets: {json.dumps(target_input)}')
+        try:
+            failed_targets = events.put_targets(Rule=rule_name, Targets=[target_input])
+        except ClientError as e:
+            # A concurrent launch took the last free slot on this Rule
+            if e.response['Error']['Code'] == 'LimitExceededException':
+                logger.info(f'No free Target slots on Rule: {rule_name}')
+                continue
+            raise e
+
+        if failed_targets['FailedEntryCount'] > 0:
+            failed_entries = failed_targets['FailedEntries']
+            raise Exception(f'Failed Putting Targets: {json.dumps(failed_entries)}')
+        return rule_name
+
+    raise RulePoolExhaustedError(f'RulePoolExhausted: no free Target slots on Rules {json.dumps(rule_names)}')
+
+
 def update_configurations(configurations: List[dict], classification: str, properties: Dict[str, str]):
     found_classification = False
     for config in configurations:
@@ -75,13 +176,19 @@ def update_configurations(configurations: List[dict], classification: str, prope
 def handler(event, context):
     try:
         logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
-        cluster_configuration = event['Input']['Cluster']
+        cluster_configuration = claim_check.check_out(event['Input']['Cluster'])
         task_token = event.get('TaskToken', None)
         cluster_status_lambda = event.get('CheckStatusLambda', None)
         fire_and_forget = event.get('FireAndForget', False)
         secret_configurations = event['Input'].get('SecretConfigurations', None)
         kerberos_attributes_secret = event['Input'].get('KerberosAttributesSecret', None)
         rule_name = event.get('RuleName', None)
+        rule_names = event.get('RuleNames', [rule_name])
+        polling_schedule = event.get('PollingSchedule', None)
+        output_projection = event.get('OutputProjection', None)
+        task_token_table = event.get('TaskTokenTable', None)
+        state_change_table = event.get('StateChangeTable', None)
+        claim_check_config = event.get('ClaimCheck', None)
 
         # NoneType values need to be removed from the cluster_configuration
         logger.info(f'Preparing ClusterConfiguration: {json.dumps(cluster_configuration)}')
@@ -90,24 +197,32 @@ def handler(event, context):
             k: v for k, v in cluster_configuration['Instances'].items() if v is not None}
         logger.info(f'Removed NoneType values from ClusterConfiguration: {json.dumps(cluster_configuration)}')
 
-        if secret_configurations:
-            logger.info(f'Getting SecretConfigurations: {json.dumps(secret_configurations)}')
-            for classification, secret_id in secret_configurations.items():
-                properties = get_secret_value(secret_id)
-                cluster_configuration['Configurations'] = update_configurations(
-                    cluster_configuration['Configurations'], classification, properties)
+        # Secret values are merged into a copy so they can't leak into the event when it's logged on error
+        cluster_configuration = copy.deepcopy(cluster_configuration)
 
+        secret_ids = list(secret_configurations.values()) if secret_configurations else []
         if kerberos_attributes_secret:
-            logger.info(f'Getting KerberosAttributesSecret: {json.dumps(kerberos_attributes_secret)}')
-            kerberos_attributes = get_secret_value(kerberos_attributes_secret)
-            cluster_configuration['KerberosAttributes'] = \
-                {k: v for k, v in kerberos_attributes.items() if k in [
-                     'Realm',
-                     'KdcAdminPassword',
-                     'ADDomainJoinUser',
-                     'ADDomainJoinPassword',
-                     'CrossRealmTrustPrincipalPassword'
-                 ]}
+            secret_ids.append(kerberos_attributes_secret)
+
+        if secret_ids:
+            logger.info(f'Getting Secrets: {json.dumps(secret_ids)}')
+            secret_values = get_secret_values(secret_ids)
+
+            if secret_configurations:
+                for classification, secret_id in secret_configurations.items():
+                    cluster_configuration['Configurations'] = update_configurations(
+                        cluster_configuration['Configurations'], classification, secret_values[secret_id])
+
+            if kerberos_attributes_secret:
+                kerberos_attributes = secret_values[kerberos_attributes_secret]
+                cluster_configuration['KerberosAttributes'] = \
+                    {k: v for k, v in kerberos_attributes.items() if k in [
+                         'Realm',
+                         'KdcAdminPassword',
+                         'ADDomainJoinUser',
+                         'ADDomainJoinPassword',
+                         'CrossRealmTrustPrincipalPassword'
+                     ]}
 
         logger.info('Calling RunJobFlow')
         response = emr.run_job_flow(**cluster_configuration)
@@ -117,27 +232,46 @@ def handler(event, context):
 
         if fire_and_forget:
             response['ClusterId'] = cluster_id
-            logger.info(f'Sending Task Success, TaskToken: {task_token}, '
-                        f'Output: {json.dumps(response, default=json_serial)}')
-            sfn.send_task_success(taskToken=task_token, output=json.dumps(response, default=json_serial))
-        else:
-            target_input = {
+            output = claim_check.check_in_json(
+                outputs.project_output(response, output_projection), claim_check_config, ['ClusterId'],
+                default=json_serial)
+            logger.info(f'Sending Task Success, TaskToken: {task_token}, Output: {output}')
+            sfn.send_task_success(taskToken=task_token, output=output)
+        elif task_token_table:
+            # Batched status checks find pending Clusters in the TaskTokenTable rather
+            # than each Cluster having its own Rule Target
+            logger.info(f'Registering pending Cluster: {cluster_id} in Table: {task_token_table}')
+            dynamodb.Table(task_token_table).put_item(Item={
                 'Id': cluster_id,
-                'Arn': cluster_status_lambda,
-                'Input': json.dumps({
-                    'ClusterId': cluster_id,
-                    'TaskToken': task_token,
-                    'RuleName': rule_name,
-                    'ExpectedState': 'WAITING'
-                })
-            }
-            logger.info(f'Putting Rule Targets: {json.dumps(target_input)}')
-            failed_targets = events.put_targets(Rule=rule_name, Targets=[target_input])
-            if failed_targets['FailedEntryCount'] > 0:
-                failed_entries = failed_targets['FailedEntries']
-                raise Exception(f'Failed Putting Targets: {json.dumps(failed_entries)}')
+                'Kind': 'Cluster',
+                'TaskToken': task_token,
+                'ExpectedState': 'WAITING',
+                'CreatedAt': int(time.time()),
+                'OutputProjection': output_projection,
+                'ClaimCheck': claim_check_config
+            })
+
+            logger.info(f'Enabling Rule: {rule_name}')
+            events.enable_rule(Name=rule_name)
+        else:
+            rule_name = put_rule_target(
+                rule_names, cluster_id, cluster_status_lambda, task_token, polling_schedule, output_projection,
+                claim_check_config)
 
             logger.info(f'Enabling Rule: {rule_name}')
             events.enable_rule(Name=rule_name)
+
+            if state_change_table:
+                # Cluster State Change events find the TaskToken here, the Rule Target polls
+                logger.info(f'Registering tracked Cluster: {cluster_id} in Table: {state_change_table}')
+                dynamodb.Table(state_change_table).put_item(Item={
+                    'Id': cluster_id,
+                    'Kind': 'TrackedCluster',
+                    'TaskToken': task_token,
+                    'ExpectedState': 'WAITING',
+                    'CreatedAt': int(time.time()),
+                    'OutputProjection': output_projection,
+                    'ClaimCheck': claim_check_config
+                })
     except Exception as e:
         log_and_raise(e, event)
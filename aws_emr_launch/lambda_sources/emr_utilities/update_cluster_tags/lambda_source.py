@@ -1,28 +1,33 @@
 import json
 import logging
+from typing import List
 
-import boto3
+from emr_config_utils import claim_check
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-emr = boto3.client('emr')
+
+
+def update_cluster_tags(cluster_config: dict, new_tags: List[dict]) -> dict:
+    current_tags = cluster_config.get('Tags', [])
+
+    new_tags_dict = {tag['Key']: tag['Value'] for tag in new_tags}
+    current_tags_dict = {tag['Key']: tag['Value'] for tag in current_tags}
+
+    merged_tags_dict = dict(current_tags_dict, **new_tags_dict)
+    merged_tags = [{'Key': k, 'Value': v} for k, v in merged_tags_dict.items()]
+
+    cluster_config['Tags'] = merged_tags
+    return cluster_config
 
 
 def handler(event, context):
     logger.info(f'Lambda metadata: {json.dumps(event)} (type = {type(event)})')
     new_tags = event.get('ExecutionInput', {}).get('Tags', [])
-    cluster_config = event.get('Input', {})
-    current_tags = cluster_config.get('Tags', [])
 
     try:
-        new_tags_dict = {tag['Key']: tag['Value'] for tag in new_tags}
-        current_tags_dict = {tag['Key']: tag['Value'] for tag in current_tags}
-
-        merged_tags_dict = dict(current_tags_dict, **new_tags_dict)
-        merged_tags = [{'Key': k, 'Value': v} for k, v in merged_tags_dict.items()]
-
-        cluster_config['Tags'] = merged_tags
-        return cluster_config
+        cluster_config = claim_check.check_out(event.get('Input', {}))
+        return claim_check.check_in(update_cluster_tags(cluster_config, new_tags), event.get('ClaimCheck', None))
 
     except Exception as e:
         logger.error(f'Error processing event {json.dumps(event)}')
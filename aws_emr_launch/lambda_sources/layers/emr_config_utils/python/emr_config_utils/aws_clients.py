@@ -0,0 +1,71 @@
+import os
+import threading
+from typing import Any, Callable, Dict
+
+import boto3
+from botocore.config import Config
+
+RETRY_MODE = os.environ.get('EMR_LAUNCH_RETRY_MODE', 'standard')
+MAX_ATTEMPTS = int(os.environ.get('EMR_LAUNCH_MAX_ATTEMPTS', '5'))
+MAX_POOL_CONNECTIONS = int(os.environ.get('EMR_LAUNCH_MAX_POOL_CONNECTIONS', '25'))
+
+_lock = threading.Lock()
+_session = None
+_clients: Dict[str, Any] = {}
+_resources: Dict[str, Any] = {}
+
+
+def _config() -> Config:
+    options = {
+        'retries': {'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS},
+        'max_pool_connections': MAX_POOL_CONNECTIONS,
+        'connect_timeout': 5,
+        'read_timeout': 30
+    }
+    # tcp_keepalive is only available in newer botocore releases
+    if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+        options['tcp_keepalive'] = True
+    return Config(**options)
+
+
+def _get_or_create(cache: Dict[str, Any], service_name: str, factory: Callable[[boto3.Session], Any]):
+    global _session
+
+    # Clients and resources are cached at module level, so warm invocations reuse
+    # them along with their pooled connections
+    service = cache.get(service_name, None)
+    if service is None:
+        with _lock:
+            service = cache.get(service_name, None)
+            if service is None:
+                if _session is None:
+                    _session = boto3.session.Session()
+                service = cache[service_name] = factory(_session)
+    return service
+
+
+def get_client(service_name: str):
+    return _get_or_create(
+        _clients, service_name, lambda session: session.client(service_name, config=_config()))
+
+
+def get_resource(service_name: str):
+    return _get_or_create(
+        _resources, service_name, lambda session: session.resource(service_name, config=_config()))
+
+
+class LazyService:
+    def __init__(self, service_name: str, getter: Callable[[str], Any]):
+        self._service_name = service_name
+        self._getter = getter
+
+    def __getattr__(self, name: str):
+        return getattr(self._getter(self._service_name), name)
+
+
+def lazy_client(service_name: str) -> LazyService:
+    return LazyService(service_name, get_client)
+
+
+def lazy_resource(service_name: str) -> LazyService:
+    return LazyService(service_name, get_resource)
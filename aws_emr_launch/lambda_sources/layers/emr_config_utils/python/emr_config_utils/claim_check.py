@@ -0,0 +1,89 @@
+import copy
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from emr_config_utils import aws_clients
+
+s3 = aws_clients.lazy_client('s3')
+
+CLAIM_CHECK_KEY = 'ClaimCheck'
+DEFAULT_THRESHOLD_BYTES = 32768
+
+# Payloads are stored under their content hash, so neither of these can go stale
+_stored_keys = set()
+_payloads: Dict[str, Any] = {}
+
+
+class ClaimCheckError(Exception):
+    pass
+
+
+def is_claim_check(value: Any) -> bool:
+    return isinstance(value, dict) and CLAIM_CHECK_KEY in value
+
+
+def _serialize(value: Any, default: Optional[Callable[[Any], Any]]) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=default)
+
+
+def _store(value: Any, payload: bytes, claim_check: dict, inline_keys: Optional[List[str]]) -> Optional[dict]:
+    if len(payload) < int(claim_check.get('ThresholdBytes', DEFAULT_THRESHOLD_BYTES)):
+        return None
+
+    digest = hashlib.sha256(payload).hexdigest()
+    prefix = claim_check.get('Prefix', '').strip('/')
+    key = f'{prefix}/{digest}.json' if prefix else f'{digest}.json'
+    bucket = claim_check['Bucket']
+
+    if f'{bucket}/{key}' not in _stored_keys:
+        s3.put_object(Bucket=bucket, Key=key, Body=payload, ContentType='application/json')
+        _stored_keys.add(f'{bucket}/{key}')
+
+    reference = {k: value[k] for k in (inline_keys or []) if isinstance(value, dict) and k in value}
+    reference[CLAIM_CHECK_KEY] = {
+        'Bucket': bucket,
+        'Key': key,
+        'Sha256': digest,
+        'Size': len(payload)
+    }
+    return reference
+
+
+def check_in(value: Any, claim_check: Optional[dict], inline_keys: Optional[List[str]] = None,
+             default: Optional[Callable[[Any], Any]] = None) -> Any:
+    # Store a payload over the threshold in S3 and return a reference to pass between
+    # states instead. The inline_keys are kept on the reference for States that read them.
+    if not claim_check or value is None or is_claim_check(value):
+        return value
+
+    reference = _store(value, _serialize(value, default).encode('utf-8'), claim_check, inline_keys)
+    return value if reference is None else reference
+
+
+def check_in_json(value: Any, claim_check: Optional[dict], inline_keys: Optional[List[str]] = None,
+                  default: Optional[Callable[[Any], Any]] = None) -> str:
+    # Same as check_in, for callers that send the JSON document: the value is serialized
+    # once and that document is returned when it stays under the threshold
+    payload = _serialize(value, default)
+    if not claim_check or value is None or is_claim_check(value):
+        return payload
+
+    reference = _store(value, payload.encode('utf-8'), claim_check, inline_keys)
+    return payload if reference is None else _serialize(reference, None)
+
+
+def check_out(value: Any) -> Any:
+    if not is_claim_check(value):
+        return value
+
+    reference = value[CLAIM_CHECK_KEY]
+    payload_id = f'{reference["Bucket"]}/{reference["Key"]}'
+    if payload_id not in _payloads:
+        payload = s3.get_object(Bucket=reference['Bucket'], Key=reference['Key'])['Body'].read()
+        if hashlib.sha256(payload).hexdigest() != reference['Sha256']:
+            raise ClaimCheckError(f'Payload does not match its ClaimCheck: s3://{payload_id}')
+        _payloads[payload_id] = json.loads(payload)
+
+    # Callers modify the payload, so never hand out the cached copy
+    return copy.deepcopy(_payloads[payload_id])
@@ -0,0 +1,26 @@
+from typing import List, Optional
+
+
+def project_paths(output: dict, paths: List[str], projected: Optional[dict] = None) -> dict:
+    # Keep only the dotted paths, preserving their nesting
+    projected = {} if projected is None else projected
+    for path in paths:
+        keys = path.split('.')
+        value = output
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            node = projected
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = value
+    return projected
+
+
+def project_output(output: dict, output_projection: Optional[List[str]]) -> dict:
+    if not output_projection:
+        return output
+
+    return project_paths(output, output_projection, {'ClusterId': output['ClusterId']})
@@ -0,0 +1,40 @@
+import base64
+import gzip
+import json
+from typing import Any
+
+from emr_config_utils import aws_clients
+
+ssm = aws_clients.lazy_client('ssm')
+
+STORAGE_KEY = 'EMRLaunchParameterStorage'
+GZIP_ENCODING = 'gzip+base64'
+MAX_GET_PARAMETERS = 10
+
+
+class ParameterStorageError(Exception):
+    pass
+
+
+def load_parameter_value(value: str) -> Any:
+    # Large Parameters are stored compressed, or split across chunk Parameters
+    # behind a small pointer. Both are written by aws_emr_launch at synth time.
+    stored = json.loads(value)
+    if not isinstance(stored, dict) or STORAGE_KEY not in stored:
+        return stored
+
+    storage = stored[STORAGE_KEY]
+    data = storage.get('Data', None)
+    if data is None:
+        names = storage['Chunks']
+        values = {}
+        for i in range(0, len(names), MAX_GET_PARAMETERS):
+            result = ssm.get_parameters(Names=names[i:i + MAX_GET_PARAMETERS])
+            if result['InvalidParameters']:
+                raise ParameterStorageError(f'Missing Parameter chunks: {result["InvalidParameters"]}')
+            values.update({p['Name']: p['Value'] for p in result['Parameters']})
+        data = ''.join(values[n] for n in names)
+
+    if storage['Encoding'] == GZIP_ENCODING:
+        data = gzip.decompress(base64.b64decode(data)).decode('utf-8')
+    return json.loads(data)
@@ -1,11 +1,16 @@
 import copy
+import json
 
+import boto3
+import pytest
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_s3 as s3
 from aws_cdk import core
+from moto import mock_ssm
 
 from aws_emr_launch.constructs.emr_constructs import (cluster_configuration,
-                                                      emr_code)
+                                                      emr_code,
+                                                      parameter_storage)
 
 app = core.App()
 stack = core.Stack(app, 'test-stack')
@@ -141,3 +146,102 @@ def test_bootstrap_action_config():
     print(config)
     print(resolved_config)
     assert resolved_config == config
+
+
+@mock_ssm
+def test_compressed_configuration_storage():
+    app = core.App()
+    compressed_stack = core.Stack(app, 'test-compressed-stack')
+    cluster_config = cluster_configuration.ClusterConfiguration(
+        compressed_stack, 'test-compressed-config',
+        configuration_name='test-compressed-cluster')
+    cluster_config.update_configurations(
+        cluster_config.config['Configurations'], 'spark-defaults',
+        {f'spark.test.property.{i}': f'value-{i}' for i in range(500)})
+    cluster_config.update_config()
+    app.synth()
+
+    stored_parameter = cluster_config._ssm_parameter
+    pointer = json.loads(stored_parameter.parameter.value)
+    assert pointer[parameter_storage.STORAGE_KEY]['Encoding'] == parameter_storage.GZIP_ENCODING
+    assert len(stored_parameter.parameter.value) <= parameter_storage.MAX_PARAMETER_SIZE
+    assert stored_parameter.chunks == []
+
+    ssm = boto3.client('ssm')
+    ssm.put_parameter(
+        Name=stored_parameter.parameter.name, Value=stored_parameter.parameter.value,
+        Type='String', Tier='Advanced')
+    stored_config = cluster_configuration.ClusterConfiguration.get_configuration(
+        'test-compressed-cluster', ssm_client=ssm)
+    assert stored_config == json.loads(stored_parameter.value)
+
+
+def test_chunked_configuration_storage():
+    cluster_config = cluster_configuration.ClusterConfiguration(
+        stack, 'test-chunked-config',
+        configuration_name='test-chunked-cluster')
+    bucket = s3.Bucket(stack, 'test-chunked-bucket')
+    cluster_config.update_configurations(
+        cluster_config.config['Configurations'], 'spark-defaults',
+        {f'spark.test.property.{i}': bucket.bucket_name for i in range(200)})
+    cluster_config.update_config()
+
+    stored_parameter = cluster_config._ssm_parameter
+    stored_parameter.materialize()
+    pointer = json.loads(stored_parameter.parameter.value)[parameter_storage.STORAGE_KEY]
+    assert pointer['Encoding'] == parameter_storage.RAW_ENCODING
+    assert pointer['Chunks'] == [c.name for c in stored_parameter.chunks]
+    assert len(stored_parameter.chunks) > 1
+    assert ''.join(c.value for c in stored_parameter.chunks) == stored_parameter.value
+
+    cluster_config.config['Configurations'] = [
+        c for c in cluster_config.config['Configurations'] if c['Classification'] != 'spark-defaults']
+    cluster_config.update_config()
+    stored_parameter.materialize()
+    assert stored_parameter.chunks == []
+    assert cluster_config.node.try_find_child('SSMParameterChunk0') is None
+
+
+def test_configuration_serialized_once_at_synth(monkeypatch):
+    serializations = []
+    to_json = cluster_configuration.ClusterConfiguration.to_json
+    monkeypatch.setattr(cluster_configuration.ClusterConfiguration, 'to_json',
+                        lambda self: serializations.append(self) or to_json(self))
+
+    app = core.App()
+    lazy_stack = core.Stack(app, 'test-lazy-stack')
+    cluster_config = cluster_configuration.ClusterConfiguration(
+        lazy_stack, 'test-lazy-config',
+        configuration_name='test-lazy-cluster')
+    for i in range(10):
+        cluster_config.add_spark_package(f'org.example:package-{i}:1.0.0')
+    assert serializations == []
+
+    template = app.synth().get_stack_by_name('test-lazy-stack').template
+    assert len(serializations) == 1
+
+    parameter = template['Resources'][lazy_stack.get_logical_id(cluster_config._ssm_parameter.parameter)]
+    stored_config = json.loads(parameter['Properties']['Value'])
+    assert stored_config['OverrideInterfaces'] == cluster_config.override_interfaces
+    assert 'org.example:package-9:1.0.0' in json.dumps(stored_config['ClusterConfiguration']['Configurations'])
+
+
+@mock_ssm
+def test_iter_configurations():
+    ssm = boto3.client('ssm')
+    for namespace in ['default', 'other']:
+        for i in range(5):
+            ssm.put_parameter(
+                Name=f'{cluster_configuration.SSM_PARAMETER_PREFIX}/{namespace}/config-{i}',
+                Value=json.dumps({'ConfigurationName': f'config-{i}', 'Namespace': namespace}), Type='String')
+
+    configurations = list(cluster_configuration.ClusterConfiguration.iter_configurations(
+        max_results=2, ssm_client=ssm))
+    assert sorted(c['ConfigurationName'] for c in configurations) == [f'config-{i}' for i in range(5)]
+
+    names = cluster_configuration.ClusterConfiguration.iter_configurations(
+        ['default', 'other'], max_results=2, names_only=True, ssm_client=ssm)
+    assert sorted(names) == sorted(f'{n}/config-{i}' for n in ['default', 'other'] for i in range(5))
+
+    with pytest.raises(ValueError):
+        cluster_configuration.ClusterConfiguration.iter_configurations(max_results=11, ssm_client=ssm)
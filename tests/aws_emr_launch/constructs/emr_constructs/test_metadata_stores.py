@@ -0,0 +1,124 @@
+import os
+
+import boto3
+import pytest
+from aws_cdk import core
+from moto import mock_s3, mock_ssm
+
+from aws_emr_launch.constructs.emr_constructs import (cluster_configuration,
+                                                      metadata_stores)
+
+
+def _check_store(store: metadata_stores.MetadataStore):
+    for namespace in ['default', 'other']:
+        for i in range(5):
+            store.put(metadata_stores.CLUSTER_CONFIGURATIONS, namespace, f'config-{i}',
+                      {'ConfigurationName': f'config-{i}', 'Namespace': namespace})
+
+    assert store.get(metadata_stores.CLUSTER_CONFIGURATIONS, 'other', 'config-3') == \
+        {'ConfigurationName': 'config-3', 'Namespace': 'other'}
+    with pytest.raises(metadata_stores.MetadataNotFoundError):
+        store.get(metadata_stores.CLUSTER_CONFIGURATIONS, 'default', 'missing')
+
+    values, next_token = [], None
+    while True:
+        page, next_token = store.list(metadata_stores.CLUSTER_CONFIGURATIONS, 'default', next_token, max_results=2)
+        values.extend(page)
+        if not next_token:
+            break
+    assert sorted(v['ConfigurationName'] for v in values) == [f'config-{i}' for i in range(5)]
+
+    names = store.iter(metadata_stores.CLUSTER_CONFIGURATIONS, ['default', 'other'], max_results=2, names_only=True)
+    assert sorted(names) == sorted(f'{n}/config-{i}' for n in ['default', 'other'] for i in range(5))
+
+
+def test_sqlite_metadata_store():
+    _check_store(metadata_stores.SQLiteMetadataStore())
+
+
+def test_file_system_metadata_store(tmp_path):
+    _check_store(metadata_stores.FileSystemMetadataStore(str(tmp_path)))
+
+
+@mock_s3
+def test_s3_metadata_store():
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket='test-bucket')
+    _check_store(metadata_stores.S3MetadataStore('test-bucket', s3_client=s3))
+
+
+@mock_ssm
+def test_ssm_metadata_store():
+    _check_store(metadata_stores.SSMMetadataStore(boto3.client('ssm')))
+
+
+def test_from_uri(tmp_path):
+    assert isinstance(metadata_stores.from_uri('ssm'), metadata_stores.SSMMetadataStore)
+    assert isinstance(metadata_stores.from_uri('s3://test-bucket/prefix'), metadata_stores.S3MetadataStore)
+    assert isinstance(metadata_stores.from_uri(f'sqlite://{tmp_path}/metadata.db'),
+                      metadata_stores.SQLiteMetadataStore)
+    assert isinstance(metadata_stores.from_uri(f'file://{tmp_path}'), metadata_stores.FileSystemMetadataStore)
+    with pytest.raises(ValueError):
+        metadata_stores.from_uri('http://metadata')
+
+
+def test_from_stored_configuration_with_default_store():
+    stack = core.Stack(core.App(), 'test-stack')
+    configuration = cluster_configuration.ClusterConfiguration(
+        stack, 'test-configuration', configuration_name='test-configuration')
+
+    store = metadata_stores.SQLiteMetadataStore()
+    store.put(metadata_stores.CLUSTER_CONFIGURATIONS, 'default', 'test-configuration',
+              stack.resolve(configuration.to_json()))
+
+    metadata_stores.set_default_store(store)
+    try:
+        restored = cluster_configuration.ClusterConfiguration.from_stored_configuration(
+            stack, 'test-restored-configuration', 'test-configuration')
+        with pytest.raises(cluster_configuration.ClusterConfigurationNotFoundError):
+            cluster_configuration.ClusterConfiguration.get_configuration('missing')
+    finally:
+        metadata_stores.set_default_store(None)
+
+    assert stack.resolve(restored.to_json()) == stack.resolve(configuration.to_json())
+
+
+def test_cached_metadata_store(tmp_path, capsys):
+    store = metadata_stores.FileSystemMetadataStore(str(tmp_path / 'store'))
+    store.put(metadata_stores.EMR_PROFILES, 'default', 'test-profile', {'ProfileName': 'test-profile'})
+    store.put(metadata_stores.EMR_PROFILES, 'default', 'removed-profile', {'ProfileName': 'removed-profile'})
+
+    cache_file = str(tmp_path / 'emr_launch.context.json')
+    cache = metadata_stores.CachedMetadataStore(store, cache_file)
+    assert cache.get(metadata_stores.EMR_PROFILES, 'default', 'test-profile') == {'ProfileName': 'test-profile'}
+    cache.get(metadata_stores.EMR_PROFILES, 'default', 'removed-profile')
+
+    store.put(metadata_stores.EMR_PROFILES, 'default', 'test-profile', {'ProfileName': 'updated-profile'})
+    os.remove(str(tmp_path / 'store' / 'emr_profiles' / 'default' / 'removed-profile.json'))
+
+    # Synths read from the cache file until it is refreshed
+    cache = metadata_stores.CachedMetadataStore(store, cache_file)
+    assert cache.get(metadata_stores.EMR_PROFILES, 'default', 'test-profile') == {'ProfileName': 'test-profile'}
+
+    metadata_stores.main(['refresh', '--cache-file', cache_file, '--store', f'file://{tmp_path / "store"}'])
+    assert capsys.readouterr().out.splitlines() == [
+        'Refreshed: emr_profiles/default/removed-profile',
+        'Refreshed: emr_profiles/default/test-profile'
+    ]
+
+    cache = metadata_stores.CachedMetadataStore(store, cache_file)
+    assert cache.get(metadata_stores.EMR_PROFILES, 'default', 'test-profile') == {'ProfileName': 'updated-profile'}
+    assert cache.refresh() == []
+
+
+def test_default_store_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv(metadata_stores.METADATA_STORE_ENV, f'file://{tmp_path / "store"}')
+    monkeypatch.setenv(metadata_stores.METADATA_CACHE_ENV, str(tmp_path / 'emr_launch.context.json'))
+
+    # The store and its cache file are loaded once per process
+    store = metadata_stores.get_default_store()
+    assert isinstance(store, metadata_stores.CachedMetadataStore)
+    assert metadata_stores.get_default_store() is store
+
+    monkeypatch.delenv(metadata_stores.METADATA_CACHE_ENV)
+    assert isinstance(metadata_stores.get_default_store(), metadata_stores.FileSystemMetadataStore)
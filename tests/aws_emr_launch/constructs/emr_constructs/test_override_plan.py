@@ -0,0 +1,86 @@
+import pytest
+
+from aws_emr_launch.constructs.emr_constructs import override_plan
+
+config = {
+    'Name': 'test-cluster',
+    'StepConcurrencyLevel': 1,
+    'LogUri': None,
+    'Instances': {
+        'InstanceGroups': [
+            {'InstanceRole': 'MASTER', 'InstanceCount': 1},
+            {'InstanceRole': 'CORE', 'InstanceCount': 2},
+            {'InstanceRole': 'TASK', 'InstanceCount': 0, 'InstanceType': 'm5.xlarge'},
+            {'InstanceRole': 'TASK', 'InstanceCount': 0, 'InstanceType': 'r5.xlarge'}
+        ]
+    }
+}
+
+
+def test_compile_override_plan():
+    plan = override_plan.compile_override_plan(config, {
+        'ClusterName': {'JsonPath': 'Name', 'Default': 'test-cluster'},
+        'CoreInstanceCount': {'JsonPath': 'Instances.InstanceGroups.1.InstanceCount', 'Minimum': 1, 'Maximum': 10},
+        'LogUri': {'JsonPath': 'LogUri', 'Default': 's3://bucket/logs'}
+    })
+
+    assert plan == {
+        'ClusterName': {'Path': ['Name'], 'Type': 'string'},
+        'CoreInstanceCount': {
+            'Path': ['Instances', 'InstanceGroups', 1, 'InstanceCount'],
+            'Type': 'number',
+            'Minimum': 1,
+            'Maximum': 10
+        },
+        'LogUri': {'Path': ['LogUri'], 'Type': 'string'}
+    }
+
+
+def test_compile_override_plan_selectors():
+    plan = override_plan.compile_override_plan(config, {
+        'TaskInstanceCount': {'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].InstanceCount'},
+        'R5InstanceType': {'JsonPath': 'Instances.InstanceGroups[InstanceType=r5.xlarge].InstanceType'},
+        'InstanceCounts': {'JsonPath': 'Instances.InstanceGroups.*.InstanceCount'}
+    })
+
+    assert plan == {
+        'TaskInstanceCount': {
+            'Path': ['Instances', 'InstanceGroups', {'Key': 'InstanceRole', 'Value': 'TASK'}, 'InstanceCount'],
+            'Type': 'number'
+        },
+        'R5InstanceType': {
+            'Path': ['Instances', 'InstanceGroups', {'Key': 'InstanceType', 'Value': 'r5.xlarge'}, 'InstanceType'],
+            'Type': 'string'
+        },
+        'InstanceCounts': {
+            'Path': ['Instances', 'InstanceGroups', '*', 'InstanceCount'],
+            'Type': 'number'
+        }
+    }
+
+
+def test_compile_override_plan_without_overrides():
+    assert override_plan.compile_override_plan(config, None) is None
+    assert override_plan.compile_override_plan(config, {}) is None
+
+
+def test_compile_override_plan_invalid_path():
+    with pytest.raises(override_plan.InvalidOverridePathError):
+        override_plan.compile_override_plan(config, {
+            'TaskInstanceCount': {'JsonPath': 'Instances.InstanceGroups.4.InstanceCount'}
+        })
+
+    with pytest.raises(override_plan.InvalidOverridePathError):
+        override_plan.compile_override_plan(config, {
+            'ReleaseLabel': {'JsonPath': 'Release'}
+        })
+
+    with pytest.raises(override_plan.InvalidOverridePathError):
+        override_plan.compile_override_plan(config, {
+            'GpuInstanceCount': {'JsonPath': 'Instances.InstanceGroups[InstanceType=p3.2xlarge].InstanceCount'}
+        })
+
+    with pytest.raises(override_plan.InvalidOverridePathError):
+        override_plan.compile_override_plan(config, {
+            'TaskInstanceCount': {'JsonPath': 'Instances.InstanceGroups[TASK].InstanceCount'}
+        })
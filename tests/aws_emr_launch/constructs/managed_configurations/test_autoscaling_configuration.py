@@ -191,23 +191,23 @@ default_config = {
                 'Default': 1
             },
             'MasterInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.0.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=MASTER].InstanceType',
                 'Default': 'm5.2xlarge'
             },
             'MasterInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.0.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=MASTER].Market',
                 'Default': 'ON_DEMAND'
             },
             'CoreInstanceCount':{
-                'JsonPath': 'Instances.InstanceGroups.1.InstanceCount',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].InstanceCount',
                 'Default': 2
             },
             'CoreInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.1.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].InstanceType',
                 'Default': 'm5.xlarge'
             },
             'CoreInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.1.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].Market',
                 'Default': 'ON_DEMAND'
             },
             'Subnet': {
@@ -215,23 +215,23 @@ default_config = {
                 'Default': {'Ref': 'testvpcPrivateSubnet1Subnet865FB50A'}
             },
             'TaskInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.2.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].InstanceType',
                 'Default': 'm5.xlarge'
             },
             'TaskInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.2.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].Market',
                 'Default': 'ON_DEMAND'
             },
             'TaskInitialInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.2.InstanceCount',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].InstanceCount',
                 'Default': 2
             },
             'TaskMinimumInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.2.AutoScalingPolicy.Constraints.MinCapacity',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].AutoScalingPolicy.Constraints.MinCapacity',
                 'Default': 2
             },
             'TaskMaximumInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.2.AutoScalingPolicy.Constraints.MaxCapacity',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].AutoScalingPolicy.Constraints.MaxCapacity',
                 'Default': 5
             }
 
@@ -106,19 +106,19 @@ default_config = {
                 'Default': 1
             },
             'MasterInstanceType': {
-                'JsonPath': 'Instances.InstanceFleets.0.InstanceTypeConfigs.0.InstanceType',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=MASTER].InstanceTypeConfigs.0.InstanceType',
                 'Default': 'm5.2xlarge'
             },
             'CoreInstanceType': {
-                'JsonPath': 'Instances.InstanceFleets.1.InstanceTypeConfigs.0.InstanceType',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=CORE].InstanceTypeConfigs.0.InstanceType',
                 'Default': 'm5.xlarge'
             },
             'CoreInstanceOnDemandCount': {
-                'JsonPath': 'Instances.InstanceFleets.1.TargetOnDemandCapacity',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=CORE].TargetOnDemandCapacity',
                 'Default': 2
             },
             'CoreInstanceSpotCount': {
-                'JsonPath': 'Instances.InstanceFleets.1.TargetSpotCapacity',
+                'JsonPath': 'Instances.InstanceFleets[InstanceFleetType=CORE].TargetSpotCapacity',
                 'Default': 0
             }
 
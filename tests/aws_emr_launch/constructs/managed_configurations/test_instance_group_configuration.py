@@ -99,23 +99,23 @@ default_config = {
                 'Default': 1
             },
             'MasterInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.0.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=MASTER].InstanceType',
                 'Default': 'm5.2xlarge'
             },
             'MasterInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.0.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=MASTER].Market',
                 'Default': 'ON_DEMAND'
             },
             'CoreInstanceCount': {
-                'JsonPath': 'Instances.InstanceGroups.1.InstanceCount',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].InstanceCount',
                 'Default': 2
             },
             'CoreInstanceType': {
-                'JsonPath': 'Instances.InstanceGroups.1.InstanceType',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].InstanceType',
                 'Default': 'm5.xlarge'
             },
             'CoreInstanceMarket': {
-                'JsonPath': 'Instances.InstanceGroups.1.Market',
+                'JsonPath': 'Instances.InstanceGroups[InstanceRole=CORE].Market',
                 'Default': 'ON_DEMAND'
             },
             'Subnet': {
@@ -1,9 +1,12 @@
+import pytest
+
+from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_sns as sns
 from aws_cdk import aws_stepfunctions as sfn
 from aws_cdk import core
 
 from aws_emr_launch.constructs.emr_constructs import emr_code, emr_profile
-from aws_emr_launch.constructs.step_functions import emr_chains
+from aws_emr_launch.constructs.step_functions import emr_chains, emr_tasks
 
 
 def print_and_assert(default_fragment_json: dict, fragment: sfn.StateMachineFragment):
@@ -177,6 +180,108 @@ def test_nested_state_machine_chain():
     print_and_assert(default_fragment_json, fragment)
 
 
+def test_nested_state_machine_native_output_parsing():
+    default_fragment_json = {
+        'Type': 'Parallel',
+        'End': True,
+        'Branches': [{
+            'StartAt': 'test-fragment: test-nested-state-machine',
+            'States': {
+                'test-fragment: test-nested-state-machine': {
+                    'Resource': {
+                        'Fn::Join': ['', ['arn:', {
+                            'Ref': 'AWS::Partition'
+                        }, ':states:::states:startExecution.sync']]
+                    },
+                    'Parameters': {
+                        'StateMachineArn': {
+                            'Ref': 'teststatemachine7F4C511D'
+                        },
+                        'Input': {
+                            'Key1': 'Value1'
+                        }
+                    },
+                    'ResultSelector': {
+                        'Output.$': 'States.StringToJson($.Output)'
+                    },
+                    'OutputPath': '$.Output',
+                    'Next': 'test-fragment: test-nested-state-machine - Project Output',
+                    'Catch': [{
+                        'ErrorEquals': ['States.ALL'],
+                        'ResultPath': '$.Error',
+                        'Next': 'test-fail'
+                    }],
+                    'Type': 'Task'
+                },
+                'test-fragment: test-nested-state-machine - Project Output': {
+                    'Type': 'Pass',
+                    'Parameters': {
+                        'ClusterId.$': '$.ClusterId',
+                        'LaunchClusterResult': {
+                            'Status.$': '$.LaunchClusterResult.Status'
+                        }
+                    },
+                    'End': True
+                },
+                'test-fail': {
+                    'Type': 'Fail'
+                }
+            }
+        }]
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    state_machine = sfn.StateMachine(
+        stack, 'test-state-machine',
+        definition=sfn.Chain.start(sfn.Succeed(stack, 'Succeeded')))
+
+    fragment = emr_chains.NestedStateMachine(
+        stack, 'test-fragment',
+        name='test-nested-state-machine',
+        state_machine=state_machine,
+        input={'Key1': 'Value1'},
+        fail_chain=sfn.Fail(stack, 'test-fail'),
+        native_output_parsing=True,
+        output_projection=['ClusterId', 'LaunchClusterResult.Status']
+    )
+
+    print_and_assert(default_fragment_json, fragment)
+
+
+def test_nested_state_machine_claim_check():
+    stack = core.Stack(core.App(), 'test-stack')
+
+    state_machine = sfn.StateMachine(
+        stack, 'test-state-machine',
+        definition=sfn.Chain.start(sfn.Succeed(stack, 'Succeeded')))
+    claim_check = emr_tasks.ClaimCheckPolicy(bucket=s3.Bucket(stack, 'test-bucket'))
+
+    fragment = emr_chains.NestedStateMachine(
+        stack, 'test-fragment',
+        name='test-nested-state-machine',
+        state_machine=state_machine,
+        output_projection=['LaunchClusterResult.ClusterId'],
+        claim_check=claim_check
+    )
+
+    resolved_fragment = stack.resolve(fragment.to_single_state().to_state_json())
+    states = resolved_fragment['Branches'][0]['States']
+    payload = states['test-fragment: test-nested-state-machine - Parse JSON Output']['Parameters']
+    assert payload['OutputProjection'] == ['LaunchClusterResult.ClusterId']
+    assert payload['ClaimCheck'] == stack.resolve(claim_check.to_json())
+    assert 'test-fragment: test-nested-state-machine - Project Output' not in states
+
+    with pytest.raises(ValueError):
+        emr_chains.NestedStateMachine(
+            stack, 'test-native-fragment',
+            name='test-native-state-machine',
+            state_machine=state_machine,
+            native_output_parsing=True,
+            claim_check=claim_check
+        )
+
+
 def test_add_step_with_argument_overrides():
     default_fragment_json = {
         'Type': 'Parallel',
@@ -252,3 +357,129 @@ def test_add_step_with_argument_overrides():
     )
 
     print_and_assert(default_fragment_json, fragment)
+
+
+def test_add_step_with_argument_templating():
+    default_fragment_json = {
+        'Type': 'Parallel',
+        'End': True,
+        'Branches': [{
+            'StartAt': 'test-fragment: test-step',
+            'States': {
+                'test-fragment: test-step': {
+                    'Resource': {
+                        'Fn::Join': ['', ['arn:', {
+                            'Ref': 'AWS::Partition'
+                        }, ':states:::elasticmapreduce:addStep.sync']]
+                    },
+                    'Parameters': {
+                        'ClusterId': 'test-cluster-id',
+                        'Step': {
+                            'Name': 'test-step',
+                            'ActionOnFailure': 'CONTINUE',
+                            'HadoopJarStep': {
+                                'Jar': 'Jar',
+                                'MainClass': 'Main',
+                                'Args.$': "States.Array('Arg1', "
+                                          "States.Format('--date={}', $$.Execution.Input.StepArgumentValues.RunDate))",
+                                'Properties': []
+                            }
+                        }
+                    },
+                    'End': True,
+                    'Catch': [{
+                        'ErrorEquals': ['States.ALL'],
+                        'ResultPath': '$.Error',
+                        'Next': 'test-fail'
+                    }],
+                    'Type': 'Task'
+                },
+                'test-fail': {
+                    'Type': 'Fail'
+                }
+            }
+        }]
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    fragment = emr_chains.AddStepWithArgumentOverrides(
+        stack, 'test-fragment',
+        emr_step=emr_code.EMRStep('test-step', 'Jar', 'Main', ['Arg1', '--date={RunDate}']),
+        cluster_id='test-cluster-id',
+        fail_chain=sfn.Fail(stack, 'test-fail'),
+        argument_templating=True
+    )
+
+    print_and_assert(default_fragment_json, fragment)
+
+
+def test_add_steps_fan_out():
+    default_fragment_json = {
+        'Type': 'Parallel',
+        'End': True,
+        'Branches': [{
+            'StartAt': 'test-fragment: test-fan-out',
+            'States': {
+                'test-fragment: test-fan-out': {
+                    'Type': 'Map',
+                    'End': True,
+                    'Catch': [{
+                        'ErrorEquals': ['States.ALL'],
+                        'ResultPath': '$.Error',
+                        'Next': 'test-fail'
+                    }],
+                    'Parameters': {
+                        'ClusterId.$': '$.ClusterId',
+                        'Step.$': '$$.Map.Item.Value'
+                    },
+                    'Iterator': {
+                        'StartAt': 'test-fragment: test-fan-out - Add Step',
+                        'States': {
+                            'test-fragment: test-fan-out - Add Step': {
+                                'End': True,
+                                'Type': 'Task',
+                                'Resource': {
+                                    'Fn::Join': ['', ['arn:', {
+                                        'Ref': 'AWS::Partition'
+                                    }, ':states:::elasticmapreduce:addStep.sync']]
+                                },
+                                'Parameters': {
+                                    'ClusterId.$': '$.ClusterId',
+                                    'Step.$': '$.Step'
+                                }
+                            }
+                        }
+                    },
+                    'ItemsPath': '$$.Execution.Input.Steps',
+                    'ResultPath': '$.Result.Steps',
+                    'MaxConcurrencyPath': '$.LaunchClusterResult.Cluster.StepConcurrencyLevel'
+                },
+                'test-fail': {
+                    'Type': 'Fail'
+                }
+            }
+        }]
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    fragment = emr_chains.AddStepsFanOut(
+        stack, 'test-fragment',
+        name='test-fan-out',
+        cluster_id=sfn.JsonPath.string_at('$.ClusterId'),
+        result_path='$.Result.Steps',
+        fail_chain=sfn.Fail(stack, 'test-fail')
+    )
+
+    print_and_assert(default_fragment_json, fragment)
+
+    fixed_fragment = emr_chains.AddStepsFanOut(
+        stack, 'test-fragment-fixed-concurrency',
+        name='test-fan-out',
+        cluster_id='test-cluster-id',
+        step_concurrency_level=2)
+    fixed_fan_out = stack.resolve(fixed_fragment.to_single_state().to_state_json())['Branches'][0]['States'][
+        'test-fragment-fixed-concurrency: test-fan-out']
+    assert fixed_fan_out['MaxConcurrency'] == 2
+    assert 'MaxConcurrencyPath' not in fixed_fan_out
@@ -5,13 +5,15 @@ import boto3
 from moto import mock_ssm
 
 from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_lambda
+from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_secretsmanager as secretsmanager
 from aws_cdk import aws_sns as sns
 from aws_cdk import core
 
 from aws_emr_launch import __product__, __version__
 from aws_emr_launch.constructs.emr_constructs import emr_profile, cluster_configuration
-from aws_emr_launch.constructs.step_functions import emr_launch_function
+from aws_emr_launch.constructs.step_functions import emr_launch_function, emr_tasks
 
 
 class TestControlPlaneApis(unittest.TestCase):
@@ -31,6 +33,20 @@ class TestControlPlaneApis(unittest.TestCase):
                 'JsonPath': 'StepConcurrencyLevel'
             }
         },
+        'ClusterConfigOverridePlan': {
+            'ClusterName': {
+                'Path': ['Name'],
+                'Type': 'string'
+            },
+            'ReleaseLabel': {
+                'Path': ['ReleaseLabel'],
+                'Type': 'string'
+            },
+            'StepConcurrencyLevel': {
+                'Path': ['StepConcurrencyLevel'],
+                'Type': 'number'
+            }
+        },
         'ClusterConfiguration': 'default/test-configuration',
         'ClusterName': 'test-cluster',
         'ClusterTags': [
@@ -97,6 +113,34 @@ class TestControlPlaneApis(unittest.TestCase):
 
         self.print_and_assert(self.default_function, function)
 
+    def test_emr_launch_function_with_custom_override_lambda(self):
+        stack = core.Stack(core.App(), 'test-stack')
+        vpc = ec2.Vpc(stack, 'Vpc')
+
+        profile = emr_profile.EMRProfile(
+            stack, 'test-profile',
+            profile_name='test-profile',
+            vpc=vpc)
+        configuration = cluster_configuration.ClusterConfiguration(
+            stack, 'test-configuration', configuration_name='test-configuration')
+
+        function = emr_launch_function.EMRLaunchFunction(
+            stack, 'test-function',
+            launch_function_name='test-function',
+            emr_profile=profile,
+            cluster_configuration=configuration,
+            cluster_name='test-cluster',
+            allowed_cluster_config_overrides={
+                'TaskInstanceCount': {'JsonPath': 'Instances.CustomPath.InstanceCount'}
+            },
+            override_cluster_configs_lambda=aws_lambda.Function.from_function_arn(
+                stack, 'CustomOverride', 'arn:aws:lambda:us-east-1:123456789012:function:custom-override')
+        )
+
+        # The custom Lambda resolves its own paths, so they aren't compiled against the configuration
+        self.assertIsNone(function.cluster_config_override_plan)
+        self.assertNotIn('ClusterConfigOverridePlan', stack.resolve(function.to_json()))
+
     def test_emr_secure_launch_function(self):
         stack = core.Stack(core.App(), 'test-stack')
         vpc = ec2.Vpc(stack, 'Vpc')
@@ -129,6 +173,218 @@ class TestControlPlaneApis(unittest.TestCase):
 
         self.print_and_assert(self.default_function, function)
 
+    def test_emr_launch_function_with_fused_launch_preparation(self):
+        stack = core.Stack(core.App(), 'test-stack')
+        vpc = ec2.Vpc(stack, 'Vpc')
+        success_topic = sns.Topic(stack, 'SuccessTopic')
+        failure_topic = sns.Topic(stack, 'FailureTopic')
+
+        profile = emr_profile.EMRProfile(
+            stack, 'test-profile',
+            profile_name='test-profile',
+            vpc=vpc)
+        configuration = cluster_configuration.ClusterConfiguration(
+            stack, 'test-configuration', configuration_name='test-configuration')
+
+        function = emr_launch_function.EMRLaunchFunction(
+            stack, 'test-function',
+            launch_function_name='test-function',
+            emr_profile=profile,
+            cluster_configuration=configuration,
+            cluster_name='test-cluster',
+            description='test description',
+            success_topic=success_topic,
+            failure_topic=failure_topic,
+            allowed_cluster_config_overrides=configuration.override_interfaces['default'],
+            wait_for_cluster_start=False,
+            fused_launch_preparation=True
+        )
+
+        self.print_and_assert(self.default_function, function)
+        self.assertIsNotNone(function.node.try_find_child('PrepareLaunchTask'))
+        self.assertIsNone(function.node.try_find_child('LoadClusterConfigurationTask'))
+
+        with self.assertRaises(ValueError):
+            emr_launch_function.EMRLaunchFunction(
+                stack, 'test-custom-override-function',
+                launch_function_name='test-custom-override-function',
+                emr_profile=profile,
+                cluster_configuration=configuration,
+                override_cluster_configs_lambda=aws_lambda.Function.from_function_arn(
+                    stack, 'CustomOverride', 'arn:aws:lambda:us-east-1:123456789012:function:custom-override'),
+                fused_launch_preparation=True
+            )
+
+    def test_emr_launch_function_with_express_launch_preparation(self):
+        stack = core.Stack(core.App(), 'test-stack')
+        vpc = ec2.Vpc(stack, 'Vpc')
+        success_topic = sns.Topic(stack, 'SuccessTopic')
+        failure_topic = sns.Topic(stack, 'FailureTopic')
+
+        profile = emr_profile.EMRProfile(
+            stack, 'test-profile',
+            profile_name='test-profile',
+            vpc=vpc)
+        configuration = cluster_configuration.ClusterConfiguration(
+            stack, 'test-configuration', configuration_name='test-configuration')
+
+        function = emr_launch_function.EMRLaunchFunction(
+            stack, 'test-function',
+            launch_function_name='test-function',
+            emr_profile=profile,
+            cluster_configuration=configuration,
+            cluster_name='test-cluster',
+            description='test description',
+            success_topic=success_topic,
+            failure_topic=failure_topic,
+            allowed_cluster_config_overrides=configuration.override_interfaces['default'],
+            wait_for_cluster_start=False,
+            express_launch_preparation=True
+        )
+
+        self.print_and_assert(
+            dict(self.default_function,
+                 PrepareLaunchStateMachine={'Ref': 'testfunctionPrepareLaunchStateMachine2AC64A37'}),
+            function)
+
+        def resolve_definition(state_machine):
+            # Replace the tokens in the definition with placeholders to parse it
+            definition = stack.resolve(state_machine.node.default_child.definition_string)
+            return json.loads(''.join(p if isinstance(p, str) else 'token' for p in definition['Fn::Join'][1]))
+
+        prepare_launch = function.prepare_launch_state_machine
+        self.assertEqual(prepare_launch.node.default_child.state_machine_type, 'EXPRESS')
+        logging_configuration = stack.resolve(prepare_launch.node.default_child.logging_configuration)
+        self.assertEqual(logging_configuration['level'], 'ERROR')
+        self.assertEqual(len(logging_configuration['destinations']), 1)
+        prepare_launch_definition = resolve_definition(prepare_launch)
+        self.assertEqual(prepare_launch_definition['StartAt'], 'Load Cluster Configuration')
+        self.assertEqual(len(prepare_launch_definition['States']), 4)
+
+        definition = resolve_definition(function.state_machine)
+        self.assertEqual(definition['StartAt'], 'Prepare Launch')
+        self.assertNotIn('Load Cluster Configuration', definition['States'])
+
+    def test_emr_launch_function_with_claim_check(self):
+        stack = core.Stack(core.App(), 'test-stack')
+        vpc = ec2.Vpc(stack, 'Vpc')
+        success_topic = sns.Topic(stack, 'SuccessTopic')
+        failure_topic = sns.Topic(stack, 'FailureTopic')
+        claim_check_bucket = s3.Bucket.from_bucket_name(stack, 'ClaimCheckBucket', 'test-claim-check-bucket')
+
+        profile = emr_profile.EMRProfile(
+            stack, 'test-profile',
+            profile_name='test-profile',
+            vpc=vpc)
+        configuration = cluster_configuration.ClusterConfiguration(
+            stack, 'test-configuration', configuration_name='test-configuration')
+
+        function = emr_launch_function.EMRLaunchFunction(
+            stack, 'test-function',
+            launch_function_name='test-function',
+            emr_profile=profile,
+            cluster_configuration=configuration,
+            cluster_name='test-cluster',
+            description='test description',
+            success_topic=success_topic,
+            failure_topic=failure_topic,
+            allowed_cluster_config_overrides=configuration.override_interfaces['default'],
+            wait_for_cluster_start=False,
+            claim_check=emr_tasks.ClaimCheckPolicy(bucket=claim_check_bucket, threshold_bytes=1024)
+        )
+
+        claim_check_json = {
+            'Bucket': 'test-claim-check-bucket',
+            'Prefix': 'emr_launch/claim_checks',
+            'ThresholdBytes': 1024
+        }
+        self.print_and_assert(dict(self.default_function, ClaimCheckPolicy=claim_check_json), function)
+
+        # The checked-in Cluster configuration can only be read by the RunJobFlow Lambda
+        self.assertIsNotNone(stack.node.try_find_child('RunJobFlow'))
+        definition = stack.resolve(function.state_machine.node.default_child.definition_string)
+        definition = json.loads(''.join(p if isinstance(p, str) else 'token' for p in definition['Fn::Join'][1]))
+        for state in ['Load Cluster Configuration', 'Override Cluster Configs', 'Update Cluster Tags']:
+            self.assertEqual(definition['States'][state]['Parameters']['ClaimCheck'], claim_check_json)
+        self.assertEqual(
+            definition['States']['Start EMR Cluster (with Secrets)']['Parameters']['Payload']['ClaimCheck'],
+            claim_check_json)
+
+        # Without a prefix the payloads are stored at the root of the bucket
+        claim_check_lambda = aws_lambda.Function(
+            stack, 'ClaimCheckLambda',
+            code=aws_lambda.Code.from_inline('handler = None'),
+            handler='index.handler',
+            runtime=aws_lambda.Runtime.PYTHON_3_7)
+        root_claim_check = emr_tasks.ClaimCheckPolicy(bucket=claim_check_bucket, prefix='')
+        root_claim_check.grant_read_write(claim_check_lambda)
+        root_claim_check.grant_read(claim_check_lambda)
+        policy = json.dumps(stack.resolve(claim_check_lambda.role.node.find_child('DefaultPolicy')
+                                          .document.to_json()))
+        self.assertIn(':s3:::test-claim-check-bucket/*"', policy)
+        self.assertNotIn(':s3:::test-claim-check-bucket//*"', policy)
+
+        with self.assertRaises(ValueError):
+            emr_tasks.ClaimCheckPolicy(bucket=claim_check_bucket, threshold_bytes=262145)
+
+        with self.assertRaises(ValueError):
+            emr_launch_function.EMRLaunchFunction(
+                stack, 'test-custom-override-function',
+                launch_function_name='test-custom-override-function',
+                emr_profile=profile,
+                cluster_configuration=configuration,
+                override_cluster_configs_lambda=aws_lambda.Function.from_function_arn(
+                    stack, 'CustomOverride', 'arn:aws:lambda:us-east-1:123456789012:function:custom-override'),
+                claim_check=emr_tasks.ClaimCheckPolicy(bucket=claim_check_bucket)
+            )
+
+    def test_emr_launch_function_with_cluster_pool(self):
+        stack = core.Stack(core.App(), 'test-stack')
+        vpc = ec2.Vpc(stack, 'Vpc')
+        success_topic = sns.Topic(stack, 'SuccessTopic')
+        failure_topic = sns.Topic(stack, 'FailureTopic')
+
+        profile = emr_profile.EMRProfile(
+            stack, 'test-profile',
+            profile_name='test-profile',
+            vpc=vpc)
+        configuration = cluster_configuration.ClusterConfiguration(
+            stack, 'test-configuration', configuration_name='test-configuration')
+
+        function = emr_launch_function.EMRLaunchFunction(
+            stack, 'test-function',
+            launch_function_name='test-function',
+            emr_profile=profile,
+            cluster_configuration=configuration,
+            cluster_name='test-cluster',
+            description='test description',
+            success_topic=success_topic,
+            failure_topic=failure_topic,
+            allowed_cluster_config_overrides=configuration.override_interfaces['default'],
+            wait_for_cluster_start=False,
+            cluster_pool=emr_tasks.ClusterPoolPolicy(min_idle=1, max_idle=2)
+        )
+
+        self.print_and_assert(dict(self.default_function, ClusterPoolPolicy={
+            'MinIdle': 1, 'MaxIdle': 2, 'MaintenanceInterval': 300
+        }), function)
+        self.assertIsNotNone(function.node.try_find_child('ClaimPooledClusterTask'))
+        self.assertIsNotNone(function.node.try_find_child('ClusterPoolMaintenanceRule'))
+        self.assertIsNotNone(stack.node.try_find_child('ClusterPoolTable'))
+
+        with self.assertRaises(ValueError):
+            emr_tasks.ClusterPoolPolicy(min_idle=2, max_idle=1)
+
+        with self.assertRaises(ValueError):
+            emr_launch_function.EMRLaunchFunction(
+                stack, 'test-fail-function',
+                launch_function_name='test-fail-function',
+                emr_profile=profile,
+                cluster_configuration=configuration,
+                default_fail_if_cluster_running=True,
+                cluster_pool=emr_tasks.ClusterPoolPolicy()
+            )
+
     @mock_ssm
     def test_get_function(self):
         stack = core.Stack(core.App(), 'test-stack', env=core.Environment(account='123456789012', region='us-east-1'))
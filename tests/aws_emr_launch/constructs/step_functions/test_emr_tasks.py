@@ -1,3 +1,4 @@
+import pytest
 from aws_cdk import aws_secretsmanager as secretsmanager
 from aws_cdk import aws_stepfunctions as sfn
 from aws_cdk import core
@@ -220,6 +221,62 @@ def test_load_cluster_configuration_builder():
     print_and_assert(default_task_json, task)
 
 
+def test_prepare_launch_builder():
+    default_task_json = {
+        'End': True,
+        'Retry': [{
+            'ErrorEquals': ['Lambda.ServiceException', 'Lambda.AWSLambdaException', 'Lambda.SdkClientException'],
+            'IntervalSeconds': 2,
+            'MaxAttempts': 6,
+            'BackoffRate': 2
+        }],
+        'Type': 'Task',
+        'Resource': {
+            'Fn::GetAtt': ['PrepareLaunch5353B5C6', 'Arn']
+        },
+        'Parameters': {
+            'ExecutionInput.$': '$$.Execution.Input',
+            'ClusterName': 'test-cluster',
+            'ClusterTags': [{
+                'Key': 'Key1',
+                'Value': 'Value1'
+            }],
+            'ProfileNamespace': 'test',
+            'ProfileName': 'test-profile',
+            'ConfigurationNamespace': 'test',
+            'ConfigurationName': 'test-configuration',
+            'AllowedClusterConfigOverrides': {
+                'ClusterName': {
+                    'JsonPath': 'Name',
+                    'Default': 'test-cluster'
+                }
+            },
+            'DefaultFailIfClusterRunning': True
+        }
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    task = emr_tasks.PrepareLaunchBuilder.build(
+        stack, 'test-task',
+        cluster_name='test-cluster',
+        cluster_tags=[core.Tag('Key1', 'Value1')],
+        profile_namespace='test',
+        profile_name='test-profile',
+        configuration_namespace='test',
+        configuration_name='test-configuration',
+        allowed_cluster_config_overrides={
+            'ClusterName': {
+                'JsonPath': 'Name',
+                'Default': 'test-cluster'
+            }
+        },
+        default_fail_if_cluster_running=True,
+    )
+
+    print_and_assert(default_task_json, task)
+
+
 def test_override_cluster_configs_builder():
     default_task_json = {
         'End': True,
@@ -399,9 +456,16 @@ def test_run_job_flow_builder():
                     'Fn::GetAtt': ['CheckClusterStatusA7C1019E', 'Arn']
                 },
                 'RuleName': {
-                    'Ref': 'testtaskEventRule9A04A93E'
+                    'Ref': 'ClusterStatusRulePoolRule00A24D4CC'
                 },
-                'FireAndForget': False
+                'FireAndForget': False,
+                'RuleNames': [
+                    {'Ref': 'ClusterStatusRulePoolRule00A24D4CC'},
+                    {'Ref': 'ClusterStatusRulePoolRule1AEA56F8E'},
+                    {'Ref': 'ClusterStatusRulePoolRule2925638D9'},
+                    {'Ref': 'ClusterStatusRulePoolRule30CD67B2A'},
+                    {'Ref': 'ClusterStatusRulePoolRule49213C3AD'}
+                ]
             }
         }
     }
@@ -418,6 +482,130 @@ def test_run_job_flow_builder():
     print_and_assert(default_task_json, task)
 
 
+def test_run_job_flow_builder_with_cluster_state_changes():
+    default_rule_json = {
+        'source': ['aws.emr'],
+        'detail-type': ['EMR Cluster State Change'],
+        'detail': {
+            'state': ['WAITING', 'TERMINATED', 'TERMINATED_WITH_ERRORS']
+        }
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    task = emr_tasks.RunJobFlowBuilder.build(
+        stack, 'test-task',
+        roles=emr_profile.EMRRoles(stack, 'test-emr-roles', role_name_prefix='test-roles'),
+        secret_configurations={'Secret': secretsmanager.Secret(stack, 'test-secret-configurations-secret')},
+        track_cluster_state_changes=True,
+    )
+
+    state_change_rule = stack.node.try_find_child('ClusterStateChangeRule')
+    resolved_rule = stack.resolve(state_change_rule.node.default_child.event_pattern)
+    print(default_rule_json)
+    print(resolved_rule)
+    assert default_rule_json == resolved_rule
+
+    event_rule_pool = stack.node.find_child('ClusterStatusRulePool5Minutes')
+    for event_rule in event_rule_pool.rules:
+        assert stack.resolve(event_rule.node.default_child.schedule_expression) == 'rate(5 minutes)'
+
+    # The polled Clusters are registered in the TaskTokenTable for the events
+    task_token_table = stack.node.find_child('TaskTokenTable')
+    payload = stack.resolve(task.to_state_json())['Parameters']['Payload']
+    assert payload['StateChangeTable'] == stack.resolve(task_token_table.table_name)
+
+
+def test_run_job_flow_builder_with_batch_cluster_status_checks():
+    stack = core.Stack(core.App(), 'test-stack')
+
+    task = emr_tasks.RunJobFlowBuilder.build(
+        stack, 'test-task',
+        roles=emr_profile.EMRRoles(stack, 'test-emr-roles', role_name_prefix='test-roles'),
+        secret_configurations={'Secret': secretsmanager.Secret(stack, 'test-secret-configurations-secret')},
+        batch_cluster_status_checks=True,
+    )
+
+    task_token_table = stack.node.find_child('TaskTokenTable')
+    batch_rule = stack.node.find_child('BatchClusterStatusRule')
+    assert stack.node.try_find_child('ClusterStatusRulePool') is None
+    assert stack.resolve(batch_rule.node.default_child.schedule_expression) == 'rate(1 minute)'
+    assert len(stack.resolve(batch_rule.node.default_child.targets)) == 1
+
+    payload = stack.resolve(task.to_state_json())['Parameters']['Payload']
+    print(payload)
+    assert payload['TaskTokenTable'] == stack.resolve(task_token_table.table_name)
+    assert payload['RuleName'] == stack.resolve(batch_rule.rule_name)
+
+
+def test_run_job_flow_builder_with_rule_pool():
+    stack = core.Stack(core.App(), 'test-stack')
+    roles = emr_profile.EMRRoles(stack, 'test-emr-roles', role_name_prefix='test-roles')
+
+    emr_tasks.RunJobFlowBuilder.build(stack, 'test-task-1', roles=roles, max_pending_clusters=10)
+    task = emr_tasks.RunJobFlowBuilder.build(stack, 'test-task-2', roles=roles, max_pending_clusters=100)
+
+    event_rule_pool = stack.node.find_child('ClusterStatusRulePool')
+    assert event_rule_pool.capacity == 100
+    assert len(event_rule_pool.rules) == 20
+
+    payload = stack.resolve(task.to_state_json())['Parameters']['Payload']
+    assert payload['RuleNames'] == stack.resolve(event_rule_pool.rule_names)
+
+
+def test_run_job_flow_builder_with_polling_schedule():
+    stack = core.Stack(core.App(), 'test-stack')
+
+    task = emr_tasks.RunJobFlowBuilder.build(
+        stack, 'test-task',
+        roles=emr_profile.EMRRoles(stack, 'test-emr-roles', role_name_prefix='test-roles'),
+        polling_schedule=emr_tasks.ClusterStatusPollingSchedule(
+            default_interval=core.Duration.minutes(2),
+            state_intervals={
+                'STARTING': core.Duration.minutes(5),
+                'BOOTSTRAPPING': core.Duration.minutes(2)
+            },
+            backoff_rate=1.5,
+            max_interval=core.Duration.minutes(10)
+        )
+    )
+
+    # A pool for each configured interval, and for backoff doubling up to the max_interval
+    rule_names = {}
+    for minutes in [2, 4, 5, 8, 10]:
+        event_rule_pool = stack.node.find_child(f'ClusterStatusRulePool{minutes}Minutes')
+        for event_rule in event_rule_pool.rules:
+            assert stack.resolve(event_rule.node.default_child.schedule_expression) == f'rate({minutes} minutes)'
+        rule_names[str(minutes * 60)] = stack.resolve(event_rule_pool.rule_names)
+
+    payload = stack.resolve(task.to_state_json())['Parameters']['Payload']
+    # Clusters start out on the Rules for the STARTING interval
+    assert payload['RuleNames'] == rule_names['300']
+    assert payload['PollingSchedule'] == {
+        'DefaultInterval': 120,
+        'StateIntervals': {
+            'STARTING': 300,
+            'BOOTSTRAPPING': 120
+        },
+        'BackoffRate': 1.5,
+        'MaxInterval': 600,
+        'RuleNames': rule_names
+    }
+
+
+def test_run_job_flow_builder_with_output_projection():
+    stack = core.Stack(core.App(), 'test-stack')
+
+    task = emr_tasks.RunJobFlowBuilder.build(
+        stack, 'test-task',
+        roles=emr_profile.EMRRoles(stack, 'test-emr-roles', role_name_prefix='test-roles'),
+        output_projection=emr_tasks.CLUSTER_OUTPUT_PROJECTION,
+    )
+
+    payload = stack.resolve(task.to_state_json())['Parameters']['Payload']
+    assert payload['OutputProjection'] == emr_tasks.CLUSTER_OUTPUT_PROJECTION
+
+
 def test_add_step_builder():
     default_task_json = {
         'Resource': {
@@ -453,6 +641,148 @@ def test_add_step_builder():
     print_and_assert(default_task_json, task)
 
 
+def test_add_step_builder_with_step_state_changes():
+    default_rule_json = {
+        'source': ['aws.emr'],
+        'detail-type': ['EMR Step Status Change'],
+        'detail': {
+            'state': ['COMPLETED', 'CANCELLED', 'FAILED', 'INTERRUPTED']
+        }
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    task = emr_tasks.AddStepBuilder.build(
+        stack, 'test-task',
+        cluster_id='test-cluster-id',
+        emr_step=emr_code.EMRStep('test-step', 'Jar', 'Main', ['Arg1', 'Arg2']),
+        track_step_state_changes=True,
+    )
+
+    task_token_table = stack.node.find_child('TaskTokenTable')
+    state_change_rule = stack.node.find_child('StepStateChangeRule')
+    resolved_rule = stack.resolve(state_change_rule.node.default_child.event_pattern)
+    print(resolved_rule)
+    assert default_rule_json == resolved_rule
+    assert len(stack.resolve(state_change_rule.node.default_child.targets)) == 1
+
+    reconcile_rule = stack.node.find_child('StepStatusReconcileRule')
+    assert stack.resolve(reconcile_rule.node.default_child.schedule_expression) == 'rate(5 minutes)'
+    assert stack.resolve(reconcile_rule.node.default_child.state) == 'DISABLED'
+    reconcile_target = stack.resolve(reconcile_rule.node.default_child.targets)[0]
+    assert reconcile_target['inputTransformer']['inputTemplate'] == \
+        '{"Action":"ReconcileSteps","Resources":<resources>}'
+
+    task_json = stack.resolve(task.to_state_json())
+    print(task_json)
+    assert task_json['Resource'] == {
+        'Fn::Join': ['', ['arn:', {'Ref': 'AWS::Partition'}, ':states:::lambda:invoke.waitForTaskToken']]
+    }
+    assert task_json['TimeoutSeconds'] == 86400
+    payload = task_json['Parameters']['Payload']
+    assert payload['ClusterId'] == 'test-cluster-id'
+    assert payload['Step']['HadoopJarStep']['Args'] == ['Arg1', 'Arg2']
+    assert payload['TaskToken.$'] == '$$.Task.Token'
+    assert payload['TaskTokenTable'] == stack.resolve(task_token_table.table_name)
+    assert payload['RuleName'] == stack.resolve(reconcile_rule.rule_name)
+
+
+def test_add_steps_builder():
+    default_fragment_json = {
+        'Type': 'Parallel',
+        'End': True,
+        'Branches': [{
+            'StartAt': 'test-phase: test-phase - Add Steps',
+            'States': {
+                'test-phase: test-phase - Add Steps': {
+                    'Resource': {
+                        'Fn::Join': ['', ['arn:', {
+                            'Ref': 'AWS::Partition'
+                        }, ':states:::aws-sdk:emr:addJobFlowSteps']]
+                    },
+                    'Parameters': {
+                        'JobFlowId': 'test-cluster-id',
+                        'Steps': [{
+                            'Name': f'test-step-{i}',
+                            'ActionOnFailure': 'CONTINUE',
+                            'HadoopJarStep': {
+                                'Jar': 'Jar',
+                                'MainClass': 'Main',
+                                'Args': ['Arg1', 'Arg2'],
+                                'Properties': []
+                            }
+                        } for i in range(2)]
+                    },
+                    'Next': 'test-phase: test-phase - Wait',
+                    'Type': 'Task',
+                    'ResultPath': '$.test-phaseAddStepsResult'
+                },
+                'test-phase: test-phase - Wait': {
+                    'Type': 'Wait',
+                    'Seconds': 30,
+                    'Next': 'test-phase: test-phase - Check Steps Status'
+                },
+                'test-phase: test-phase - Check Steps Status': {
+                    'Next': 'test-phase: test-phase - Steps Complete?',
+                    'Retry': [{
+                        'ErrorEquals': ['Lambda.ServiceException', 'Lambda.AWSLambdaException', 'Lambda.SdkClientException'],
+                        'IntervalSeconds': 2,
+                        'MaxAttempts': 6,
+                        'BackoffRate': 2
+                    }],
+                    'Type': 'Task',
+                    'ResultPath': '$.test-phaseStepsStatus',
+                    'Resource': {
+                        'Fn::GetAtt': ['CheckStepsStatusE109DB28', 'Arn']
+                    },
+                    'Parameters': {
+                        'ClusterId': 'test-cluster-id',
+                        'StepIds.$': '$.test-phaseAddStepsResult.StepIds'
+                    }
+                },
+                'test-phase: test-phase - Steps Complete?': {
+                    'Type': 'Choice',
+                    'Choices': [{
+                        'Variable': '$.test-phaseStepsStatus.Complete',
+                        'BooleanEquals': True,
+                        'Next': 'test-phase: test-phase - Steps Completed'
+                    }],
+                    'Default': 'test-phase: test-phase - Wait'
+                },
+                'test-phase: test-phase - Steps Completed': {
+                    'Type': 'Pass',
+                    'InputPath': '$.test-phaseStepsStatus',
+                    'ResultPath': '$.Result',
+                    'End': True
+                }
+            }
+        }]
+    }
+
+    stack = core.Stack(core.App(), 'test-stack')
+
+    fragment = emr_tasks.AddStepsBuilder.build(
+        stack, 'test-phase',
+        name='test-phase',
+        cluster_id='test-cluster-id',
+        emr_steps=[emr_code.EMRStep(f'test-step-{i}', 'Jar', 'Main', ['Arg1', 'Arg2']) for i in range(2)],
+        result_path='$.Result'
+    )
+
+    resolved_fragment = stack.resolve(fragment.to_single_state().to_state_json())
+    print(default_fragment_json)
+    print(resolved_fragment)
+    assert default_fragment_json == resolved_fragment
+
+    with pytest.raises(ValueError):
+        emr_tasks.AddStepsBuilder.build(
+            stack, 'test-empty-phase',
+            name='test-empty-phase',
+            cluster_id='test-cluster-id',
+            emr_steps=[]
+        )
+
+
 def test_terminate_cluster_builder():
     default_task_json = {
         'End': True,
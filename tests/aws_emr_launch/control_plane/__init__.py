@@ -1,4 +1,7 @@
 import os
 import sys
 
+from aws_emr_launch.constructs.lambdas import _asset_path
+
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../control_plane/')))
+sys.path.insert(0, os.path.join(_asset_path('layers/emr_config_utils'), 'python'))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+from aws_emr_launch.constructs.lambdas import _asset_path
+
+LAMBDA_SOURCES = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../aws_emr_launch/lambda_sources/'))
+
+sys.path.insert(0, os.path.join(LAMBDA_SOURCES, 'emr_utilities'))
+# The layer as it's built, with the modules shared with the constructs copied in
+sys.path.insert(0, os.path.join(_asset_path('layers/emr_config_utils'), 'python'))
@@ -0,0 +1,151 @@
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_dynamodb2
+
+from check_cluster_status import lambda_source
+
+
+class FakeContext:
+    invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:CheckClusterStatus'
+
+
+class FakeEMR:
+    def __init__(self, state: str, step_states: dict = None):
+        self.state = state
+        self.step_states = step_states
+
+    def describe_cluster(self, ClusterId):
+        return {'Cluster': {'Id': ClusterId, 'Status': {'State': self.state}}}
+
+    def describe_step(self, ClusterId, StepId):
+        return {'Step': {'Id': StepId, 'Status': {'State': self.step_states[StepId]}}}
+
+
+class FakeEvents:
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self.enabled = set()
+
+    def list_targets_by_rule(self, Rule):
+        return {'Targets': list(self.rules[Rule].values())}
+
+    def put_targets(self, Rule, Targets):
+        self.rules[Rule].update({t['Id']: t for t in Targets})
+        return {'FailedEntryCount': 0}
+
+    def remove_targets(self, Rule, Ids):
+        for target_id in Ids:
+            self.rules[Rule].pop(target_id)
+        return {'FailedEntryCount': 0}
+
+    def enable_rule(self, Name):
+        self.enabled.add(Name)
+
+    def disable_rule(self, Name):
+        self.enabled.discard(Name)
+
+
+class FakeStepFunctions:
+    def __init__(self, timed_out: list = None):
+        self.timed_out = timed_out or []
+        self.succeeded = []
+
+    def send_task_heartbeat(self, taskToken):
+        if taskToken in self.timed_out:
+            raise ClientError({'Error': {'Code': 'TaskTimedOut'}}, 'SendTaskHeartbeat')
+
+    def send_task_success(self, taskToken, output):
+        self.succeeded.append(taskToken)
+
+
+def polling_event(rule_name: str, **kwargs) -> dict:
+    return dict({
+        'ClusterId': 'j-1',
+        'TaskToken': 'token',
+        'RuleName': rule_name,
+        'ExpectedState': 'WAITING',
+        'PollingSchedule': {
+            'DefaultInterval': 60,
+            'StateIntervals': {'STARTING': 300},
+            'BackoffRate': 1.0,
+            'MaxInterval': None,
+            'RuleNames': {'60': ['rule-1-minute'], '300': ['rule-5-minutes']}
+        }
+    }, **kwargs)
+
+
+def test_moves_target_to_the_rule_for_the_next_interval(monkeypatch):
+    event_rules = FakeEvents({'rule-1-minute': {}, 'rule-5-minutes': {}})
+    event_rules.enabled.add('rule-1-minute')
+    event = polling_event('rule-1-minute')
+    event_rules.rules['rule-1-minute']['j-1'] = {'Id': 'j-1'}
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR('STARTING'))
+    monkeypatch.setattr(lambda_source, 'events', event_rules)
+    monkeypatch.setattr(lambda_source, 'sfn', FakeStepFunctions())
+
+    lambda_source.handler(event, FakeContext())
+
+    assert event_rules.rules['rule-1-minute'] == {}
+    assert event_rules.enabled == {'rule-5-minutes'}
+    target = event_rules.rules['rule-5-minutes']['j-1']
+    assert target['Arn'] == FakeContext.invoked_function_arn
+    assert '"RuleName": "rule-5-minutes"' in target['Input']
+
+
+def test_keeps_target_on_the_rule_for_the_next_interval(monkeypatch):
+    event_rules = FakeEvents({'rule-1-minute': {}, 'rule-5-minutes': {'j-1': {'Id': 'j-1'}}})
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR('STARTING'))
+    monkeypatch.setattr(lambda_source, 'events', event_rules)
+    monkeypatch.setattr(lambda_source, 'sfn', FakeStepFunctions())
+
+    lambda_source.handler(polling_event('rule-5-minutes', LastState='STARTING', Attempts=2), FakeContext())
+
+    assert event_rules.rules['rule-1-minute'] == {}
+    assert '"Attempts": 3' in event_rules.rules['rule-5-minutes']['j-1']['Input']
+
+
+def create_task_token_table(monkeypatch):
+    monkeypatch.setenv('TASK_TOKEN_TABLE', 'test-task-tokens')
+    return boto3.resource('dynamodb').create_table(
+        TableName='test-task-tokens',
+        KeySchema=[{'AttributeName': 'Id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'Id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST')
+
+
+@mock_dynamodb2
+def test_cluster_state_change(monkeypatch):
+    table = create_task_token_table(monkeypatch)
+    table.put_item(Item={'Id': 'j-1', 'Kind': 'TrackedCluster', 'TaskToken': 'token-j-1', 'ExpectedState': 'WAITING'})
+    step_functions = FakeStepFunctions()
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR('WAITING'))
+    monkeypatch.setattr(lambda_source, 'sfn', step_functions)
+    # Only the TaskTokenTable is searched for the waiting launch
+    monkeypatch.setattr(lambda_source, 'events', None)
+
+    for cluster_id in ['j-1', 'j-2']:
+        lambda_source.handler({'detail-type': 'EMR Cluster State Change',
+                               'detail': {'clusterId': cluster_id, 'state': 'WAITING'}}, FakeContext())
+
+    assert step_functions.succeeded == ['token-j-1']
+    assert table.scan()['Items'] == []
+
+
+@mock_dynamodb2
+def test_reconcile_steps(monkeypatch):
+    table = create_task_token_table(monkeypatch)
+    for step_id in ['s-1', 's-2', 's-3']:
+        table.put_item(Item={'Id': step_id, 'Kind': 'Step', 'ClusterId': 'j-1', 'TaskToken': f'token-{step_id}'})
+    table.put_item(Item={'Id': 'j-2', 'Kind': 'Cluster', 'TaskToken': 'token-j-2'})
+
+    step_functions = FakeStepFunctions(timed_out=['token-s-3'])
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR('WAITING', {'s-1': 'COMPLETED', 's-2': 'RUNNING',
+                                                                   's-3': 'RUNNING'}))
+    monkeypatch.setattr(lambda_source, 'sfn', step_functions)
+
+    event = {'Action': 'ReconcileSteps',
+             'Resources': ['arn:aws:events:us-east-1:123456789012:rule/test-reconcile-rule']}
+    lambda_source.handler(event, FakeContext())
+
+    assert step_functions.succeeded == ['token-s-1']
+    assert sorted(i['Id'] for i in table.scan()['Items']) == ['j-2', 's-2']
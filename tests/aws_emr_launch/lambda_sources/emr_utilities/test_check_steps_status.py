@@ -0,0 +1,36 @@
+import pytest
+
+from check_steps_status import lambda_source
+
+
+class FakeEMR:
+    def __init__(self, pages: list):
+        self.pages = pages
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, ClusterId):
+        return [{'Steps': [{'Id': k, 'Status': {'State': v}} for k, v in page.items()]} for page in self.pages]
+
+
+def test_steps_pending(monkeypatch):
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR([{'s-3': 'PENDING'}, {'s-2': 'RUNNING', 's-1': 'COMPLETED'}]))
+
+    result = lambda_source.handler({'ClusterId': 'j-1', 'StepIds': ['s-1', 's-2']}, None)
+
+    assert result['StepStates'] == {'RUNNING': 1, 'COMPLETED': 1}
+    assert result['Complete'] is False
+
+
+def test_steps_complete(monkeypatch):
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR([{'s-2': 'COMPLETED', 's-1': 'COMPLETED'}]))
+
+    assert lambda_source.handler({'ClusterId': 'j-1', 'StepIds': ['s-1', 's-2']}, None)['Complete'] is True
+
+
+def test_steps_not_found(monkeypatch):
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR([{'s-2': 'COMPLETED'}, {'s-1': 'COMPLETED'}]))
+
+    with pytest.raises(lambda_source.StepNotFoundError):
+        lambda_source.handler({'ClusterId': 'j-1', 'StepIds': ['s-1', 's-3']}, None)
@@ -0,0 +1,195 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_dynamodb2, mock_s3, mock_stepfunctions
+
+from cluster_pool import lambda_source
+from emr_config_utils import claim_check
+
+STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:123456789012:stateMachine:default_test-function'
+
+
+class FakeEMR:
+    # Clusters launched through the RunJobFlow API can't be listed with the moto release pinned here
+    def __init__(self, clusters: dict):
+        self.clusters = clusters
+        self.tags = {}
+
+    def describe_cluster(self, ClusterId):
+        return {'Cluster': {'Id': ClusterId, 'Status': {'State': self.clusters[ClusterId]}}}
+
+    def add_tags(self, ResourceId, Tags):
+        self.tags.setdefault(ResourceId, []).extend(Tags)
+
+    def terminate_job_flows(self, JobFlowIds):
+        for cluster_id in JobFlowIds:
+            self.clusters[cluster_id] = 'TERMINATING'
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, ClusterStates):
+        return [{'Clusters': [{'Id': k, 'Status': {'State': v}} for k, v in self.clusters.items()
+                              if v in ClusterStates]}]
+
+
+@pytest.fixture
+def pool_table(monkeypatch):
+    monkeypatch.setenv('CLUSTER_POOL_TABLE', 'test-cluster-pool')
+    with mock_dynamodb2(), mock_s3(), mock_stepfunctions():
+        yield boto3.resource('dynamodb').create_table(
+            TableName='test-cluster-pool',
+            KeySchema=[{'AttributeName': 'Id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'Id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'Fingerprint', 'AttributeType': 'S'},
+                                  {'AttributeName': 'PoolState', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'FingerprintPoolState',
+                'KeySchema': [{'AttributeName': 'Fingerprint', 'KeyType': 'HASH'},
+                              {'AttributeName': 'PoolState', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST')
+
+
+def put_cluster(table, cluster_id: str, pool_state: str, claimed_by: str = None, updated_at: int = 0):
+    item = {'Id': cluster_id, 'Kind': 'Cluster', 'Fingerprint': 'fingerprint', 'PoolState': pool_state,
+            'UpdatedAt': updated_at}
+    if claimed_by is not None:
+        item['ClaimedBy'] = claimed_by
+    table.put_item(Item=item)
+
+
+def claim_event(execution_id: str) -> dict:
+    return {
+        'Action': 'Claim',
+        'ExecutionId': execution_id,
+        'ExecutionInput': {},
+        'StateMachineArn': STATE_MACHINE_ARN,
+        'ClusterPoolPolicy': {'MinIdle': 0, 'MaxIdle': 1},
+        'Input': {'Cluster': {
+            'Name': 'test-cluster',
+            'Instances': {},
+            'Tags': [{'Key': 'pipeline', 'Value': execution_id}]
+        }}
+    }
+
+
+def test_claim_race(pool_table, monkeypatch):
+    _, fingerprint = lambda_source.prepare_pooled_config(claim_event('a')['Input']['Cluster'])
+    pool_table.put_item(Item={'Id': 'j-1', 'Kind': 'Cluster', 'Fingerprint': fingerprint, 'PoolState': 'IDLE',
+                              'UpdatedAt': 0})
+    emr = FakeEMR({'j-1': 'WAITING'})
+    monkeypatch.setattr(lambda_source, 'emr', emr)
+
+    # Both claimers scan the pool before either claims the idle Cluster
+    idle_clusters = lambda_source.query_pool_clusters(pool_table, fingerprint, 'IDLE')
+    monkeypatch.setattr(lambda_source, 'query_pool_clusters', lambda *args: idle_clusters)
+
+    first = lambda_source.handler(claim_event('execution-a'), None)
+    second = lambda_source.handler(claim_event('execution-b'), None)
+
+    assert first['PooledCluster']['ClusterId'] == 'j-1'
+    assert 'PooledCluster' not in second
+    assert pool_table.get_item(Key={'Id': 'j-1'})['Item']['ClaimedBy'] == 'execution-a'
+    assert {'Key': 'pipeline', 'Value': 'execution-a'} in emr.tags['j-1']
+
+
+def test_claim_projects_and_checks_in_the_pooled_cluster(pool_table, monkeypatch):
+    _, fingerprint = lambda_source.prepare_pooled_config(claim_event('a')['Input']['Cluster'])
+    pool_table.put_item(Item={'Id': 'j-1', 'Kind': 'Cluster', 'Fingerprint': fingerprint, 'PoolState': 'IDLE',
+                              'UpdatedAt': 0})
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR({'j-1': 'WAITING'}))
+    boto3.client('s3').create_bucket(Bucket='test-bucket')
+
+    event = dict(claim_event('execution-a'), OutputProjection=['Cluster.Status.State'],
+                 ClaimCheck={'Bucket': 'test-bucket', 'Prefix': 'claim_checks', 'ThresholdBytes': 8})
+    pooled_cluster = lambda_source.handler(event, None)['PooledCluster']
+
+    assert pooled_cluster['ClusterId'] == 'j-1'
+    assert pooled_cluster['ClaimCheck']['Key'].startswith('claim_checks/')
+    assert claim_check.check_out(pooled_cluster) == \
+        {'ClusterId': 'j-1', 'Cluster': {'Status': {'State': 'WAITING'}}}
+
+
+def test_register_keeps_a_sanitized_launch_input(pool_table):
+    pool_table.put_item(Item={'Id': 'Fingerprint#fingerprint', 'Kind': 'Fingerprint', 'Fingerprint': 'fingerprint'})
+    execution_input = {
+        'ClusterConfigurationOverrides': {'Name': 'test'},
+        'Tags': [{'Key': 'pipeline', 'Value': 'execution-a'}],
+        'FailIfClusterRunning': True,
+        'AWS_STEP_FUNCTIONS_STARTED_BY_EXECUTION_ID': 'parent-execution'
+    }
+
+    lambda_source.handler({'Action': 'Register', 'ExecutionId': 'execution-a', 'ExecutionInput': execution_input,
+                           'Fingerprint': 'fingerprint', 'LaunchClusterResult': {'ClusterId': 'j-1'}}, None)
+
+    assert pool_table.get_item(Key={'Id': 'j-1'})['Item']['ClaimedBy'] == 'parent-execution'
+    assert json.loads(pool_table.get_item(Key={'Id': 'Fingerprint#fingerprint'})['Item']['LaunchInput']) == \
+        {'ClusterConfigurationOverrides': {'Name': 'test'}}
+
+
+def test_release_above_max_idle(pool_table, monkeypatch):
+    pool_table.put_item(Item={'Id': 'Fingerprint#fingerprint', 'Kind': 'Fingerprint', 'Fingerprint': 'fingerprint',
+                              'MinIdle': 0, 'MaxIdle': 1})
+    put_cluster(pool_table, 'j-1', 'IDLE')
+    put_cluster(pool_table, 'j-2', 'CLAIMED', claimed_by='execution-a')
+    emr = FakeEMR({'j-1': 'WAITING', 'j-2': 'WAITING'})
+    monkeypatch.setattr(lambda_source, 'emr', emr)
+
+    assert lambda_source.handler({'Action': 'Release', 'ClusterId': 'j-2'}, None) == \
+        {'ClusterId': 'j-2', 'Released': False}
+    assert emr.clusters == {'j-1': 'WAITING', 'j-2': 'TERMINATING'}
+    assert 'Item' not in pool_table.get_item(Key={'Id': 'j-2'})
+
+
+def test_maintain_tops_up_the_pool(pool_table, monkeypatch):
+    sfn = boto3.client('stepfunctions')
+    state_machine_arn = sfn.create_state_machine(
+        name='default_test-function', definition='{}',
+        roleArn='arn:aws:iam::123456789012:role/test-role')['stateMachineArn']
+    pool_table.put_item(Item={'Id': 'Fingerprint#fingerprint', 'Kind': 'Fingerprint', 'Fingerprint': 'fingerprint',
+                              'StateMachineArn': state_machine_arn,
+                              'LaunchInput': json.dumps({'ClusterConfigurationOverrides': {'Name': 'test'}}),
+                              'MinIdle': 0, 'MaxIdle': 1})
+    put_cluster(pool_table, 'j-1', 'IDLE')
+    monkeypatch.setattr(lambda_source, 'emr', FakeEMR({'j-1': 'WAITING'}))
+
+    event = {'Action': 'Maintain', 'StateMachineArn': state_machine_arn,
+             'ClusterPoolPolicy': {'MinIdle': 3, 'MaxIdle': 3}}
+    lambda_source.handler(event, None)
+    # Pending top ups aren't launched again by the next maintenance run
+    lambda_source.handler(event, None)
+
+    executions = sfn.list_executions(stateMachineArn=state_machine_arn)['executions']
+    assert len(executions) == 2
+    assert json.loads(sfn.describe_execution(executionArn=executions[0]['executionArn'])['input']) == \
+        {'ClusterConfigurationOverrides': {'Name': 'test'}, 'ClusterPoolTopUp': True}
+    assert pool_table.get_item(Key={'Id': 'Fingerprint#fingerprint'})['Item']['PendingTopUps'] == 2
+
+
+def test_maintain_claimed_clusters(pool_table, monkeypatch):
+    sfn = boto3.client('stepfunctions')
+    state_machine_arn = sfn.create_state_machine(
+        name='default_test-function', definition='{}',
+        roleArn='arn:aws:iam::123456789012:role/test-role')['stateMachineArn']
+    running = sfn.start_execution(stateMachineArn=state_machine_arn)['executionArn']
+    stopped = sfn.start_execution(stateMachineArn=state_machine_arn)['executionArn']
+    sfn.stop_execution(executionArn=stopped)
+
+    pool_table.put_item(Item={'Id': 'Fingerprint#fingerprint', 'Kind': 'Fingerprint', 'Fingerprint': 'fingerprint',
+                              'StateMachineArn': state_machine_arn, 'LaunchInput': '{}',
+                              'MinIdle': 0, 'MaxIdle': 1})
+    put_cluster(pool_table, 'j-1', 'CLAIMED', claimed_by=running)
+    put_cluster(pool_table, 'j-2', 'CLAIMED', claimed_by=stopped)
+    put_cluster(pool_table, 'j-3', 'CLAIMED', claimed_by=running)
+    emr = FakeEMR({'j-1': 'RUNNING', 'j-2': 'WAITING', 'j-3': 'TERMINATED'})
+    monkeypatch.setattr(lambda_source, 'emr', emr)
+
+    lambda_source.handler({'Action': 'Maintain', 'StateMachineArn': state_machine_arn}, None)
+
+    assert emr.clusters == {'j-1': 'RUNNING', 'j-2': 'TERMINATING', 'j-3': 'TERMINATED'}
+    assert 'Item' in pool_table.get_item(Key={'Id': 'j-1'})
+    assert 'Item' not in pool_table.get_item(Key={'Id': 'j-2'})
+    assert 'Item' not in pool_table.get_item(Key={'Id': 'j-3'})
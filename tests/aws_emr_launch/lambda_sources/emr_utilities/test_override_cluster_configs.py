@@ -0,0 +1,52 @@
+import copy
+import unittest
+
+from override_cluster_configs import lambda_source
+
+from aws_emr_launch.constructs.emr_constructs import override_plan
+
+
+class TestOverrideClusterConfigs(unittest.TestCase):
+    cluster_config = {
+        'Instances': {
+            'InstanceGroups': [
+                {'InstanceRole': 'MASTER', 'InstanceCount': 1},
+                {'InstanceRole': 'CORE', 'InstanceCount': 2},
+                {'InstanceRole': 'TASK', 'InstanceCount': 1}
+            ]
+        },
+        'Name': 'test-cluster'
+    }
+
+    allowed_overrides = {
+        'ClusterName': {'JsonPath': 'Name'},
+        'CoreInstanceCount': {'JsonPath': 'Instances.InstanceGroups.1.InstanceCount', 'Maximum': 5},
+        'TaskInstanceCount': {'JsonPath': 'Instances.InstanceGroups[InstanceRole=TASK].InstanceCount',
+                              'Minimum': 1, 'Maximum': 10}
+    }
+
+    def test_override_cluster_configs(self):
+        overrides = {'ClusterName': 'new-cluster', 'CoreInstanceCount': 3, 'TaskInstanceCount': 4}
+        cluster_config = lambda_source.override_cluster_configs(
+            copy.deepcopy(self.cluster_config), overrides, self.allowed_overrides)
+
+        self.assertEqual(cluster_config['Name'], 'new-cluster')
+        self.assertEqual([g['InstanceCount'] for g in cluster_config['Instances']['InstanceGroups']], [1, 3, 4])
+
+        with self.assertRaises(lambda_source.InvalidOverrideError):
+            lambda_source.override_cluster_configs(
+                copy.deepcopy(self.cluster_config), {'TaskInstanceCount': 11}, self.allowed_overrides)
+        with self.assertRaises(lambda_source.InvalidOverrideError):
+            lambda_source.override_cluster_configs(
+                copy.deepcopy(self.cluster_config), {'TaskInstanceCount': 2},
+                {'TaskInstanceCount': {'JsonPath': 'Instances.InstanceGroups[InstanceRole=SPOT].InstanceCount'}})
+
+    def test_legacy_overrides_match_override_plan(self):
+        # Launch Functions without a compiled plan must resolve the same paths as the plan
+        overrides = {'CoreInstanceCount': 4, 'TaskInstanceCount': 2}
+        plan = override_plan.compile_override_plan(self.cluster_config, self.allowed_overrides)
+
+        self.assertEqual(
+            lambda_source.override_cluster_configs(
+                copy.deepcopy(self.cluster_config), overrides, self.allowed_overrides),
+            lambda_source.apply_override_plan(copy.deepcopy(self.cluster_config), overrides, plan))
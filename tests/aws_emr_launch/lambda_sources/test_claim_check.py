@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+
+import boto3
+from moto import mock_s3
+
+from emr_config_utils import claim_check
+
+
+def json_serial(obj):
+    return obj.isoformat()
+
+
+@mock_s3
+def test_check_in_json():
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket='test-bucket')
+    value = {'ClusterId': 'j-1', 'Cluster': {'Status': {'Timeline': {'CreationDateTime': datetime(2020, 1, 1)}}}}
+
+    # Under the threshold the serialized value is returned as-is
+    small = json.loads(claim_check.check_in_json(
+        value, {'Bucket': 'test-bucket', 'Prefix': '', 'ThresholdBytes': 1024}, ['ClusterId'], default=json_serial))
+    assert small['Cluster']['Status']['Timeline']['CreationDateTime'] == '2020-01-01T00:00:00'
+
+    reference = json.loads(claim_check.check_in_json(
+        value, {'Bucket': 'test-bucket', 'Prefix': '', 'ThresholdBytes': 8}, ['ClusterId'], default=json_serial))
+    assert reference['ClusterId'] == 'j-1'
+    assert reference['ClaimCheck']['Key'] == f'{reference["ClaimCheck"]["Sha256"]}.json'
+    assert claim_check.check_out(reference) == small
+
+    assert json.loads(claim_check.check_in_json(value, None, default=json_serial)) == small